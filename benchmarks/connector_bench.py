@@ -0,0 +1,64 @@
+"""
+Compare the round trips of the ADB connector backends on a connected device:
+
+    subprocess  ADB(device, session=False), one adb process per command
+    session     ADB(device), persistent interactive shells
+    adbutils    NativeADB(device), the adb server socket through adbutils
+
+Usage:
+    python benchmarks/connector_bench.py -s <serial> [-n 50]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hmbot.device.device import Device
+from hmbot.device.connector.adb import ADB
+from hmbot.device.connector.adb_native import NativeADB
+from hmbot.utils.proto import OperatingSystem
+
+
+def measure(call, repeat):
+    """
+    Returns:
+        (float, float): the mean and the best milliseconds of a call, after one warm-up call.
+    """
+    call()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return sum(times) / len(times), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ADB connector backends')
+    parser.add_argument('-s', '--serial', type=str, required=True, help='specify the device serial')
+    parser.add_argument('-n', '--repeat', type=int, default=50, help='specify the calls per measurement, default is 50')
+    args = parser.parse_args()
+
+    device = Device(args.serial, OperatingSystem.ANDROID)
+    backends = {'subprocess': ADB(device, session=False),
+                'session': ADB(device),
+                'adbutils': NativeADB(device)}
+    bundle = backends['subprocess'].page_info().bundle
+    calls = {'shell': lambda connector: connector.shell('echo x'),
+             'page_info': lambda connector: connector.page_info(),
+             'get_audio': lambda connector: connector.get_audio(bundle)}
+    print('%-10s %-12s %10s %10s' % ('call', 'backend', 'mean ms', 'best ms'))
+    for name, call in calls.items():
+        for backend, connector in backends.items():
+            mean, best = measure(lambda: call(connector), args.repeat)
+            print('%-10s %-12s %10.1f %10.1f' % (name, backend, mean, best))
+    mean, best = measure(lambda: device.automator.screenshot(), max(1, args.repeat // 5))
+    print('%-10s %-12s %10.1f %10.1f' % ('screenshot', 'automator', mean, best))
+    mean, best = measure(lambda: backends['adbutils'].screenshot(), max(1, args.repeat // 5))
+    print('%-10s %-12s %10.1f %10.1f' % ('screenshot', 'adbutils', mean, best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Check the single-pass resource-probe parsers against the three-pass
+parsing they replaced, on the dumps in benchmarks/fixtures, and time both.
+
+    dumpsys_audio.txt      `dumpsys audio` of an Android device
+    ps_android.txt         `ps -A` of the same device
+    audio_distributed.txt  `hidumper -s AudioDistributed` of a HarmonyOS device
+    ps_harmony.txt         `ps -ef` of the same device
+
+Usage:
+    python benchmarks/probe_bench.py [-n 2000] [--scale 1]
+
+--scale repeats the lines no pattern matches, to time larger dumps.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hmbot.device.connector.probe import parse_dumpsys_audio, parse_audio_distributed, parse_ps, android_uid
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r') as f:
+        return f.read()
+
+
+def grep(text, pattern):
+    return [line for line in text.splitlines() if pattern in line]
+
+
+def legacy_android_audio(all_audio_lines, ps_lines, bundle):
+    """
+    ADB.get_audio before the probe layer: three greps of the dump, a regex
+    compiled per call, and the uid from ps.
+    """
+    audio_status_dict = {}
+    for audio_line in grep(all_audio_lines, "AudioPlaybackConfiguration"):
+        m = re.compile(".*u/pid:(.*)/(.*) .*state:(.*) attr.*").match(audio_line)
+        if m:
+            key = (m.group(1), m.group(2))
+            if key not in audio_status_dict or m.group(3) == 'started':
+                audio_status_dict[key] = m.group(3)
+    client_dict = {}
+    for req_focus_line in grep(all_audio_lines, "requestAudioFocus"):
+        m = re.compile(r".*uid/pid (\d*)/(\d*) .*clientId=(.*) callingPack=.*").match(req_focus_line)
+        if m:
+            client_dict[m.group(3)] = (str(m.group(1)), str(m.group(2)))
+    focus_dict = {}
+    for focus_line in grep(all_audio_lines, "source"):
+        m = re.compile(".* pack: (.*) -- client: (.*) -- gain: (.*) -- flags.* loss: (.*) -- notified.*").match(focus_line)
+        if m:
+            focus_dict[client_dict[m.group(2)]] = (m.group(3), m.group(4))
+    process_lines = grep(ps_lines, bundle)
+    uid_ = str(int(process_lines[0].split()[0].split('_a')[1]) + 10000) if process_lines else None
+    for (uid, pid), status in audio_status_dict.items():
+        if uid == uid_ and status == 'started':
+            return 'RUNNING' if focus_dict else 'STOPPED'
+    return 'STOPPED'
+
+
+def legacy_harmony_audio(dump, ps_lines, bundle):
+    """
+    HDC.get_audio before the probe layer: ps -ef twice, the dump three times,
+    regexes compiled inside the loops.
+    """
+    ps_info = '\n'.join(grep(ps_lines, bundle)).split()
+    uid = ps_info[0] if len(ps_info) > 2 else None
+    pid = ps_info[1] if len(ps_info) > 2 else None
+    session_id = 0
+    for session_id_info in grep(dump, "sessionId"):
+        match = re.compile(f'.*sessionId: (\\d+).*appUid: {uid}.*appPid: {pid}.*').match(session_id_info.strip())
+        if match:
+            session_id = match.group(1)
+    stream_id_list = []
+    for stream_id_info in grep(dump, "Stream"):
+        match = re.compile(r'.*Stream Id: (\d+).*').match(stream_id_info)
+        if match:
+            stream_id_list.append(match.groups()[0])
+    status_list = []
+    for status_info in grep(dump, "Status"):
+        match = re.compile('.*Status:(.*)').match(status_info.strip())
+        if match:
+            status_list.append(match.groups()[0])
+    status = ''
+    for index, stream_id in enumerate(stream_id_list):
+        if stream_id == session_id:
+            status = status_list[index]
+    return 'RUNNING' if status in ['RUNNING'] else 'STOPPED'
+
+
+def android_audio(dump, ps_lines, bundle):
+    snapshot = parse_dumpsys_audio(dump)
+    uid = snapshot.uid(bundle)
+    if uid is None:
+        process = parse_ps(ps_lines, bundle)
+        uid = android_uid(process[0]) if process else None
+    return snapshot.audio(uid).stat.value
+
+
+def harmony_audio(dump, ps_lines, bundle):
+    process = parse_ps(ps_lines, bundle)
+    uid, pid = (process[0], process[1]) if process else (None, None)
+    return parse_audio_distributed(dump).audio(uid, pid).stat.value
+
+
+def scale(text, factor):
+    """
+    Repeat every line that no probe pattern looks at factor times.
+    """
+    if factor <= 1:
+        return text
+    keys = ('AudioPlaybackConfiguration', 'requestAudioFocus', 'source', 'sessionId', 'Stream', 'Status')
+    lines = []
+    for line in text.splitlines():
+        lines.extend([line] * (1 if any(key in line for key in keys) else factor))
+    return '\n'.join(lines)
+
+
+def measure(call, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bundles(ps_lines):
+    return sorted({line.split()[-1] for line in ps_lines.splitlines()[1:] if '.' in line.split()[-1]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the resource-probe parsers')
+    parser.add_argument('-n', '--repeat', type=int, default=2000, help='specify the calls per measurement, default is 2000')
+    parser.add_argument('--scale', type=int, default=1, help='specify how often to repeat unmatched dump lines, default is 1')
+    args = parser.parse_args()
+
+    cases = [('android', legacy_android_audio, android_audio,
+              scale(read_fixture('dumpsys_audio.txt'), args.scale), read_fixture('ps_android.txt')),
+             ('harmony', legacy_harmony_audio, harmony_audio,
+              scale(read_fixture('audio_distributed.txt'), args.scale), read_fixture('ps_harmony.txt'))]
+    for name, legacy, single_pass, dump, ps_lines in cases:
+        for bundle in bundles(ps_lines):
+            expected, actual = legacy(dump, ps_lines, bundle), single_pass(dump, ps_lines, bundle)
+            status = 'ok' if expected == actual else 'MISMATCH'
+            print('%-8s %-48s legacy %-8s single-pass %-8s %s' % (name, bundle, expected, actual, status))
+            if expected != actual:
+                sys.exit(1)
+    print()
+    print('%-8s %8s %12s %16s' % ('dump', 'lines', 'legacy ms', 'single-pass ms'))
+    for name, legacy, single_pass, dump, ps_lines in cases:
+        bundle = bundles(ps_lines)[0]
+        print('%-8s %8d %12.3f %16.3f' % (name, len(dump.splitlines()),
+                                          measure(lambda: legacy(dump, ps_lines, bundle), args.repeat),
+                                          measure(lambda: single_pass(dump, ps_lines, bundle), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
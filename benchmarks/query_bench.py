@@ -0,0 +1,152 @@
+"""
+Check the per-snapshot indexes of a VHT against the recursive scans they
+replaced, on a synthetic screen, and time both:
+
+    attribute  VHT(**kwds) through VHTIndex against VHTNode.__call__
+    point      GridIndex.node_at against the recursive descent of
+               extract_node_by_coordinates
+
+The screen is a random nested layout; a share of the children overflows
+its parent, as items scrolled past a viewport do.
+
+Usage:
+    python benchmarks/query_bench.py [-n 3000] [-q 2000] [--seed 0]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hmbot.model.vht import VHT, VHTNode
+from hmbot.model.vht_array import ArrayVHT
+
+WIDTH, HEIGHT = 1080, 2340
+TYPES = ('Column', 'Row', 'Stack', 'Text', 'Button', 'Image', 'List', 'ListItem')
+
+
+def make_node(bounds, type, text='', id='', clickable='false'):
+    (x1, y1, x2, y2) = bounds
+    return VHTNode(attrib={'bundle': 'com.example', 'page': 'pages/Index'},
+                   bounds=[[x1, y1], [x2, y2]], clickable=clickable, longClickable='false', selected='false',
+                   checkable='false', checked='false', type=type, id=id, text=text, enabled='true',
+                   focused='false', center=[(x1 + x2) // 2, (y1 + y2) // 2])
+
+
+def screen(size, rng, overflow=0.1):
+    """
+    A random screen of about size nodes; overflow is the share of children
+    placed partly outside their parent.
+    """
+    root = make_node((0, 0, 0, 0), '')
+    window = make_node((0, 0, WIDTH, HEIGHT), 'Column')
+    root.append(window)
+    nodes = [window]
+    for index in range(size - 2):
+        parent = rng.choice(nodes[-40:])
+        (x1, y1), (x2, y2) = parent.attribute['bounds']
+        w, h = max(2, x2 - x1), max(2, y2 - y1)
+        cw, ch = rng.randint(1, w), rng.randint(1, max(1, h // 3))
+        cx, cy = x1 + rng.randint(0, w - cw), y1 + rng.randint(0, h - ch)
+        if rng.random() < overflow:
+            cy += rng.randint(h // 2, h)
+        clickable = rng.choice(('true', 'false', 'false'))
+        node = make_node((cx, cy, cx + cw, cy + ch), rng.choice(TYPES), text=rng.choice(('', '', 'ok', 'item %d' % (index % 50))),
+                         id=rng.choice(('', 'btn_%d' % (index % 20))), clickable=clickable)
+        parent.append(node)
+        nodes.append(node)
+    return VHT(root, compressed=False)
+
+
+def legacy_node_at(root, x, y):
+    """
+    extract_node_by_coordinates before the grid index: collect the clickable
+    nodes on the descent to the point, take the first smallest one.
+    """
+    candidates = []
+
+    def collect(node):
+        bounds = node.attribute['bounds']
+        if bounds == [[0, 0], [0, 0]]:
+            for child in node._children:
+                collect(child)
+            return
+        (x1, y1), (x2, y2) = bounds
+        if x1 <= x <= x2 and y1 <= y <= y2:
+            if node.attribute.get('clickable') == 'true':
+                candidates.append(node)
+            for child in node._children:
+                collect(child)
+
+    collect(root)
+    best, best_area = None, float('inf')
+    for node in candidates:
+        (x1, y1), (x2, y2) = node.attribute['bounds']
+        area = (x2 - x1) * (y2 - y1)
+        if area < best_area:
+            best, best_area = node, area
+    return best
+
+
+def measure(call, items):
+    start = time.perf_counter()
+    for item in items:
+        call(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the VHT attribute and spatial indexes')
+    parser.add_argument('-n', '--nodes', type=int, default=3000, help='specify the nodes of the screen, default is 3000')
+    parser.add_argument('-q', '--queries', type=int, default=2000, help='specify the queries per measurement, default is 2000')
+    parser.add_argument('--seed', type=int, default=0, help='specify the seed of the screen, default is 0')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vht = screen(args.nodes, rng)
+    root = vht._root
+    nodes = vht.index().nodes
+    queries = []
+    for _ in range(args.queries):
+        node = rng.choice(nodes)
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append({'text': node.attribute['text']})
+        elif kind == 1:
+            queries.append({'id': node.attribute['id'], 'clickable': 'true'})
+        elif kind == 2:
+            queries.append({'type': node.attribute['type'], 'text': node.attribute['text'], 'enabled': 'true'})
+        else:
+            queries.append({'text': 'missing'})
+    points = [(rng.randint(0, WIDTH), rng.randint(0, HEIGHT)) for _ in range(args.queries)]
+
+    for kwds in queries:
+        if vht(**kwds) != root(**kwds):
+            sys.exit('attribute query %s differs' % kwds)
+    array = ArrayVHT(vht)
+    for x, y in points:
+        expected = legacy_node_at(root, x, y)
+        if vht.grid().node_at(x, y) is not expected:
+            sys.exit('node_at(%d, %d) differs' % (x, y))
+        node = array.grid().node_at(x, y)
+        if (node is None) != (expected is None) or (node is not None and node.attribute['bounds'] != expected.attribute['bounds']):
+            sys.exit('ArrayVHT node_at(%d, %d) differs' % (x, y))
+    print('%d nodes, %d queries and %d points agree with the recursive scans' % (len(nodes), len(queries), len(points)))
+    print()
+    print('%-10s %14s %12s' % ('query', 'recursive us', 'indexed us'))
+    print('%-10s %14.1f %12.1f' % ('attribute', measure(lambda kwds: root(**kwds), queries),
+                                   measure(lambda kwds: vht(**kwds), queries)))
+    print('%-10s %14.1f %12.1f' % ('point', measure(lambda point: legacy_node_at(root, *point), points),
+                                   measure(lambda point: vht.grid().node_at(*point), points)))
+    fresh = screen(args.nodes, random.Random(args.seed))
+    start = time.perf_counter()
+    fresh(text='ok')
+    fresh.grid()
+    print()
+    print('building both indexes of a fresh snapshot: %.1f ms' % ((time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
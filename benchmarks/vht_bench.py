@@ -0,0 +1,245 @@
+"""
+Check the iterative VHT parsers against the recursive parsers they
+replaced, on large synthetic hierarchies, and time both.
+
+    deep   one chain of nodes, every other child with its parent's bounds
+    wide   a root with a fan-out of leaves
+    mixed  a random tree of the given size
+
+Every tree is rendered as the json hdc dumps and as the xml uiautomator
+dumps.
+
+Usage:
+    python benchmarks/vht_bench.py [-n 5000] [-r 5] [--seed 0]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hmbot.model.vht import VHT, VHTNode, VHTParser
+
+TYPES = ('Column', 'Row', 'Stack', 'Text', 'Button', 'Image', 'List', 'ListItem')
+
+
+class Spec(object):
+    """
+    A node of a synthetic hierarchy, independent of the dump format.
+    """
+    def __init__(self, bounds, type, text='', clickable='false'):
+        self.bounds = bounds
+        self.type = type
+        self.text = text
+        self.clickable = clickable
+        self.children = []
+
+
+def deep_tree(size):
+    root = Spec((0, 0, 4 * size, 4 * size), 'Column')
+    node = root
+    for depth in range(1, size):
+        (x1, y1, x2, y2) = node.bounds
+        # every other child keeps its parent's bounds, so half of the chain is compressed away
+        bounds = node.bounds if depth % 2 else (x1 + 1, y1 + 1, x2 - 1, y2 - 1)
+        child = Spec(bounds, TYPES[depth % len(TYPES)], text='t%d' % depth if depth % 3 == 0 else '')
+        node.children.append(child)
+        node = child
+    return root
+
+
+def wide_tree(size):
+    root = Spec((0, 0, 1080, 2340), 'List')
+    for index in range(size - 1):
+        y = index * 10
+        root.children.append(Spec((0, y, 1080, y + 10), 'ListItem', text='item %d' % index, clickable='true'))
+    return root
+
+
+def mixed_tree(size, rng):
+    root = Spec((0, 0, 1080, 2340), 'Column')
+    nodes = [root]
+    for index in range(size - 1):
+        parent = rng.choice(nodes[-50:])
+        (x1, y1, x2, y2) = parent.bounds
+        if rng.random() < 0.3:
+            bounds = parent.bounds
+        else:
+            bounds = (x1 + rng.randint(0, 5), y1 + rng.randint(0, 5), max(x1 + 5, x2 - rng.randint(0, 5)), max(y1 + 5, y2 - rng.randint(0, 5)))
+        child = Spec(bounds, rng.choice(TYPES), text=rng.choice(('', '', 'ok', 'text %d' % index)),
+                     clickable=rng.choice(('true', 'false')))
+        parent.children.append(child)
+        nodes.append(child)
+    return root
+
+
+def bounds_str(bounds):
+    return '[%d,%d][%d,%d]' % bounds
+
+
+def to_hdc_json(spec):
+    def attributes(spec):
+        return {'bounds': bounds_str(spec.bounds), 'clickable': spec.clickable, 'longClickable': 'false',
+                'selected': 'false', 'checkable': 'false', 'checked': 'false', 'type': spec.type, 'id': '',
+                'text': spec.text, 'enabled': 'true', 'focused': 'false'}
+    root = {'attributes': dict(attributes(spec), bundleName='com.example', pagePath='pages/Index'), 'children': []}
+    stack = [(spec, root)]
+    while stack:
+        spec, source = stack.pop()
+        for child in spec.children:
+            child_source = {'attributes': attributes(child), 'children': []}
+            source['children'].append(child_source)
+            stack.append((child, child_source))
+    return root
+
+
+def to_adb_xml(spec):
+    # written by hand, ElementTree serializes recursively and overflows on deep trees
+    parts = ["<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"]
+    stack = [spec]
+    while stack:
+        spec = stack.pop()
+        if spec is None:
+            parts.append('</node>')
+            continue
+        parts.append('<node index="0" text=%s resource-id="" class=%s package="com.example" content-desc="" '
+                     'checkable="false" checked="false" clickable=%s enabled="true" focusable="false" '
+                     'focused="false" scrollable="false" long-clickable="false" password="false" '
+                     'selected="false" bounds="%s">'
+                     % (quoteattr(spec.text), quoteattr(spec.type), quoteattr(spec.clickable), bounds_str(spec.bounds)))
+        stack.append(None)
+        stack.extend(reversed(spec.children))
+    parts.append('</hierarchy>')
+    return ''.join(parts)
+
+
+class LegacyParser(object):
+    """
+    The recursive parsers and the recursive compression before the iterative rewrite.
+    """
+    @classmethod
+    def parse_hdc_json(cls, source, device):
+        return VHT(cls.compress(cls._hdc_json(source, device)), compressed=False)
+
+    @classmethod
+    def _hdc_json(cls, source, device):
+        extra = source['attributes']
+        (x1, y1, x2, y2) = map(int, re.match(r'\[(\d+),\s*(\d+)\]\[(\d+),\s*(\d+)\]', extra['bounds']).groups())
+        attrib = {'bundle': '', 'page': ''}
+        if 'bundleName' in extra:
+            attrib['bundle'] = extra['bundleName']
+            attrib['page'] = extra['pagePath']
+        root = VHTNode(device=device, attrib=attrib, bounds=[[x1, y1], [x2, y2]],
+                       clickable=extra['clickable'], longClickable=extra['longClickable'],
+                       selected=extra['selected'], checkable=extra['checkable'], checked=extra['checked'],
+                       type=extra['type'], id=extra['id'], text=extra['text'], enabled=extra['enabled'],
+                       focused=extra['focused'], center=[int((x1 + x2)/2), int((y1 + y2)/2)])
+        for child in source.get('children', ()):
+            root.append(cls._hdc_json(child, device))
+        return root
+
+    @classmethod
+    def parse_adb_xml(cls, source, device):
+        return VHT(cls.compress(cls._adb_xml(ET.fromstring(source), device)), compressed=False)
+
+    @classmethod
+    def _adb_xml(cls, source, device):
+        attrib = {'bundle': '', 'page': ''}
+        if source.tag == 'hierarchy':
+            root = VHTNode(device=device, attrib=attrib, bounds=[[0, 0], [0, 0]], clickable='', longClickable='',
+                           selected='', checkable='', checked='', type='', id='', text='', enabled='',
+                           focused='', center=[0, 0])
+        else:
+            extra = source.attrib
+            match = re.match(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]', extra['bounds'])
+            (x1, y1, x2, y2) = map(int, match.groups()) if match else (0, 0, 100, 100)
+            attrib['bundle'] = extra['package']
+            root = VHTNode(device=device, attrib=attrib, bounds=[[x1, y1], [x2, y2]],
+                           clickable=extra['clickable'], longClickable=extra['long-clickable'],
+                           selected=extra['selected'], checkable=extra['checkable'], checked=extra['checked'],
+                           type=extra['class'], id=extra['resource-id'], text=extra['text'],
+                           enabled=extra['enabled'], focused=extra['focused'],
+                           center=[int((x1 + x2)/2), int((y1 + y2)/2)])
+        for child in source:
+            root.append(cls._adb_xml(child, device))
+        return root
+
+    @classmethod
+    def compress(cls, node):
+        if VHT._assert_compress(node):
+            node._compress(node._children[0])
+            node._children = node._children[0]._children
+            cls.compress(node)
+        else:
+            for child in node._children:
+                cls.compress(child)
+        return node
+
+
+def signature(vht):
+    """
+    The attributes, the child counts and the compressed-set sizes of a VHT in pre-order.
+    """
+    result = []
+    stack = [vht._root]
+    while stack:
+        node = stack.pop()
+        result.append((node._json(), len(node._children), len(node._compressed)))
+        stack.extend(reversed(node._children))
+    return result
+
+
+def measure(call, repeat):
+    """
+    Returns:
+        float: the best milliseconds of a call, or None if it overflows the stack.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            call()
+        except RecursionError:
+            return None
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check and time the VHT parsers on synthetic hierarchies')
+    parser.add_argument('-n', '--nodes', type=int, default=5000, help='specify the nodes per tree, default is 5000')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='specify the parses per measurement, default is 5')
+    parser.add_argument('--seed', type=int, default=0, help='specify the seed of the mixed tree, default is 0')
+    args = parser.parse_args()
+
+    trees = {'deep': deep_tree(args.nodes),
+             'wide': wide_tree(args.nodes),
+             'mixed': mixed_tree(args.nodes, random.Random(args.seed))}
+    limit = sys.getrecursionlimit()
+    print('%-6s %-5s %12s %14s %10s' % ('tree', 'dump', 'legacy ms', 'iterative ms', 'output'))
+    for name, spec in trees.items():
+        formats = {'json': (to_hdc_json(spec), LegacyParser.parse_hdc_json, VHTParser._parse_hdc_json),
+                   'xml': (to_adb_xml(spec), LegacyParser.parse_adb_xml, VHTParser._parse_adb_xml)}
+        for dump, (source, legacy, iterative) in formats.items():
+            legacy_ms = measure(lambda: legacy(source, None), args.repeat)
+            iterative_ms = measure(lambda: iterative(source, None), args.repeat)
+            # the legacy parser needs a raised recursion limit for deep trees, only to compare the output
+            sys.setrecursionlimit(max(limit, 4 * args.nodes + 1000))
+            try:
+                same = signature(legacy(source, None)) == signature(iterative(source, None))
+            finally:
+                sys.setrecursionlimit(limit)
+            print('%-6s %-5s %12s %14.1f %10s' % (name, dump,
+                                                  'overflow' if legacy_ms is None else '%.1f' % legacy_ms,
+                                                  iterative_ms, 'same' if same else 'DIFFERENT'))
+            if not same:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
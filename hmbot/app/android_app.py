@@ -8,4 +8,5 @@ class AndroidApp(App):
         apk = APK(self.app_path)
         self.package_name = apk.get_package()
         self.entry_ability = apk.get_main_activity()
-        self.main_page = apk.get_main_activity()
\ No newline at end of file
+        self.main_page = apk.get_main_activity()
+        self.version = '%s (%s)' % (apk.get_androidversion_name(), apk.get_androidversion_code())
\ No newline at end of file
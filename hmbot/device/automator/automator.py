@@ -1,4 +1,10 @@
+import time
 from abc import ABC, abstractmethod
+from hmbot.model.vht import VHTNode
+
+# the first and the largest interval of hierarchy polling in seconds
+POLL_INTERVAL = 0.1
+MAX_POLL_INTERVAL = 1.0
 
 class Automator(ABC):
     """
@@ -189,4 +195,73 @@ class Automator(ABC):
 
     @abstractmethod
     def identify(self, node):
-        pass
\ No newline at end of file
+        pass
+
+    def wait_for(self, device, selector, timeout=10, gone=False):
+        """
+        Wait until an element matching selector appears, or disappears if gone.
+
+        Args:
+            device (Device): the device the dumped VHT nodes are bound to.
+            selector (dict): VHT node attributes to match, e.g. {'text': 'OK'}.
+            timeout (float): the deadline in seconds.
+            gone (bool): wait for the element to disappear instead.
+
+        Returns:
+            VHTNode or bool: the first matched node, None on timeout;
+            if gone, whether the element disappeared in time.
+        """
+        return self._poll_for(device, selector, time.perf_counter() + timeout, gone)
+
+    def _poll_for(self, device, selector, deadline, gone):
+        """
+        Poll the hierarchy for selector with an exponentially growing interval.
+        """
+        interval = POLL_INTERVAL
+        while True:
+            nodes = self.dump_hierarchy(device)(**selector)
+            if gone and not nodes:
+                return True
+            if not gone and nodes:
+                return nodes[0]
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False if gone else None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    def _resolve_element(self, device, selector, box, attributes):
+        """
+        Resolve an element the driver found on screen to a node of one fresh hierarchy dump.
+        A compressed VHT merges child text into the parent as "a,b", so the node is found
+        by the element's bounds rather than by selector: a node with those bounds that also
+        matches selector first, then any node with those bounds, then the smallest node
+        containing the element's center.
+
+        Args:
+            device (Device): the device the dumped VHT nodes are bound to.
+            selector (dict): the VHT node attributes the element was found by.
+            box ((int, int, int, int)): the bounds of the element as (x1, y1, x2, y2).
+            attributes (dict): the VHT attributes of the element as the driver reports them,
+                to build the node from if the dump has none at its bounds.
+
+        Returns:
+            VHTNode: the node of the element.
+        """
+        (x1, y1, x2, y2) = box
+        grid = self.dump_hierarchy(device).grid()
+        same = [node for node in grid.nodes_in(box) if node.attribute['bounds'] == [[x1, y1], [x2, y2]]]
+        for node in same:
+            if node._satisfy(selector):
+                return node
+        if same:
+            return same[-1]
+        node = grid.node_at((x1 + x2) // 2, (y1 + y2) // 2, clickable=False)
+        if node is not None:
+            return node
+        attributes = dict(attributes)
+        return VHTNode(device=device,
+                       attrib={'bundle': attributes.pop('bundle', ''), 'page': ''},
+                       bounds=[[x1, y1], [x2, y2]],
+                       center=[int((x1 + x2)/2), int((y1 + y2)/2)],
+                       **attributes)
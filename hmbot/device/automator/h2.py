@@ -1,14 +1,20 @@
-from .automator import Automator
+from .automator import Automator, POLL_INTERVAL, MAX_POLL_INTERVAL
 from hmbot.model.vht import VHTParser
 from hmbot.utils.proto import SwipeDirection, DisplayInfo
 from hmbot.app.app import App
 from hmdriver2.driver import Driver
 from hmdriver2.proto import KeyCode
 from loguru import logger
-import uuid, os, shutil, logging
+import uuid, os, shutil, logging, time
 h2_logger = logging.getLogger('hmdriver2')
 h2_logger.setLevel(logging.CRITICAL)
 
+# VHT node attributes and the hmdriver2 selector fields they correspond to
+H2_SELECTOR_KEYS = {'text': 'text', 'id': 'id', 'type': 'type', 'clickable': 'clickable',
+                    'longClickable': 'longClickable', 'selected': 'selected', 'checkable': 'checkable',
+                    'checked': 'checked', 'enabled': 'enabled', 'focused': 'focused'}
+
+
 class H2(Automator):
     def __init__(self, device):
         self._serial = device.serial
@@ -111,6 +117,44 @@ class H2(Automator):
     def recent(self):
         self._driver.swipe(0.5, 2710/2720, 0.5, 2400/2720, 500)
 
+    def wait_for(self, device, selector, timeout=10, gone=False):
+        deadline = time.perf_counter() + timeout
+        if not all(key in H2_SELECTOR_KEYS for key in selector):
+            return self._poll_for(device, selector, deadline, gone)
+        h2_selector = {H2_SELECTOR_KEYS[key]: (value == 'true' if value in ('true', 'false') else value)
+                       for key, value in selector.items()}
+        h2_object = self._driver(**h2_selector)
+        # an element query is much cheaper than dumping the whole hierarchy
+        interval = POLL_INTERVAL
+        while h2_object.exists(retries=1, wait_time=0) == gone:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False if gone else None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+        if gone:
+            return True
+        try:
+            info = h2_object.info
+        except Exception as e:
+            # the element went away between the query and the read
+            logger.debug(f"element {selector} lost on {self._serial}: {e}")
+            return None
+        bounds = info.bounds
+        box = (bounds.left, bounds.top, bounds.right, bounds.bottom)
+        flag = lambda value: 'true' if value else 'false'
+        attributes = {'clickable': flag(info.isClickable),
+                      'longClickable': flag(info.isLongClickable),
+                      'selected': flag(info.isSelected),
+                      'checkable': flag(info.isCheckable),
+                      'checked': flag(info.isChecked),
+                      'type': info.type or '',
+                      'id': info.id or '',
+                      'text': info.text or '',
+                      'enabled': flag(info.isEnabled),
+                      'focused': flag(info.isFocused)}
+        return self._resolve_element(device, selector, box, attributes)
+
     def hop(self, dst_device_name=None, app_name=None):
         pass
 
@@ -7,6 +7,12 @@ import uuid, os, shutil
 import uiautomator2
 import time
 
+# VHT node attributes and the uiautomator2 selector fields they correspond to
+U2_SELECTOR_KEYS = {'text': 'text', 'id': 'resourceId', 'type': 'className', 'clickable': 'clickable',
+                    'longClickable': 'longClickable', 'selected': 'selected', 'checkable': 'checkable',
+                    'checked': 'checked', 'enabled': 'enabled', 'focused': 'focused'}
+
+
 class U2(Automator):
     def __init__(self, device):
         self._serial = device.serial
@@ -101,12 +107,12 @@ class U2(Automator):
 
 
     def dump_hierarchy(self, device):
-        root = VHTParser._parse_adb_xml(self._driver.dump_hierarchy(compressed=True), device)._root
+        vht = VHTParser._parse_adb_xml(self._driver.dump_hierarchy(compressed=True), device)
         # root_child = max(root._children, key=lambda child:
         #     (child.attribute['bounds'][1][0] - child.attribute['bounds'][0][0]) * (child.attribute['bounds'][1][1] - child.attribute['bounds'][0][1]))
         # root_child.attribute['type'] = 'root'
         # root_child.attribute['page'] = self._current()['activity']
-        return VHT(root)
+        return vht
 
     def screenshot(self, path=''):
         img = self._driver.screenshot(format='opencv')
@@ -139,31 +145,57 @@ class U2(Automator):
     def _current(self):
         return self._driver.app_current()
 
+    def wait_for(self, device, selector, timeout=10, gone=False):
+        deadline = time.perf_counter() + timeout
+        if not all(key in U2_SELECTOR_KEYS for key in selector):
+            return self._poll_for(device, selector, deadline, gone)
+        u2_selector = {U2_SELECTOR_KEYS[key]: (value == 'true' if value in ('true', 'false') else value)
+                       for key, value in selector.items()}
+        u2_object = self._driver(**u2_selector)
+        if gone:
+            return u2_object.wait_gone(timeout=timeout)
+        if not u2_object.wait(timeout=timeout):
+            return None
+        try:
+            info = u2_object.info
+        except uiautomator2.UiObjectNotFoundError:
+            return None
+        bounds = info['bounds']
+        box = (bounds['left'], bounds['top'], bounds['right'], bounds['bottom'])
+        flag = lambda key: 'true' if info.get(key) else 'false'
+        attributes = {'bundle': info.get('packageName') or '',
+                      'clickable': flag('clickable'),
+                      'longClickable': flag('longClickable'),
+                      'selected': flag('selected'),
+                      'checkable': flag('checkable'),
+                      'checked': flag('checked'),
+                      'type': info.get('className') or '',
+                      'id': info.get('resourceName') or '',
+                      'text': info.get('text') or '',
+                      'enabled': flag('enabled'),
+                      'focused': flag('focused')}
+        return self._resolve_element(device, selector, box, attributes)
+
     def hop(self, dst_device_name=None, app_name=None):
         if not dst_device_name:
             return False
         self.recent()
-        time.sleep(1)
+        # the recent tasks are shown once the app card is
+        self.wait_for(self, {'text': app_name or dst_device_name}, timeout=2)
         self.swipe_ext('left')
-        time.sleep(1)
 
-        swipe_time = 0
         if app_name:
-            while True:
-                if swipe_time > 10:
-                    return False
-                vht = self.dump_hierarchy(device=self)
-                cnode = vht(text=app_name)
-                if len(cnode):
+            for _ in range(11):
+                if self.wait_for(self, {'text': app_name}, timeout=1) is not None:
                     break
                 self.swipe_ext('right')
-                time.sleep(1)
-                swipe_time += 1
+            else:
+                return False
 
-        vht = self.dump_hierarchy(device=self)
-        dnode = (vht(text=dst_device_name))[0]
+        dnode = self.wait_for(self, {'text': dst_device_name}, timeout=5)
+        if dnode is None:
+            return False
         [dx, dy] = dnode.attribute.get('center')
-        time.sleep(1)
         self.drag(0.5, 0.5, dx, dy, 1.0)
         print(f'hop: {app_name} to {dst_device_name}')
         return True
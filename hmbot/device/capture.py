@@ -0,0 +1,64 @@
+import threading
+from ..model.page import Page
+
+# capture profiles: the parts of a page dump_page captures up front
+FULL = 'full'
+LAYOUT = 'layout'
+HIERARCHY = 'hierarchy'
+SCREENSHOT = 'screenshot'
+SCREENSHOT_RESOURCES = 'screenshot+resources'
+PROFILES = {FULL: ('vht', 'img', 'rsc', 'info'),
+            LAYOUT: ('vht', 'img', 'info'),
+            HIERARCHY: ('vht', 'info'),
+            SCREENSHOT: ('img',),
+            SCREENSHOT_RESOURCES: ('img', 'rsc')}
+
+
+class CaptureLoader(object):
+    """
+    The class describes the parts of a page captured with a reduced profile.
+
+    It serves the captured parts and fetches a part the profile left out
+    from the device when the page first accesses it, so it reflects the
+    screen at that time rather than at capture time.
+    """
+    def __init__(self, device, dump_device, parts):
+        """
+        Args:
+            device (Device): the device the page was captured on.
+            dump_device (Device): the device the VHT nodes are bound to.
+            parts (dict): the captured parts, by name ('vht', 'img', 'rsc' or 'info').
+        """
+        self.device = device
+        self.dump_device = dump_device
+        self._parts = dict(parts)
+        self._lock = threading.RLock()
+        if 'vht' in self._parts:
+            self._parts['vht'] = Page._standardized(self._parts['vht'], self.info())
+
+    def _get(self, name):
+        with self._lock:
+            if name not in self._parts:
+                self._parts[name] = self._fetch(name)
+            return self._parts[name]
+
+    def _fetch(self, name):
+        if name == 'vht':
+            return Page._standardized(self.device.dump_hierarchy(device=self.dump_device), self.info())
+        if name == 'img':
+            return self.device.screenshot()
+        if name == 'rsc':
+            return self.device.resources()
+        return self.device.page_info()
+
+    def vht(self, id=0):
+        return self._get('vht')
+
+    def img(self, id=0):
+        return self._get('img')
+
+    def rsc(self, id=0):
+        return self._get('rsc')
+
+    def info(self, id=0):
+        return self._get('info')
@@ -1,4 +1,6 @@
 from .connector import Connector
+from .session import ShellPool
+from .probe import parse_dumpsys_audio, parse_ps, android_uid
 from hmbot.utils.exception import DeviceError, ADBError
 from hmbot.utils.proto import PageInfo, Resource, AudioInfo, AudioType, Status, CameraInfo, CameraType
 from loguru import logger
@@ -12,13 +14,15 @@ except ImportError:
 
 
 class ADB(Connector):
-    def __init__(self, device=None):
+    def __init__(self, device=None, session=True):
         from hmbot.device.device import Device
         if isinstance(device, Device):
             self.serial = device.serial
         else:
             raise DeviceError
         self.cmd_prefix = ['adb', "-s", device.serial]
+        # shell commands go through long-lived interactive shells instead of a process each
+        self.session = ShellPool(self.cmd_prefix + ['shell']) if session and ShellPool.available() else None
         self.info = self.page_info()
 
     def run_cmd(self, extra_args):
@@ -28,6 +32,8 @@ class ADB(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise ADBError(msg)
+        if self.session is not None and extra_args and extra_args[0] == 'shell':
+            return self.shell(' '.join(extra_args[1:]))
 
         args = [] + self.cmd_prefix
         args += extra_args
@@ -46,6 +52,11 @@ class ADB(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise ADBError(msg)
+        if self.session is not None:
+            output, code = self.session.run(extra_args)
+            if code != 0:
+                raise subprocess.CalledProcessError(code, self.cmd_prefix + ['shell', extra_args], output)
+            return output.strip()
         extra_args = 'shell ' + extra_args
         return self.run_cmd(extra_args)
 
@@ -58,6 +69,10 @@ class ADB(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise ADBError(msg)
+        if self.session is not None:
+            # grep on the device; its exit code 1 only means nothing matched
+            command = ' '.join(quote(arg) for arg in extra_args) + ' | grep ' + ' '.join(quote(arg) for arg in grep_args)
+            return self.session.run(command)[0]
 
         args = self.cmd_prefix + ['shell'] + [quote(arg) for arg in extra_args]
         grep_args = ['grep'] + [quote(arg) for arg in grep_args]
@@ -94,13 +109,10 @@ class ADB(Connector):
             if not self.info:
                 self.info = self.page_info()
             bundle = self.info.bundle
-        process_lines = self.shell_grep("ps", bundle).splitlines()
-        if len(process_lines) > 0:
-            usr_name = process_lines[0].split()[0]
-            uid = str(int(usr_name.split('_a')[1]) + 10000)
-            return uid
-        else:
-            return
+        process = parse_ps(self.shell_grep("ps", bundle), bundle)
+        if process:
+            return android_uid(process[0])
+        return None
 
     def get_resources(self, bundle=None):
         if not bundle:
@@ -115,59 +127,10 @@ class ADB(Connector):
             if not self.info:
                 self.info = self.page_info()
             bundle = self.info.bundle
-        print('bundle={bundle}')
-        all_audio_lines = self.shell("dumpsys audio")
-        # todo
-        type = AudioType.MUSIC
-
-        audio_lines = self.grep(all_audio_lines, "AudioPlaybackConfiguration")
-        audio_line_re = re.compile(".*u/pid:(.*)/(.*) .*state:(.*) attr.*")
-        audio_status_dict = {}
-        for audio_line in audio_lines:
-            m = audio_line_re.match(audio_line)
-            if m:
-                uid = m.group(1)
-                pid = m.group(2)
-                status = m.group(3)
-                if (uid, pid) not in audio_status_dict:
-                    audio_status_dict[(uid, pid)] = status
-                elif status == 'started':
-                    audio_status_dict[(uid, pid)] = status
-        print(f'audio_status_dict={audio_status_dict}')
-
-        req_focus_lines = self.grep(all_audio_lines, "requestAudioFocus")
-        req_focus_line_re = re.compile(".*uid/pid (\d*)/(\d*) .*clientId=(.*) callingPack=.*")
-        client_dict = {}
-        for req_focus_line in req_focus_lines:
-            m = req_focus_line_re.match(req_focus_line)
-            if m:
-                uid = str(m.group(1))
-                pid = str(m.group(2))
-                client_id = m.group(3)
-                client_dict[client_id] = (uid, pid)
-
-        focus_lines = self.grep(all_audio_lines, "source")
-        focus_line_re = re.compile(".* pack: (.*) -- client: (.*) -- gain: (.*) -- flags.* loss: (.*) -- notified.*")
-        focus_dict = {}
-        for focus_line in focus_lines:
-            m = focus_line_re.match(focus_line)
-            if m:
-                (uid, pid) = client_dict[m.group(2)]
-                focus_dict[(uid, pid)] = (m.group(3), m.group(4))
-        print(f'focus_dict={focus_dict}')
-
-        uid_ = self.get_uid(bundle)
-        print(f'uid={uid_}')
-        stat = Status.STOPPED
-        for (uid, pid), status in audio_status_dict.items():
-            if uid != uid_:
-                continue
-            print(uid, pid, status)
-            if status == 'started':
-                if not focus_dict:
-                    return AudioInfo(type, Status.STOPPED)
-                return AudioInfo(type, Status.RUNNING)
-        return AudioInfo(type, stat)
+        snapshot = parse_dumpsys_audio(self.shell("dumpsys audio"))
+        # an app that asked for the audio focus is named in the dump, ps is only needed otherwise
+        uid = snapshot.uid(bundle) or self.get_uid(bundle)
+        return snapshot.audio(uid)
 
     def get_camera(self, bundle=None):
         # todo
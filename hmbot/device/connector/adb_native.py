@@ -0,0 +1,176 @@
+from .adb import ADB
+from hmbot.utils.exception import DeviceError, ADBError
+from loguru import logger
+import subprocess
+import uuid
+import threading
+import cv2
+import numpy as np
+
+try:
+    from shlex import quote  # Python 3
+except ImportError:
+    from pipes import quote  # Python 2
+
+try:
+    import adbutils
+except ImportError:
+    adbutils = None
+
+# bytes read from the adb server socket at a time
+CHUNK_SIZE = 64 * 1024
+SCREENSHOT_FILE = '/data/local/tmp/hmbot_screenshot_%d.png'
+
+
+class NativeADB(ADB):
+    """
+    The class describes an ADB connector talking to the adb server socket
+    through adbutils instead of running the adb binary.
+
+    The client and the device transport are resolved once and kept. Shell
+    output is streamed as bytes and decoded once at the end, screenshots
+    are streamed from screencap and files are read with the sync protocol. The parsing of page_info,
+    get_uid and get_audio is shared with ADB.
+    """
+    def __init__(self, device=None, host='127.0.0.1', port=5037):
+        """
+        Args:
+            device (Device): the device to connect to.
+            host (str, optional): the adb server host. Default is 127.0.0.1.
+            port (int, optional): the adb server port. Default is 5037.
+        """
+        from hmbot.device.device import Device
+        if isinstance(device, Device):
+            self.serial = device.serial
+        else:
+            raise DeviceError
+        if adbutils is None:
+            raise ADBError('adbutils is not installed')
+        self.cmd_prefix = ['adb', "-s", device.serial]
+        self.session = None
+        self._client = adbutils.AdbClient(host=host, port=port)
+        self._device = self._client.device(self.serial)
+        self._tag = '__HMB_%s_EXIT_' % uuid.uuid4().hex[:12]
+        self.info = self.page_info()
+
+    def run_cmd(self, extra_args):
+        if isinstance(extra_args, str):
+            extra_args = extra_args.split()
+        if not isinstance(extra_args, list):
+            msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
+            logger.warning(msg)
+            raise ADBError(msg)
+        if extra_args and extra_args[0] == 'shell':
+            return self.shell(' '.join(extra_args[1:]))
+        if len(extra_args) == 3 and extra_args[0] == 'pull':
+            self.pull(extra_args[1], extra_args[2])
+            return ''
+        # install, forward, ... still go through the adb binary
+        return super().run_cmd(extra_args)
+
+    def shell_bytes(self, command, timeout=None):
+        """
+        Run a shell-command and stream its output.
+
+        Args:
+            command (str): the shell-command.
+            timeout (float, optional): the socket timeout in seconds. Default is adbutils' own.
+
+        Returns:
+            (bytes, int): the raw output of the command and its exit code.
+        """
+        tag = self._tag.encode()
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        try:
+            conn = self._device.shell('%s; echo "\n%s$?"' % (command, self._tag), stream=True, **kwargs)
+        except adbutils.AdbError as e:
+            raise ADBError(str(e))
+        chunks = []
+        try:
+            while True:
+                chunk = conn.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        finally:
+            conn.close()
+        output = b''.join(chunks)
+        # the exit code follows the tag on the last line, which is missing if the command ended the shell
+        head, found, code = output.rpartition(b'\n' + tag)
+        if not found:
+            return output, -1
+        code = code.strip()
+        return head, int(code) if code.isdigit() else -1
+
+    def shell(self, extra_args):
+        if not isinstance(extra_args, str):
+            msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
+            logger.warning(msg)
+            raise ADBError(msg)
+        output, code = self.shell_bytes(extra_args)
+        if code != 0:
+            raise subprocess.CalledProcessError(code, self.cmd_prefix + ['shell', extra_args], output)
+        return output.decode('utf-8', errors='replace').strip()
+
+    def shell_grep(self, extra_args, grep_args):
+        if isinstance(extra_args, str):
+            extra_args = extra_args.split()
+        if isinstance(grep_args, str):
+            grep_args = grep_args.split()
+        if not isinstance(extra_args, list) or not isinstance(grep_args, list):
+            msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
+            logger.warning(msg)
+            raise ADBError(msg)
+        # grep on the device, only the matching lines cross the socket; exit code 1 only means nothing matched
+        command = ' '.join(quote(arg) for arg in extra_args) + ' | grep ' + ' '.join(quote(arg) for arg in grep_args)
+        return self.shell_bytes(command)[0].decode('utf-8', errors='replace')
+
+    def pull(self, src, dst):
+        """
+        Copy a file from the device with the sync protocol.
+
+        Args:
+            src (str): the path on the device.
+            dst (str): the path on the host.
+        """
+        try:
+            self._device.sync.pull(src, dst)
+        except adbutils.AdbError as e:
+            raise ADBError(str(e))
+
+    def read_bytes(self, src):
+        """
+        Read a file from the device with the sync protocol.
+
+        Returns:
+            bytes: the content of the file.
+        """
+        try:
+            return self._device.sync.read_bytes(src)
+        except adbutils.AdbError as e:
+            raise ADBError(str(e))
+
+    def screenshot(self, path=''):
+        """
+        Capture the screen with screencap and stream it back in the same shell call, which also
+        removes the file from the device.
+
+        Args:
+            path (str, optional): also write the screenshot to this file.
+
+        Returns:
+            numpy.ndarray: the screenshot in BGR, as the automators return it, or None.
+        """
+        if not isinstance(path, str):
+            raise TypeError('expected an str, not %s' % type(path).__name__)
+        # one file per thread, concurrent captures must not read each other's half-written file
+        device_file = SCREENSHOT_FILE % threading.get_ident()
+        data, code = self.shell_bytes('screencap -p {0} && cat {0}; rm -f {0}'.format(device_file))
+        if not data:
+            logger.warning(f"screencap of {self.serial} returned nothing, exit code {code}")
+            return None
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if path and img is not None:
+            from hmbot.utils.cv import write
+            write(path, img)
+        return img
@@ -1,4 +1,6 @@
 from .connector import Connector
+from .session import ShellPool
+from .probe import parse_audio_distributed, parse_ps
 from hmbot.utils.exception import DeviceError, HDCError
 from hmbot.utils.proto import PageInfo, Resource, AudioInfo, AudioType, CameraInfo, CameraType, Status
 from loguru import logger
@@ -11,7 +13,7 @@ except ImportError:
 
 
 class HDC(Connector):
-    def __init__(self, device=None):
+    def __init__(self, device=None, session=True):
         if device is None and len(HDC.devices()) > 0:
             self.serial = HDC.devices()[0]
         from hmbot.device.device import Device
@@ -20,6 +22,8 @@ class HDC(Connector):
         else:
             raise DeviceError
         self.cmd_prefix = ['hdc', "-t", self.serial]
+        # shell commands go through long-lived interactive shells instead of a process each
+        self.session = ShellPool(self.cmd_prefix + ['shell']) if session and ShellPool.available() else None
         self.info = self.page_info()
 
     def run_cmd(self, extra_args):
@@ -29,6 +33,8 @@ class HDC(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise HDCError(msg)
+        if self.session is not None and extra_args and extra_args[0] == 'shell':
+            return self.shell(' '.join(extra_args[1:]))
 
         args = [] + self.cmd_prefix
         args += extra_args
@@ -45,6 +51,12 @@ class HDC(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise HDCError(msg)
+        if self.session is not None:
+            output, code = self.session.run(extra_args)
+            if code != 0:
+                # hdc shell always exits with 0, so a failed command is not an error here either
+                logger.debug('command: %s exited with %d' % (extra_args, code))
+            return output.strip()
         extra_args = 'shell ' + extra_args
         return self.run_cmd(extra_args)
 
@@ -67,6 +79,10 @@ class HDC(Connector):
             msg = "invalid arguments: %s\nshould be str, %s given" % (extra_args, type(extra_args))
             logger.warning(msg)
             raise HDCError(msg)
+        if self.session is not None:
+            # grep on the device; its exit code 1 only means nothing matched
+            command = ' '.join(quote(arg) for arg in extra_args) + ' | grep ' + ' '.join(quote(arg) for arg in grep_args)
+            return self.session.run(command)[0]
 
         args = self.cmd_prefix + ['shell'] + [quote(arg) for arg in extra_args]
         grep_args = ['grep'] + [quote(arg) for arg in grep_args]
@@ -106,23 +122,22 @@ class HDC(Connector):
         logger.debug('return: %s' % r)
         return r.splitlines()
 
-    def get_uid(self, bundle=None):
+    def _process(self, bundle=None):
         if not bundle:
             if not self.info:
                 self.info = self.page_info()
             bundle = self.info.bundle
-        ps_info = self.shell_grep("ps -ef", bundle).split()
-        if len(ps_info) > 2:
-            return ps_info[0]
+        return parse_ps(self.shell_grep("ps -ef", bundle), bundle)
+
+    def get_uid(self, bundle=None):
+        process = self._process(bundle)
+        if process:
+            return process[0]
 
     def get_pid(self, bundle=None):
-        if not bundle:
-            if not self.info:
-                self.info = self.page_info()
-            bundle = self.info.bundle
-        ps_info = self.shell_grep("ps -ef", bundle).split()
-        if len(ps_info) > 2:
-            return ps_info[1]
+        process = self._process(bundle)
+        if process:
+            return process[1]
 
     def get_resources(self, bundle=None):
         if not bundle:
@@ -133,46 +148,10 @@ class HDC(Connector):
                         camera=self.get_camera(bundle))
 
     def get_audio(self, bundle=None):
-        uid = self.get_uid(bundle)
-        pid = self.get_pid(bundle)
-        # todo
-        type = AudioType.MUSIC
-
-        session_id_infos = self.shell_grep("hidumper -s AudioDistributed", "sessionId").splitlines()
-        session_id = 0
-        for session_id_info in session_id_infos:
-            session_id_info = session_id_info.strip()
-            session_id_re = re.compile(f'.*sessionId: (\d+).*appUid: {uid}.*appPid: {pid}.*')
-            match = session_id_re.match(session_id_info)
-            if match:
-                session_id = match.group(1)
-
-        stream_id_infos = self.shell_grep("hidumper -s AudioDistributed", "Stream").splitlines()
-        stream_id_list = []
-        for stream_id_info in stream_id_infos:
-            stream_id_re = re.compile('.*Stream Id: (\d+).*')
-            match = stream_id_re.match(stream_id_info)
-            if match:
-                stream_id = match.groups()[0]
-                stream_id_list.append(stream_id)
-
-        status_infos = self.shell_grep("hidumper -s AudioDistributed", "Status").splitlines()
-        status_list = []
-        for status_info in status_infos:
-            status_info = status_info.strip()
-            status_re = re.compile('.*Status:(.*)')
-            match = status_re.match(status_info)
-            if match:
-                status = match.groups()[0]
-                status_list.append(status)
-        status = ''
-        for index, stream_id in enumerate(stream_id_list):
-            if stream_id == session_id:
-                status = status_list[index]
-        print(f'status={status}')
-        if status in ['RUNNING']:
-            return AudioInfo(type, Status.RUNNING)
-        return AudioInfo(type, Status.STOPPED)
+        process = self._process(bundle)
+        uid, pid = (process[0], process[1]) if process else (None, None)
+        snapshot = parse_audio_distributed(self.shell("hidumper -s AudioDistributed"))
+        return snapshot.audio(uid, pid)
 
     def get_camera(self, bundle=None):
         # todo
@@ -0,0 +1,163 @@
+import re
+from dataclasses import dataclass, field
+from hmbot.utils.proto import AudioInfo, AudioType, Status
+
+# dumpsys audio (Android)
+PLAYBACK_RE = re.compile(r'.*u/pid:(.*)/(.*) .*state:(.*) attr.*')
+FOCUS_REQUEST_RE = re.compile(r'.*uid/pid (\d*)/(\d*) .*clientId=(.*) callingPack=(\S*).*')
+FOCUS_RE = re.compile(r'.* pack: (.*) -- client: (.*) -- gain: (.*) -- flags.* loss: (.*) -- notified.*')
+# hidumper -s AudioDistributed (HarmonyOS)
+SESSION_RE = re.compile(r'.*sessionId: (\d+).*appUid: (\w+).*appPid: (\w+).*')
+STREAM_RE = re.compile(r'.*Stream Id: (\d+).*')
+STATUS_RE = re.compile(r'.*Status:(.*)')
+
+
+@dataclass
+class AndroidAudioSnapshot:
+    """
+    The audio state of an Android device, parsed from one `dumpsys audio`.
+    """
+    # (uid, pid) -> playback state, 'started' if any of its players is started
+    playbacks: dict = field(default_factory=dict)
+    # focus client id -> (uid, pid) of the app that requested it
+    clients: dict = field(default_factory=dict)
+    # (uid, pid) -> (gain, loss) of the focus stack entries
+    focus: dict = field(default_factory=dict)
+    # package -> uid, as seen in focus requests and the focus stack
+    packages: dict = field(default_factory=dict)
+
+    def uid(self, bundle):
+        return self.packages.get(bundle)
+
+    def audio(self, uid):
+        """
+        Returns:
+            AudioInfo: RUNNING if a player of uid is started while some app holds the audio focus.
+        """
+        for (player_uid, _), state in self.playbacks.items():
+            if player_uid == uid and state == 'started' and self.focus:
+                return AudioInfo(AudioType.MUSIC, Status.RUNNING)
+        return AudioInfo(AudioType.MUSIC, Status.STOPPED)
+
+
+@dataclass
+class HarmonyAudioSnapshot:
+    """
+    The audio state of a HarmonyOS device, parsed from one `hidumper -s AudioDistributed`.
+    """
+    # (session id, app uid, app pid) in dump order
+    sessions: list = field(default_factory=list)
+    # stream ids and stream statuses, in dump order; the i-th status belongs to the i-th stream
+    streams: list = field(default_factory=list)
+    statuses: list = field(default_factory=list)
+
+    def session(self, uid, pid):
+        """
+        Returns:
+            str: the id of the last session of the app, or None.
+        """
+        session_id = None
+        for sid, app_uid, app_pid in self.sessions:
+            if app_uid == uid and app_pid == pid:
+                session_id = sid
+        return session_id
+
+    def status(self, session_id):
+        status = ''
+        for index, stream_id in enumerate(self.streams):
+            if stream_id == session_id and index < len(self.statuses):
+                status = self.statuses[index]
+        return status
+
+    def audio(self, uid, pid):
+        """
+        Returns:
+            AudioInfo: RUNNING if the stream of the app's session is running.
+        """
+        if self.status(self.session(uid, pid)) in ['RUNNING']:
+            return AudioInfo(AudioType.MUSIC, Status.RUNNING)
+        return AudioInfo(AudioType.MUSIC, Status.STOPPED)
+
+
+def parse_dumpsys_audio(text):
+    """
+    Parse `dumpsys audio` in a single pass.
+
+    Returns:
+        AndroidAudioSnapshot: the players, focus requests and focus stack of the dump.
+    """
+    snapshot = AndroidAudioSnapshot()
+    stack = []
+    for line in text.splitlines():
+        if 'AudioPlaybackConfiguration' in line:
+            m = PLAYBACK_RE.match(line)
+            if m:
+                key = (m.group(1), m.group(2))
+                if key not in snapshot.playbacks or m.group(3) == 'started':
+                    snapshot.playbacks[key] = m.group(3)
+        if 'requestAudioFocus' in line:
+            m = FOCUS_REQUEST_RE.match(line)
+            if m:
+                snapshot.clients[m.group(3)] = (m.group(1), m.group(2))
+                if m.group(4):
+                    snapshot.packages[m.group(4)] = m.group(1)
+        if 'source' in line:
+            m = FOCUS_RE.match(line)
+            if m:
+                stack.append(m.groups())
+    # the focus stack is printed before the focus requests naming its clients
+    for pack, client, gain, loss in stack:
+        if client in snapshot.clients:
+            uid, pid = snapshot.clients[client]
+            snapshot.focus[(uid, pid)] = (gain, loss)
+            snapshot.packages.setdefault(pack, uid)
+    return snapshot
+
+
+def parse_audio_distributed(text):
+    """
+    Parse `hidumper -s AudioDistributed` in a single pass.
+
+    Returns:
+        HarmonyAudioSnapshot: the sessions and streams of the dump.
+    """
+    snapshot = HarmonyAudioSnapshot()
+    for line in text.splitlines():
+        line = line.strip()
+        if 'sessionId' in line:
+            m = SESSION_RE.match(line)
+            if m:
+                snapshot.sessions.append(m.groups())
+        if 'Stream' in line:
+            m = STREAM_RE.match(line)
+            if m:
+                snapshot.streams.append(m.group(1))
+        if 'Status' in line:
+            m = STATUS_RE.match(line)
+            if m:
+                snapshot.statuses.append(m.group(1))
+    return snapshot
+
+
+def parse_ps(text, bundle):
+    """
+    Find the process of an app in the output of `ps` or `ps -ef`.
+
+    Returns:
+        list: the columns of the first line naming the bundle (user first, pid second), or None.
+    """
+    for line in text.splitlines():
+        if bundle in line:
+            columns = line.split()
+            if len(columns) > 2:
+                return columns
+    return None
+
+
+def android_uid(user):
+    """
+    The uid of an Android app user name, e.g. u0_a12 -> 10012.
+    """
+    if '_a' not in user:
+        return None
+    return str(int(user.split('_a')[1]) + 10000)
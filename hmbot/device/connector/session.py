@@ -0,0 +1,164 @@
+import re
+import uuid
+import threading
+from loguru import logger
+
+try:
+    import pexpect
+except ImportError:
+    pexpect = None
+
+# seconds to wait for a command's end sentinel before the session is dropped
+COMMAND_TIMEOUT = 60
+SPAWN_TIMEOUT = 10
+# terminal control sequences some shells print with their prompts, e.g. bracketed paste
+ESCAPE_RE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+# the terminal turns every \n into \r\n, also those following a \r already
+NEWLINE_RE = re.compile(r'\r+\n')
+
+
+class ShellSession(object):
+    """
+    The class describes one long-lived interactive shell on a device,
+    e.g. `adb -s <serial> shell` or `hdc -t <serial> shell`.
+
+    Every command is framed by a begin and an end sentinel unique to the
+    session; the end sentinel carries the command's exit code. The
+    sentinels are echoed with a quote in the middle, so the terminal echo
+    of the command line never matches them.
+    """
+    def __init__(self, cmd, timeout=COMMAND_TIMEOUT):
+        """
+        Args:
+            cmd (list): the command starting the interactive shell.
+            timeout (float, optional): the default timeout of a command in seconds.
+        """
+        self.cmd = cmd
+        self.timeout = timeout
+        self._tag = '__HMB_%s' % uuid.uuid4().hex[:12]
+        self._end_re = re.compile(r'%s_END_(\d+)\r?\n' % self._tag)
+        self._child = None
+        self._count = 0
+
+    def _spawn(self):
+        self._child = pexpect.spawn(self.cmd[0], self.cmd[1:], encoding='utf-8', codec_errors='replace',
+                                    timeout=SPAWN_TIMEOUT, dimensions=(24, 4096), echo=False)
+        # pexpect sleeps 50ms before every send by default, most of a short command's time
+        self._child.delaybeforesend = None
+        # the device shell has its own terminal settings, turn its echo and prompt off as well
+        self._child.sendline("stty -echo 2>/dev/null; PS1=''; PS2=''")
+        self.run('true', timeout=SPAWN_TIMEOUT)
+        logger.debug('shell session started: %s' % ' '.join(self.cmd))
+
+    def alive(self):
+        return self._child is not None and self._child.isalive()
+
+    def run(self, command, timeout=None):
+        """
+        Run a command in the session.
+
+        Returns:
+            (str, int): the output of the command, with \\n line ends, and its exit code.
+        """
+        if self._child is None:
+            self._spawn()
+        self._count += 1
+        begin = '%s_BEGIN_%d' % (self._tag, self._count)
+        # '_' + '"' + '"' splits the sentinels in the echoed command line
+        self._child.sendline('echo "%s""_BEGIN_%d"; %s\necho "%s""_END_$?"'
+                             % (self._tag, self._count, command, self._tag))
+        timeout = self.timeout if timeout is None else timeout
+        self._child.expect_exact(begin, timeout=timeout)
+        self._child.expect(self._end_re, timeout=timeout)
+        output = NEWLINE_RE.sub('\n', ESCAPE_RE.sub('', self._child.before))
+        if output.startswith('\n'):
+            output = output[1:]
+        return output, int(self._child.match.group(1))
+
+    def close(self):
+        if self._child is not None:
+            self._child.close(force=True)
+            self._child = None
+
+
+class ShellPool(object):
+    """
+    The class describes a small pool of shell sessions to one device.
+
+    A command takes a free session, or starts one while fewer than size
+    exist, so concurrent probes do not wait for each other. A session
+    that dies is dropped and the command is retried once on a fresh one;
+    a session that times out is dropped too, but the command is not
+    retried, as it may still be running on the device.
+    """
+    def __init__(self, cmd, size=3, timeout=COMMAND_TIMEOUT):
+        """
+        Args:
+            cmd (list): the command starting the interactive shell.
+            size (int, optional): the largest number of sessions. Default is 3.
+            timeout (float, optional): the default timeout of a command in seconds.
+        """
+        self.cmd = cmd
+        self.size = size
+        self.timeout = timeout
+        self._free = []
+        self._cond = threading.Condition()
+        self._count = 0
+        self.stats = {'commands': 0, 'sessions': 0, 'reconnects': 0}
+
+    @staticmethod
+    def available():
+        return pexpect is not None
+
+    def _acquire(self):
+        with self._cond:
+            while not self._free and self._count >= self.size:
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            self._count += 1
+            self.stats['sessions'] += 1
+            return ShellSession(self.cmd, self.timeout)
+
+    def _release(self, session, broken=False):
+        if broken:
+            session.close()
+        with self._cond:
+            if broken:
+                self._count -= 1
+            else:
+                self._free.append(session)
+            # a broken session frees a slot for a new one, wake a waiter either way
+            self._cond.notify()
+
+    def run(self, command, timeout=None):
+        """
+        Run a command on a free session.
+
+        Returns:
+            (str, int): the output of the command and its exit code.
+        """
+        with self._cond:
+            self.stats['commands'] += 1
+        for attempt in range(2):
+            session = self._acquire()
+            try:
+                result = session.run(command, timeout)
+            except Exception as e:
+                # whatever failed, the session's slot is given back
+                self._release(session, broken=True)
+                if attempt or not isinstance(e, (pexpect.EOF, OSError)):
+                    raise
+                with self._cond:
+                    self.stats['reconnects'] += 1
+                logger.warning('shell session of %s failed (%s), reconnecting' % (' '.join(self.cmd), type(e).__name__))
+                continue
+            self._release(session)
+            return result
+
+    def close(self):
+        with self._cond:
+            sessions, self._free = self._free, []
+            self._count -= len(sessions)
+        for session in sessions:
+            session.close()
@@ -1,34 +1,47 @@
 import sys
 import time
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from loguru import logger
 from ..utils.exception import*
 from ..utils.proto import SwipeDirection
-from ..utils.rfl.system_rfl import system_rfl
+from ..utils.rfl.system_rfl import system_rfl, connector_rfl
 from ..model.page import Page
+from .settle import SettleDetector
+from .capture import CaptureLoader, PROFILES, FULL
+
+# seconds each probe of a concurrent capture may take
+PROBE_TIMEOUTS = {'vht': 30, 'img': 30, 'rsc': 15, 'info': 15}
+# probes a page can do without; the others fail the capture when they time out
+OPTIONAL_PROBES = ('rsc',)
 
 class Device(object):
     """
     The class describes a connected device
     """
 
-    def __init__(self, device_serial, operating_system):
+    def __init__(self, device_serial, operating_system, connector=None):
         """
         Initialize a device connection
         Args:
             device_serial (str): The serial of device.
             operating_system (str): The operating system of device.
+            connector (str, optional): The connector to use instead of the default one, e.g. 'adbutils'.
         """
         self.serial = device_serial
         self.operating_system = operating_system
         try:
             connector_cls, automator_cls = system_rfl[self.operating_system]
+            if connector is not None:
+                connector_cls = connector_rfl[connector]
             self.connector = connector_cls(self)
             self.automator = automator_cls(self)
         except OSKeyError:
             logger.error("%s is not supported" % operating_system)
             sys.exit(-1)
         self.page = None
+        self.settle_detector = SettleDetector(self)
+        self.concurrent_capture = True
 
     def __call__(self, **kwds):
         self.dump_page(refresh=True)
@@ -81,6 +94,9 @@ class Device(object):
         return self.automator.dump_hierarchy(device)
 
     def screenshot(self, path=''):
+        # a connector capturing the screen itself (NativeADB, over the sync protocol) replaces the automator
+        if hasattr(self.connector, 'screenshot'):
+            return self.connector.screenshot(path)
         return self.automator.screenshot(path)
 
     def home(self):
@@ -95,17 +111,123 @@ class Device(object):
     def page_info(self):
         return self.connector.page_info()
     
-    def dump_page(self, device=None, refresh=False):
+    def dump_page(self, device=None, refresh=False, profile=FULL, concurrent=None, timeouts=None, max_skew=None,
+                  retries=2):
+        """
+        Capture the current page: its hierarchy, screenshot, resources and page info.
+
+        Args:
+            refresh (bool, optional): capture again instead of returning the last page. Default is False.
+            profile (str, optional): the capture profile, one of capture.PROFILES. Parts it leaves out
+                are fetched from the device when the page first accesses them. Default is FULL.
+            concurrent (bool, optional): run the probes concurrently. Default is self.concurrent_capture.
+            timeouts (dict, optional): seconds per probe, overriding PROBE_TIMEOUTS.
+            max_skew (float, optional): the largest spread in seconds between the probes of a
+                concurrent capture; a capture beyond it is retried. Default is no limit.
+            retries (int, optional): how often to retry a skewed capture. Default is 2.
+        """
         if device is None:
             device = self
         if self.page == None or refresh:
-            vht = self.dump_hierarchy(device=device)
-            img = self.screenshot()
-            rsc = self.resources()
-            info = self.page_info()
-            self.page = Page(vht=vht, img=img, rsc=rsc, info=info)
+            probes = {'vht': lambda: self.dump_hierarchy(device=device),
+                      'img': self.screenshot,
+                      'rsc': self.resources,
+                      'info': self.page_info}
+            probes = {name: probes[name] for name in PROFILES[profile]}
+            if len(probes) > 1 and (self.concurrent_capture if concurrent is None else concurrent):
+                parts, timestamps, skew = self._capture(probes, dict(PROBE_TIMEOUTS, **(timeouts or {})),
+                                                        max_skew, retries)
+            else:
+                parts, timestamps = {}, {}
+                for name, probe in probes.items():
+                    parts[name], timestamps[name] = self._timed(probe)
+                skew = 0.0
+            if profile == FULL and len(parts) == len(probes):
+                self.page = Page(vht=parts['vht'], img=parts['img'], rsc=parts['rsc'], info=parts['info'])
+            else:
+                # a reduced profile, or an optional probe timed out: the missing parts are fetched on access
+                self.page = Page(None, None, None, None, loader=CaptureLoader(self, device, parts))
+            self.page.timestamps = timestamps
+            self.page.skew = skew
         return self.page
 
+    def _capture(self, probes, timeouts, max_skew, retries):
+        """
+        Run the probes of a page on a thread pool, so a capture takes about as long as the slowest probe.
+        Every part is timestamped with the (start, end) of its probe; the skew of the capture is the
+        spread of the probes' midpoints.
+
+        Every attempt gets its own pool with a thread per probe, which is shut down without waiting:
+        a probe that timed out is abandoned to finish on its thread and never delays a later capture.
+        An optional probe that timed out is left out of the parts, so the page fetches it when accessed.
+
+        Returns:
+            (dict, dict, float): the parts, their timestamps and the skew.
+        """
+        best = None
+        for _ in range(retries + 1):
+            pool = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix='capture-%s' % self.serial)
+            try:
+                submitted = time.perf_counter()
+                futures = {name: pool.submit(self._timed, probe) for name, probe in probes.items()}
+                parts, timestamps = {}, {}
+                for name, future in futures.items():
+                    try:
+                        timeout = max(0, submitted + timeouts[name] - time.perf_counter())
+                        parts[name], timestamps[name] = future.result(timeout=timeout)
+                    except FutureTimeout:
+                        future.cancel()
+                        if name not in OPTIONAL_PROBES:
+                            raise TimeoutError('%s probe of %s timed out after %ss'
+                                               % (name, self.serial, timeouts[name]))
+                        logger.warning(f"{name} probe of {self.serial} timed out after {timeouts[name]}s")
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+            middles = [(start + end) / 2 for start, end in timestamps.values()]
+            skew = max(middles) - min(middles)
+            if best is None or skew < best[2]:
+                best = (parts, timestamps, skew)
+            if max_skew is None or skew <= max_skew:
+                break
+            logger.debug(f"Capture skewed by {skew:.2f}s on {self.serial}, retrying")
+        if max_skew is not None and best[2] > max_skew:
+            logger.warning(f"Capture skewed by {best[2]:.2f}s on {self.serial}, above {max_skew}s")
+        return best
+
+    @staticmethod
+    def _timed(probe):
+        start = time.time()
+        result = probe()
+        return result, (start, time.time())
+
+    def settle(self, label='action', timeout=None):
+        """
+        Wait until the screen is stable after an action.
+
+        Args:
+            label (str, optional): the kind of action, settle times are recorded per label.
+            timeout (float, optional): the deadline in seconds, the detector's default if not given.
+
+        Returns:
+            float: the seconds waited.
+        """
+        return self.settle_detector.wait(label, timeout)
+
+    def wait_for(self, timeout=10, gone=False, **selector):
+        """
+        Wait until an element appears on screen, or disappears if gone.
+
+        Args:
+            timeout (float, optional): the deadline in seconds. Default is 10.
+            gone (bool, optional): wait for the element to disappear instead. Default is False.
+            selector: VHT node attributes to match, e.g. text='OK'.
+
+        Returns:
+            VHTNode or bool: the first matched node, None on timeout;
+            if gone, whether the element disappeared in time.
+        """
+        return self.automator.wait_for(self, selector, timeout, gone)
+
     def hop(self, dst_device_name=None, app_name=None):
         return self.automator.hop(dst_device_name, app_name)
     
@@ -0,0 +1,129 @@
+import time
+from collections import deque
+from loguru import logger
+from ..utils.cv import thumbnail, block_diff
+
+INFO = 'info'
+HIERARCHY = 'hierarchy'
+SCREEN = 'screen'
+# the most recent waits kept in SettleDetector.records
+MAX_RECORDS = 1000
+
+
+class SettleDetector(object):
+    """
+    The class describes a detector waiting until the device screen is stable.
+
+    After an action the cheap signals, the foreground page info and a
+    downscaled screenshot, are sampled until `stable` consecutive samples
+    agree; screenshots agree when at most `tolerance` of their blocks
+    differ. The hierarchy fingerprint then confirms: once the cheap signals
+    are stable it is taken, and the screen is settled when it equals the
+    fingerprint taken at the previous confirmation of the same wait;
+    otherwise sampling goes on. The wait is cut at `timeout`. The most
+    recent waits are recorded with their label, and every wait is added to
+    a per-label summary, so settle times can be tuned per action.
+    """
+    def __init__(self, device, signals=(INFO, HIERARCHY, SCREEN), stable=2, interval=0.2,
+                 timeout=3.0, tolerance=0.01, min_wait=0.3):
+        """
+        Args:
+            device (Device): the device to watch.
+            signals (tuple, optional): the signals compared, among INFO, HIERARCHY and SCREEN. Default is all.
+            stable (int, optional): how many consecutive samples must equal the previous one. Default is 2.
+            interval (float, optional): seconds between samples. Default is 0.2.
+            timeout (float, optional): the default deadline of a wait in seconds. Default is 3,
+                the fixed sleep the detector replaces.
+            tolerance (float, optional): the share of screenshot blocks allowed to change between
+                stable samples, e.g. for a blinking cursor. Default is 0.01.
+            min_wait (float, optional): seconds before the first sample, so the app can start
+                reacting to the action. Default is 0.3.
+        """
+        self.device = device
+        self.signals = signals
+        # the hierarchy dump is the most expensive probe, it is only sampled if nothing cheaper is
+        self.cheap = tuple(signal for signal in signals if signal != HIERARCHY) or (HIERARCHY,)
+        self.confirm = HIERARCHY in signals and HIERARCHY not in self.cheap
+        self.stable = stable
+        self.interval = interval
+        self.timeout = timeout
+        self.tolerance = tolerance
+        self.min_wait = min_wait
+        self.records = deque(maxlen=MAX_RECORDS)
+        self._summary = {}
+
+    def _sample(self, signals):
+        sample = {}
+        if INFO in signals:
+            info = self.device.page_info()
+            sample[INFO] = None if info is None else (info.bundle, info.ability)
+        if HIERARCHY in signals:
+            sample[HIERARCHY] = self.device.dump_hierarchy().fingerprint().root
+        if SCREEN in signals:
+            img = self.device.screenshot()
+            sample[SCREEN] = None if img is None else thumbnail(img)
+        return sample
+
+    def _same(self, sample1, sample2):
+        for signal in (INFO, HIERARCHY):
+            if signal in sample1 and sample1[signal] != sample2[signal]:
+                return False
+        if SCREEN in sample1:
+            thumb1, thumb2 = sample1[SCREEN], sample2[SCREEN]
+            if thumb1 is None or thumb2 is None:
+                return thumb1 is thumb2
+            return block_diff(thumb1, thumb2, thumb1.shape[::-1]) <= self.tolerance
+        return True
+
+    def wait(self, label='action', timeout=None):
+        """
+        Wait until the screen is stable or the deadline passes.
+
+        Args:
+            label (str, optional): the kind of action waited for, used in the records. Default is 'action'.
+            timeout (float, optional): the deadline in seconds. Default is self.timeout.
+
+        Returns:
+            float: the seconds waited.
+        """
+        start = time.perf_counter()
+        deadline = start + (self.timeout if timeout is None else timeout)
+        time.sleep(self.min_wait)
+        previous = self._sample(self.cheap)
+        samples, stable, settled = 1, 0, False
+        confirmed = None
+        while not settled and time.perf_counter() < deadline:
+            time.sleep(self.interval)
+            sample = self._sample(self.cheap)
+            samples += 1
+            stable = stable + 1 if self._same(previous, sample) else 0
+            previous = sample
+            if stable < self.stable:
+                continue
+            if not self.confirm:
+                settled = True
+                continue
+            fingerprint = self._sample((HIERARCHY,))[HIERARCHY]
+            settled = fingerprint == confirmed
+            confirmed = fingerprint
+            # one more stable cheap sample before the next confirmation
+            stable = self.stable - 1
+        elapsed = time.perf_counter() - start
+        self.records.append((label, elapsed, samples, settled))
+        entry = self._summary.setdefault(label, {'waits': 0, 'mean': 0.0, 'max': 0.0, 'timeouts': 0})
+        entry['waits'] += 1
+        entry['mean'] += (elapsed - entry['mean']) / entry['waits']
+        entry['max'] = max(entry['max'], elapsed)
+        entry['timeouts'] += int(not settled)
+        if not settled:
+            logger.warning(f"Screen not settled after {label} within {elapsed:.1f}s")
+        else:
+            logger.debug(f"Screen settled after {label} in {elapsed:.2f}s ({samples} samples)")
+        return elapsed
+
+    def summary(self):
+        """
+        Returns:
+            dict: per label, the number of waits, their mean and maximum seconds and how many timed out.
+        """
+        return {label: dict(entry) for label, entry in self._summary.items()}
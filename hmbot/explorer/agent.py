@@ -1,11 +1,12 @@
 import subprocess
-import time
 from loguru import logger
 from hmbot.explorer.llm import GeneralLLM, SpecializedLLM
 import re
 import json
 from hmbot.explorer.prompt import *
 from hmbot.utils.cv import encode_image
+from hmbot.model.event import ClickEvent
+from hmbot.device.capture import SCREENSHOT, SCREENSHOT_RESOURCES
 
 
 class Agent(object):
@@ -61,8 +62,8 @@ class MobilePhoneAgent(Agent):
         """
         Explore the mobile phone
         """
-        # get screenshot and resource status
-        page = self.device.dump_page(refresh=True)
+        # get screenshot and resource status, the hierarchy is only dumped if a click needs it
+        page = self.device.dump_page(refresh=True, profile=SCREENSHOT_RESOURCES)
         screenshot = page.img
         resource_status = page.rsc
 
@@ -115,11 +116,15 @@ class MobilePhoneAgent(Agent):
                     (start_abs[1] + start_abs[3]) // 2
                 )
                 print(f"Click coordinates: {center_pos}")
-                # Execute click operation
-                self.device.click(*center_pos)
-            time.sleep(3)
-
-            page = self.device.dump_page(refresh=True)
+                # Execute click operation on the node the box refers to
+                node = page.vht.grid().node_for_box(start_abs)
+                if node is not None:
+                    ClickEvent(node).execute()
+                else:
+                    self.device.click(*center_pos)
+            self.device.settle(parsed_output["action"])
+
+            page = self.device.dump_page(refresh=True, profile=SCREENSHOT_RESOURCES)
             screenshot = page.img
             resource_status = page.rsc
             messages.append({
@@ -278,7 +283,7 @@ class HardwareTestAgent(Agent):
         Test the hardware
         """
         logger.debug("-----------------------Hardware test-----------------------")
-        page = self.device.dump_page(refresh=True)
+        page = self.device.dump_page(refresh=True, profile=SCREENSHOT)
         screenshot = page.img
         messages = [
             {
@@ -0,0 +1,123 @@
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from hmbot.model.ptg import PTGParser
+from hmbot.explorer.planner import EdgePlanner
+from hmbot.explorer.verdict_cache import VerdictCache, app_bundle, app_version
+from hmbot.explorer.ptg_verify import PTG_IR, PTGVerifier
+
+
+class VerificationCoordinator(object):
+    """
+    The class describes a coordinator verifying one PTG on several devices.
+
+    The edge schedule of the planner is cut into navigation-local clusters,
+    consecutive runs of the schedule, which are handed out from a shared
+    queue to one PTGVerifier per device. The verifiers share a single
+    PTG_IR, which deduplicates the pages they discover, the visited pages
+    and the verdict cache. Having several clusters per device keeps the
+    devices busy until the queue is empty, whatever their speed.
+    """
+    def __init__(self, devices, ptg_dir_path, app=None, cache_file=None, clusters_per_device=4, store=None):
+        """
+        Args:
+            devices (list): the devices to verify on.
+            ptg_dir_path (str): the path to the PTG directory.
+            app (App, optional): the app under test, lets the navigators restart it.
+            cache_file (str, optional): the verdict cache database shared by the verifiers.
+            clusters_per_device (int, optional): how many clusters to cut per device. Default is 4.
+            store (PTGStore, optional): persist the pages and transitions the verifiers find.
+        """
+        self.devices = devices
+        self.app = app
+        self.clusters_per_device = clusters_per_device
+        self.ptg_ir = PTG_IR(PTGParser.parse(devices[0], ptg_dir_path, lazy=True), store)
+        self.visited_pages_id = set()
+        self.verdict_cache = VerdictCache(cache_file, app_bundle(app), app_version(app)) if cache_file else None
+        self.verifiers = []
+        for device in devices:
+            verifier = PTGVerifier(device, ptg_dir_path, app=app, ptg_ir=self.ptg_ir,
+                                   visited_pages_id=self.visited_pages_id)
+            verifier.verdict_cache = self.verdict_cache
+            self.verifiers.append(verifier)
+        self.report = {}
+
+    def clusters(self, start_id=0):
+        """
+        Cut the edge schedule into clusters of about equal cost in events.
+
+        Returns:
+            list: the clusters, lists of (page_before_id, page_after_id) in schedule order.
+        """
+        planner = EdgePlanner(self.ptg_ir, allow_restart=self.app is not None)
+        edges = planner.plan(start_id).edges
+        if not edges:
+            return []
+        count = min(len(edges), len(self.devices) * self.clusters_per_device)
+        costs = [max(1, len(self.ptg_ir.transitions[src][tgt])) for src, tgt in edges]
+        budget = sum(costs) / count
+        clusters = [[]]
+        cost = 0
+        for edge, edge_cost in zip(edges, costs):
+            if cost >= budget and len(clusters) < count:
+                clusters.append([])
+                cost = 0
+            clusters[-1].append(edge)
+            cost += edge_cost
+        return clusters
+
+    def verify(self, start_id=0):
+        """
+        Verify every transition of the PTG on all devices.
+
+        Returns:
+            dict: the report, with the clusters and actions of every device.
+        """
+        clusters = self.clusters(start_id)
+        work = queue.Queue()
+        for cluster in clusters:
+            work.put(cluster)
+        pages = len(self.ptg_ir.pages)
+        logger.info(f"Verifying {sum(len(cluster) for cluster in clusters)} transitions "
+                    f"in {len(clusters)} clusters on {len(self.devices)} devices")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(self.verifiers), thread_name_prefix='verifier') as pool:
+            reports = list(pool.map(lambda verifier: self._work(verifier, work), self.verifiers))
+        elapsed = time.perf_counter() - start
+        self.report = {'devices': {device.serial: report for device, report in zip(self.devices, reports)},
+                       'clusters': len(clusters),
+                       'unverified_clusters': work.qsize(),
+                       'new_pages': len(self.ptg_ir.pages) - pages,
+                       'seconds': elapsed}
+        for serial, report in self.report['devices'].items():
+            logger.info(f"Device {serial}: {report['clusters']} clusters, {report['edges']} transitions, "
+                        f"{report['actions']} actions in {report['seconds']:.1f}s")
+        logger.info(f"Verified {len(clusters) - work.qsize()} of {len(clusters)} clusters in {elapsed:.1f}s, "
+                    f"{self.report['new_pages']} new pages")
+        if self.verdict_cache is not None:
+            self.verdict_cache.close()
+        return self.report
+
+    def _work(self, verifier, work):
+        """
+        Verify clusters from the queue on one device until the queue is empty or the device fails.
+        """
+        report = {'clusters': 0, 'edges': 0, 'actions': 0, 'seconds': 0.0}
+        start = time.perf_counter()
+        while True:
+            try:
+                cluster = work.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                verifier.verify_edges(cluster)
+            except Exception:
+                logger.exception(f"Device {verifier.device.serial} failed, returning its cluster to the queue")
+                work.put(cluster)
+                break
+            report['clusters'] += 1
+            report['edges'] += len(cluster)
+        report['actions'] = verifier.report.get('actual_actions', 0)
+        report['seconds'] = time.perf_counter() - start
+        return report
@@ -0,0 +1,127 @@
+import time
+import zss
+import numpy as np
+from loguru import logger
+from hmbot.model.vht import VHTNode
+from hmbot.model.profile import profile_distances
+from hmbot.utils.cv import hamming
+
+SAME = 'same'
+DIFFERENT = 'different'
+AMBIGUOUS = 'ambiguous'
+
+
+class PageEquivalence(object):
+    """
+    The class describes a tiered page-equivalence engine.
+
+    Pages are compared in stages of increasing cost and each stage either
+    decides or passes the pair on:
+        1. fingerprint: equal structural fingerprints are the same page
+        2. profile: bag-of-paths profile distance, vectorized over all candidates;
+           it ignores text and bounds, so it only rejects pages and orders the rest
+        3. image: hamming distance of the screenshots' difference hashes
+        4. tree: tree edit distance of the VHTs
+        5. llm: the LLM judge, as a last resort
+    """
+    def __init__(self, llm_judge=None,
+                 profile_threshold=0.4,
+                 image_thresholds=(4, 20),
+                 tree_thresholds=(3, 30)):
+        """
+        Args:
+            llm_judge (callable, optional): llm_judge(page1, page2) -> bool, called for pairs no other stage decides.
+            profile_threshold (float): profile distances at or above it are different pages.
+            image_thresholds ((int, int)): hamming distances of image hashes at or below the first are
+                the same page, at or above the second are different pages.
+            tree_thresholds ((int, int)): the same for the tree edit distance.
+        """
+        self.llm_judge = llm_judge
+        self.profile_threshold = profile_threshold
+        self.image_thresholds = image_thresholds
+        self.tree_thresholds = tree_thresholds
+        self.stats = {}
+
+    def same(self, page1, page2):
+        """
+        Check if the two pages are the same
+        """
+        if page1.fingerprint() == page2.fingerprint():
+            self._record('fingerprint', SAME, 0, 0.0)
+            return True
+        start = time.perf_counter()
+        distance = float(profile_distances(page1.profile(), page2.profile())[0])
+        verdict = DIFFERENT if distance >= self.profile_threshold else AMBIGUOUS
+        self._record('profile', verdict, distance, time.perf_counter() - start)
+        if verdict == DIFFERENT:
+            return False
+        return self._slow_stages(page1, page2)
+
+    def find(self, page, pages):
+        """
+        Find a page equivalent to page among pages
+
+        Args:
+            page: Page object, the page to look up
+            pages: list of Page objects, the candidates
+
+        Returns:
+            Page object, the equivalent page, or None
+        """
+        if not pages:
+            return None
+        start = time.perf_counter()
+        fingerprint = page.fingerprint()
+        for candidate in pages:
+            if candidate.fingerprint() == fingerprint:
+                self._record('fingerprint', SAME, 0, time.perf_counter() - start)
+                return candidate
+        self._record('fingerprint', DIFFERENT, len(pages), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        profiles = np.stack([candidate.profile() for candidate in pages])
+        distances = profile_distances(page.profile(), profiles)
+        order = np.argsort(distances, kind='stable')
+        ambiguous = [pages[index] for index in order if distances[index] < self.profile_threshold]
+        self._record('profile', AMBIGUOUS if ambiguous else DIFFERENT, len(ambiguous), time.perf_counter() - start)
+        for candidate in ambiguous:
+            if self._slow_stages(candidate, page):
+                return candidate
+        return None
+
+    def _slow_stages(self, page1, page2):
+        start = time.perf_counter()
+        distance = hamming(page1.img_hash().dhash, page2.img_hash().dhash)
+        verdict = self._verdict(distance, self.image_thresholds)
+        self._record('image', verdict, distance, time.perf_counter() - start)
+        if verdict != AMBIGUOUS:
+            return verdict == SAME
+
+        start = time.perf_counter()
+        distance = zss.simple_distance(page1.vht._root, page2.vht._root,
+                                       get_children=VHTNode.get_children, get_label=VHTNode.get_label)
+        distance = distance[0] if isinstance(distance, tuple) else distance
+        verdict = self._verdict(distance, self.tree_thresholds)
+        self._record('tree', verdict, distance, time.perf_counter() - start)
+        if verdict != AMBIGUOUS or self.llm_judge is None:
+            return verdict == SAME
+
+        start = time.perf_counter()
+        is_same = bool(self.llm_judge(page1, page2))
+        self._record('llm', SAME if is_same else DIFFERENT, is_same, time.perf_counter() - start)
+        return is_same
+
+    @staticmethod
+    def _verdict(distance, thresholds):
+        low, high = thresholds
+        if distance <= low:
+            return SAME
+        if distance >= high:
+            return DIFFERENT
+        return AMBIGUOUS
+
+    def _record(self, stage, verdict, value, elapsed):
+        stat = self.stats.setdefault(stage, {SAME: 0, DIFFERENT: 0, AMBIGUOUS: 0, 'time': 0.0})
+        stat[verdict] += 1
+        stat['time'] += elapsed
+        logger.info(f"Page equivalence stage={stage} verdict={verdict} value={value} time={elapsed * 1000:.2f}ms")
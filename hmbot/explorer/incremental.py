@@ -0,0 +1,118 @@
+from collections import deque
+from loguru import logger
+from hmbot.device.capture import LAYOUT
+from hmbot.explorer.equivalence import PageEquivalence
+from hmbot.explorer.navigator import Navigator
+
+CHANGED = 'changed'
+UNREACHED = 'unreached'
+
+
+class ChangeSurvey(object):
+    """
+    The class describes the cheap pass of an incremental re-verification.
+
+    Every page of the saved PTG reachable from the start page is visited
+    once, along the transitions of a breadth-first spanning tree, and its
+    fingerprint is compared with the saved one. The survey navigates with
+    its own navigator, without the LLM judge and fallback: the events into
+    a page are replayed without checking where they land, so a changed
+    page is captured and reported as changed, and a page that cannot be
+    reached any more is reported as unreached.
+    """
+    def __init__(self, device, ptg_ir, app=None, near=True):
+        """
+        Args:
+            device (Device): the device to capture the pages on.
+            ptg_ir (PTG_IR): the saved pages and transitions.
+            app (App, optional): the app under test, lets the navigator restart it.
+            near (bool, optional): compare the coarse layout fingerprints, ignoring text and
+                                   attribute changes. Default is True.
+        """
+        self.device = device
+        self.ptg_ir = ptg_ir
+        self.navigator = Navigator(device, ptg_ir, PageEquivalence(), app=app)
+        self.near = near
+        self.captured = {}
+
+    def _order(self, start_id):
+        """
+        The pages reachable from start_id, in breadth-first order.
+        """
+        order = [start_id]
+        seen = {start_id}
+        queue = deque([start_id])
+        while queue:
+            page_id = queue.popleft()
+            for tgt in self.ptg_ir.transitions.get(page_id, {}):
+                if tgt not in seen:
+                    seen.add(tgt)
+                    order.append(tgt)
+                    queue.append(tgt)
+        return order
+
+    def survey(self, start_id, current_id=None):
+        """
+        Capture every reachable page and compare it with the saved PTG.
+
+        Args:
+            start_id (int): the page to survey from.
+            current_id (int, optional): the page the device shows, located if not given.
+
+        Returns:
+            (dict, int): the changed page ids mapped to CHANGED or UNREACHED,
+            and the id of the page the device ends on (None if unknown).
+        """
+        changed = {}
+        for page_id in self._order(start_id):
+            if not self.navigator.navigate(page_id, current_id, check_target=False):
+                changed[page_id] = UNREACHED
+                current_id = None
+                continue
+            current_id = page_id
+            page = self.device.dump_page(refresh=True, profile=LAYOUT)
+            self.captured[page_id] = page
+            if page.fingerprint(self.near) != self.ptg_ir.pages[page_id].fingerprint(self.near):
+                changed[page_id] = CHANGED
+        unreachable = [page.id for page in self.ptg_ir.pages if page.id not in self.captured and page.id not in changed]
+        for page_id in unreachable:
+            changed[page_id] = UNREACHED
+        logger.info(f"Surveyed {len(self.captured)} pages: "
+                    f"{sum(1 for reason in changed.values() if reason == CHANGED)} changed, "
+                    f"{sum(1 for reason in changed.values() if reason == UNREACHED)} unreached")
+        return changed, current_id
+
+
+def changed_subgraph(transitions, changed, radius=1):
+    """
+    Select the transitions to re-verify after some pages changed: those
+    into or out of a changed page, and those of the pages up to radius
+    transitions downstream of a changed page.
+
+    Args:
+        transitions (dict): the src -> {tgt: events} transitions of the PTG.
+        changed (iterable): the ids of the changed pages.
+        radius (int, optional): how many transitions downstream to re-verify. Default is 1.
+
+    Returns:
+        (set, list): the ids of the pages of the subgraph and its (src, tgt) transitions.
+    """
+    changed = set(changed)
+    # the downstream neighbourhood, breadth-first from the changed pages
+    depth = {page_id: 0 for page_id in changed}
+    queue = deque(changed)
+    while queue:
+        page_id = queue.popleft()
+        if depth[page_id] >= radius:
+            continue
+        for tgt in transitions.get(page_id, {}):
+            if tgt not in depth:
+                depth[tgt] = depth[page_id] + 1
+                queue.append(tgt)
+    edges = [(src, tgt) for src, tgts in transitions.items() for tgt in tgts
+             if src in depth or tgt in changed]
+    pages = set(depth)
+    for src, tgt in edges:
+        pages.add(src)
+        pages.add(tgt)
+    return pages, edges
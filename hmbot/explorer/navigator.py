@@ -0,0 +1,224 @@
+import time
+import heapq
+from loguru import logger
+from hmbot.device.capture import LAYOUT
+
+RESTART = 'restart'
+# seconds assumed for an edge that has not been executed yet
+DEFAULT_LATENCY = 3.0
+RESTART_LATENCY = 8.0
+# deadlines in seconds for the screen to settle after a step
+EVENT_TIMEOUT = 3
+RESTART_TIMEOUT = 5
+
+
+class EdgeStats(object):
+    """
+    The class describes the measured cost of a PTG edge: an exponentially
+    weighted average of its execution latency and its success rate.
+    """
+    def __init__(self, latency=DEFAULT_LATENCY, alpha=0.5):
+        self.latency = latency
+        self.alpha = alpha
+        self.attempts = 0
+        self.successes = 0
+
+    def record(self, latency, success):
+        if self.attempts == 0:
+            self.latency = latency
+        else:
+            self.latency = self.alpha * latency + (1 - self.alpha) * self.latency
+        self.attempts += 1
+        self.successes += int(success)
+
+    @property
+    def success_rate(self):
+        # Laplace smoothing keeps unexecuted edges usable but less attractive than proven ones
+        return (self.successes + 1) / (self.attempts + 2)
+
+    @property
+    def weight(self):
+        """
+        The expected time to traverse the edge, retrying until it succeeds.
+        """
+        return self.latency / self.success_rate
+
+
+class Navigator(object):
+    """
+    The class describes a navigator that drives the device to a PTG page
+    along the cheapest known path of PTG_IR transitions.
+
+    Edges are weighted by their measured latency and success rate. An app
+    restart is modelled as an edge from every page to the main page, so a
+    path may start with a restart followed by a replay from the main page.
+    The LLM fallback is only used when no known path reaches the target.
+    """
+    def __init__(self, device, ptg_ir, equivalence, app=None, main_page_id=0, fallback=None):
+        """
+        Args:
+            device (Device): the device to navigate.
+            ptg_ir (PTG_IR): the pages and transitions to navigate over.
+            equivalence (PageEquivalence): decides whether the device reached the expected page.
+            app (App, optional): the app under test, enables restart edges.
+            main_page_id (int, optional): the page shown after an app restart. Default is 0.
+            fallback (callable, optional): fallback(current_page, target_page) called when no path exists.
+        """
+        self.device = device
+        self.ptg_ir = ptg_ir
+        self.equivalence = equivalence
+        self.app = app
+        self.main_page_id = main_page_id
+        self.fallback = fallback
+        self.edge_stats = {}
+        self.restart_stats = EdgeStats(RESTART_LATENCY)
+        self.stats = {'navigations': 0, 'reached': 0, 'steps': 0, 'actions': 0, 'restarts': 0, 'replans': 0, 'fallbacks': 0}
+
+    def _edge(self, src_id, tgt_id):
+        if (src_id, tgt_id) not in self.edge_stats:
+            self.edge_stats[(src_id, tgt_id)] = EdgeStats()
+        return self.edge_stats[(src_id, tgt_id)]
+
+    def shortest_path(self, src_id, tgt_id, avoid=()):
+        """
+        Find the cheapest path between two pages with Dijkstra's algorithm.
+
+        Args:
+            src_id (int): the page to start from, None if unknown (only a restart leaves it).
+            tgt_id (int): the page to reach.
+            avoid (iterable, optional): (src_id, tgt_id) edges not to use.
+
+        Returns:
+            list: the (src_id, tgt_id) steps of the path, a restart step being (src_id, RESTART);
+            [] if src_id is tgt_id, None if there is no path.
+        """
+        if src_id == tgt_id:
+            return []
+        avoid = set(avoid)
+        dist = {src_id: 0.0}
+        prev = {}
+        heap = [(0.0, 0, src_id)]
+        counter = 1
+        restarted = False
+        while heap:
+            d, _, page_id = heapq.heappop(heap)
+            if d > dist.get(page_id, float('inf')):
+                continue
+            if page_id == tgt_id:
+                break
+            steps = [(tgt, self._edge(page_id, tgt).weight)
+                     for tgt in self.ptg_ir.transitions.get(page_id, {}) if (page_id, tgt) not in avoid]
+            # the restart edge only needs to be relaxed from the cheapest page, which is popped first
+            if self.app is not None and not restarted and (page_id, RESTART) not in avoid:
+                restarted = True
+                steps.append((RESTART, self.restart_stats.weight))
+            for tgt, weight in steps:
+                node = self.main_page_id if tgt == RESTART else tgt
+                if d + weight < dist.get(node, float('inf')):
+                    dist[node] = d + weight
+                    prev[node] = (page_id, tgt)
+                    heapq.heappush(heap, (d + weight, counter, node))
+                    counter += 1
+        if tgt_id not in prev:
+            return None
+        path = []
+        node = tgt_id
+        while node != src_id:
+            page_id, tgt = prev[node]
+            path.append((page_id, tgt))
+            node = page_id
+        path.reverse()
+        return path
+
+    def path_cost(self, path):
+        return sum(self.restart_stats.weight if tgt == RESTART else self._edge(src, tgt).weight
+                   for src, tgt in path)
+
+    def locate(self, page=None):
+        """
+        Find the PTG page the device is showing.
+
+        Returns:
+            int: the id of the page, or None.
+        """
+        page = page or self.device.dump_page(refresh=True, profile=LAYOUT)
+        found = self.equivalence.find(page, self.ptg_ir.pages)
+        return None if found is None else found.id
+
+    def navigate(self, target_id, current_id=None, max_replans=3, check_target=True):
+        """
+        Drive the device to a page.
+
+        Args:
+            target_id (int): the id of the page to reach.
+            current_id (int, optional): the id of the page the device shows, located if not given.
+            max_replans (int, optional): how often to re-plan after an edge led elsewhere. Default is 3.
+            check_target (bool, optional): check the page the last step lands on. Without the check
+                the target is reached once its incoming events are replayed. Default is True.
+
+        Returns:
+            bool: whether the device reached the target page.
+        """
+        self.stats['navigations'] += 1
+        if current_id is None:
+            current_id = self.locate()
+        failed = set()
+        for _ in range(max_replans + 1):
+            path = self.shortest_path(current_id, target_id, avoid=failed)
+            if path is None:
+                break
+            if not path:
+                self.stats['reached'] += 1
+                return True
+            logger.info(f"Navigating {current_id} -> {target_id} via {path} (cost {self.path_cost(path):.1f}s)")
+            current_id, failed_step = self._replay(path, check_target)
+            if failed_step is None:
+                self.stats['reached'] += 1
+                return True
+            failed.add(failed_step)
+            self.stats['replans'] += 1
+        if self.fallback is None:
+            logger.warning(f"No known path to page {target_id}")
+            return False
+        logger.info(f"No known path to page {target_id}, falling back to the LLM")
+        self.stats['fallbacks'] += 1
+        current_page = self.device.dump_page(refresh=True, profile=LAYOUT)
+        self.fallback(current_page, self.ptg_ir.pages[target_id])
+        reached = self.equivalence.same(self.device.dump_page(refresh=True, profile=LAYOUT), self.ptg_ir.pages[target_id])
+        self.stats['reached'] += int(reached)
+        return reached
+
+    def _replay(self, path, check_target=True):
+        """
+        Execute the steps of a path, checking the page after each one
+        (but the last one, unless check_target).
+
+        Returns:
+            (int, tuple): the id of the page the device ends on (None if unknown)
+            and the step that led elsewhere, None if the whole path succeeded.
+        """
+        for step, (src_id, tgt_id) in enumerate(path):
+            start = time.perf_counter()
+            if tgt_id == RESTART:
+                self.device.restart_app(self.app)
+                self.device.settle('restart', RESTART_TIMEOUT)
+                expected_id = self.main_page_id
+                self.stats['restarts'] += 1
+                self.stats['actions'] += 1
+            else:
+                events = self.ptg_ir.transitions[src_id][tgt_id]
+                self.device.execute(events)
+                self.device.settle('event', EVENT_TIMEOUT)
+                expected_id = tgt_id
+                self.stats['actions'] += len(events)
+            self.stats['steps'] += 1
+            if not check_target and step == len(path) - 1:
+                break
+            page = self.device.dump_page(refresh=True, profile=LAYOUT)
+            success = self.equivalence.same(page, self.ptg_ir.pages[expected_id])
+            stats = self.restart_stats if tgt_id == RESTART else self._edge(src_id, tgt_id)
+            stats.record(time.perf_counter() - start, success)
+            if not success:
+                logger.info(f"Step {src_id} -> {tgt_id} did not reach page {expected_id}")
+                return self.locate(page), (src_id, tgt_id)
+        return path[-1][1] if path[-1][1] != RESTART else self.main_page_id, None
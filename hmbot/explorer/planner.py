@@ -0,0 +1,155 @@
+import heapq
+from loguru import logger
+from hmbot.explorer.navigator import RESTART
+
+
+class Plan(object):
+    """
+    The class describes an edge-visit schedule: the transitions to verify
+    in order, with the moves (deadheading) needed between them.
+    """
+    def __init__(self):
+        self.steps = []
+        self.verify_actions = 0
+        self.move_actions = 0
+
+    @property
+    def edges(self):
+        """
+        The transitions to verify, in schedule order.
+        """
+        return [(src, tgt) for src, tgt, verify in self.steps if verify]
+
+    @property
+    def actions(self):
+        return self.verify_actions + self.move_actions
+
+    def __len__(self):
+        return len(self.steps)
+
+
+class EdgePlanner(object):
+    """
+    The class describes a planner ordering the PTG transitions for verification.
+
+    Verifying an edge leaves the device on its target page, so the order of
+    the edges decides how much navigation is needed in between. This is the
+    directed rural-postman problem; the planner uses the nearest-edge
+    heuristic: from the current page, verify the unverified edge with the
+    cheapest move to its source next. An app restart is an edge from every
+    page to the main page. Costs are device actions: the number of events
+    of an edge, and restart_cost for a restart.
+    """
+    def __init__(self, ptg_ir, main_page_id=0, restart_cost=3, allow_restart=True):
+        """
+        Args:
+            ptg_ir (PTG_IR): the pages and transitions to schedule.
+            main_page_id (int, optional): the page shown after an app restart. Default is 0.
+            restart_cost (int, optional): the cost of a restart in device actions. Default is 3.
+            allow_restart (bool, optional): whether moves may restart the app. Default is True.
+        """
+        self.ptg_ir = ptg_ir
+        self.main_page_id = main_page_id
+        self.restart_cost = restart_cost
+        self.allow_restart = allow_restart
+
+    def _cost(self, src, tgt):
+        return max(1, len(self.ptg_ir.transitions[src][tgt]))
+
+    def _distances(self, src):
+        """
+        Dijkstra from src over all transitions (and the restart edge).
+
+        Returns:
+            (dict, dict): the distance and the (previous page, step) of every reachable page.
+        """
+        dist = {src: 0}
+        prev = {}
+        heap = [(0, 0, src)]
+        counter = 1
+        while heap:
+            d, _, page_id = heapq.heappop(heap)
+            if d > dist[page_id]:
+                continue
+            steps = [(tgt, self._cost(page_id, tgt)) for tgt in self.ptg_ir.transitions.get(page_id, {})]
+            if self.allow_restart and page_id == src:
+                steps.append((RESTART, self.restart_cost))
+            for tgt, cost in steps:
+                node = self.main_page_id if tgt == RESTART else tgt
+                if d + cost < dist.get(node, float('inf')):
+                    dist[node] = d + cost
+                    prev[node] = (page_id, tgt)
+                    heapq.heappush(heap, (d + cost, counter, node))
+                    counter += 1
+        return dist, prev
+
+    def plan(self, start_id=None, edges=None):
+        """
+        Schedule the transitions of the PTG for verification.
+
+        Args:
+            start_id (int, optional): the page the device starts on. Default is the main page.
+            edges (iterable, optional): the (src, tgt) transitions to verify. Default is every transition.
+
+        Returns:
+            Plan: the schedule. Edges unreachable from the start are left out.
+        """
+        current = self.main_page_id if start_id is None else start_id
+        if edges is None:
+            edges = [(src, tgt) for src, tgts in self.ptg_ir.transitions.items() for tgt in tgts]
+        unverified = {}
+        for src, tgt in edges:
+            unverified.setdefault(src, []).append(tgt)
+        remaining = sum(len(tgts) for tgts in unverified.values())
+        plan = Plan()
+        while remaining:
+            if unverified.get(current):
+                src = current
+            else:
+                dist, prev = self._distances(current)
+                candidates = [page_id for page_id in unverified if unverified[page_id] and page_id in dist]
+                if not candidates:
+                    break
+                src = min(candidates, key=lambda page_id: (dist[page_id], page_id))
+                moves = []
+                node = src
+                while node != current:
+                    page_id, tgt = prev[node]
+                    moves.append((page_id, tgt))
+                    node = page_id
+                for page_id, tgt in reversed(moves):
+                    # a move along an unverified edge verifies it on the way
+                    if tgt in unverified.get(page_id, ()):
+                        unverified[page_id].remove(tgt)
+                        remaining -= 1
+                        plan.steps.append((page_id, tgt, True))
+                        plan.verify_actions += self._cost(page_id, tgt)
+                        continue
+                    plan.steps.append((page_id, tgt, False))
+                    plan.move_actions += self.restart_cost if tgt == RESTART else self._cost(page_id, tgt)
+            # prefer an edge into a page with unverified edges of its own, so the walk can go on from there
+            tgts = unverified[src]
+            tgt = next((tgt for tgt in tgts if unverified.get(tgt)), tgts[0])
+            tgts.remove(tgt)
+            remaining -= 1
+            plan.steps.append((src, tgt, True))
+            plan.verify_actions += self._cost(src, tgt)
+            current = tgt
+        if remaining:
+            logger.warning(f"{remaining} transitions are unreachable from page {start_id}")
+        logger.info(f"Planned {len(plan.edges)} transitions: {plan.verify_actions} verify "
+                    f"+ {plan.move_actions} move actions")
+        return plan
+
+    def naive_actions(self):
+        """
+        The device actions of verifying in insertion order and returning to the source
+        after every edge (the previous DFS), for comparison with plan().
+        """
+        actions = 0
+        for src, edges in self.ptg_ir.transitions.items():
+            for tgt in edges:
+                actions += self._cost(src, tgt)
+                dist, _ = self._distances(tgt)
+                actions += dist.get(src, self.restart_cost)
+        return actions
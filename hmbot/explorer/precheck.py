@@ -0,0 +1,63 @@
+from loguru import logger
+from hmbot.utils.cv import ssim, block_diff
+
+NO_CHANGE = 'no_change'
+
+
+class TransitionPrecheck(object):
+    """
+    The class describes a pixel-diff pre-check of an executed transition.
+
+    Obvious outcomes are decided without the LLM:
+        - no_change: the screen after the event matches the screen before it
+        - pass: the screen after the event has the structural fingerprint of the
+          expected page and looks like it
+    Every other case is ambiguous and left to the LLM.
+    """
+    def __init__(self, no_change_ssim=0.97, no_change_blocks=0.02, pass_ssim=0.6):
+        """
+        Args:
+            no_change_ssim (float): SSIM between the before and actual screens at or above which
+                the event may have done nothing.
+            no_change_blocks (float): share of changed blocks at or below which it did nothing.
+            pass_ssim (float): SSIM between the expected and actual screens needed, together with
+                equal fingerprints, to pass the transition.
+        """
+        self.no_change_ssim = no_change_ssim
+        self.no_change_blocks = no_change_blocks
+        self.pass_ssim = pass_ssim
+        self.stats = {'checks': 0, NO_CHANGE: 0, 'pass': 0, 'ambiguous': 0}
+
+    @property
+    def llm_calls_avoided(self):
+        return self.stats[NO_CHANGE] + self.stats['pass']
+
+    def check(self, page_before, page_after, current_page):
+        """
+        Args:
+            page_before: Page object, the page before the event, as captured from the device
+            page_after: Page object, the expected page
+            current_page: Page object, the page after the event
+
+        Returns:
+            (bool, str): (result, error_type) when the outcome is clear, None when it is ambiguous
+        """
+        self.stats['checks'] += 1
+        # a self-loop is expected to look unchanged, let the LLM judge it
+        self_loop = page_before.fingerprint() == page_after.fingerprint()
+        if not self_loop:
+            similarity = ssim(page_before.img, current_page.img)
+            if similarity >= self.no_change_ssim:
+                changed = block_diff(page_before.img, current_page.img)
+                if changed <= self.no_change_blocks:
+                    self.stats[NO_CHANGE] += 1
+                    logger.info(f"Pre-check: no change (ssim={similarity:.3f}, changed blocks={changed:.3f})")
+                    return False, NO_CHANGE
+            if current_page.fingerprint() == page_after.fingerprint():
+                similarity = ssim(page_after.img, current_page.img)
+                if similarity >= self.pass_ssim:
+                    self.stats['pass'] += 1
+                    logger.info(f"Pre-check: reached the expected page (ssim={similarity:.3f})")
+                    return True, ''
+        self.stats['ambiguous'] += 1
+        return None
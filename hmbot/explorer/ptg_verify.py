@@ -1,8 +1,7 @@
-import time
 import json
 import re
 import os
-import zss
+import threading
 import cv2
 import numpy as np
 from loguru import logger
@@ -11,6 +10,14 @@ from hmbot.model.event import ClickEvent
 from hmbot.model.vht import VHTNode
 from hmbot.utils.cv import encode_image
 from hmbot.model.ptg import PTGParser
+from hmbot.explorer.equivalence import PageEquivalence
+from hmbot.explorer.navigator import Navigator
+from hmbot.explorer.planner import EdgePlanner
+from hmbot.explorer.incremental import ChangeSurvey, changed_subgraph, CHANGED
+from hmbot.explorer.precheck import TransitionPrecheck
+from hmbot.explorer.verdict_cache import VerdictCache, app_bundle, app_version
+from hmbot.explorer.worklist import Worklist, Checkpoint, VERIFY, EXPLORE, EVENT
+from hmbot.device.capture import SCREENSHOT
 from hmbot.explorer.prompt import *
 from dotenv import load_dotenv
 from langchain.schema import HumanMessage, SystemMessage
@@ -29,11 +36,78 @@ event_llm = ChatOpenAI(
 
 
 class PTG_IR(object):
-    def __init__(self, ptg):
+    """
+    The pages and transitions under verification, shared by the verifiers of all devices
+
+    Writers go through add_page/update_page/set_transition under a lock. Transition dicts are replaced
+    rather than modified, so readers iterating them (navigators, planners) need no lock.
+    Given a PTGStore, every added page and transition is also upserted to it.
+    """
+    def __init__(self, ptg, store=None):
         self.pages = []
         self.transitions = {}
+        self.store = store
+        self._lock = threading.Lock()
         self._ptg_to_ir(ptg)
 
+    def add_page(self, page, find=None):
+        """
+        Add a page unless an equivalent page exists, and set its id
+
+        Args:
+            page: Page object, the page to add
+            find: callable, optional, find(page, candidates) -> Page or None, the equivalence lookup;
+                  it runs outside the lock, so other verifiers are not blocked by a slow comparison
+
+        Returns:
+            int: the id of the page, or of its equivalent
+        """
+        checked = 0
+        while True:
+            with self._lock:
+                if find is None or checked == len(self.pages):
+                    page.id = len(self.pages)
+                    self.pages.append(page)
+                    transitions = dict(self.transitions)
+                    transitions[page.id] = {}
+                    self.transitions = transitions
+                    break
+                candidates = self.pages[checked:]
+                checked = len(self.pages)
+            found = find(page, candidates)
+            if found is not None:
+                return found.id
+        # the store has a lock of its own, the artifacts are written outside this one
+        if self.store is not None:
+            self.store.put_page(page.id, page)
+        return page.id
+
+    def update_page(self, page, current_page):
+        """
+        Refresh a stored page with the screenshot, VHT and info of a page just captured
+
+        Args:
+            page: Page object, the stored page, shared with the verifiers of other devices
+            current_page: Page object, the page captured from the device
+        """
+        img, vht, info = current_page.img, current_page.vht, current_page.info
+        with self._lock:
+            page.img = img
+            page.vht = vht
+            page.info = info
+        if self.store is not None:
+            self.store.put_page(page.id, page)
+
+    def set_transition(self, src_id, tgt_id, events):
+        with self._lock:
+            edges = dict(self.transitions.get(src_id, {}))
+            edges[tgt_id] = events
+            transitions = dict(self.transitions)
+            transitions[src_id] = edges
+            self.transitions = transitions
+        if self.store is not None:
+            self.store.put_edge(src_id, tgt_id, events)
+
     def _ptg_to_ir(self, ptg):
         for page in ptg.pages:
             self.pages.append(page)
@@ -56,108 +130,267 @@ class PTG_IR(object):
             
 
 class PTGVerifier:
-    def __init__(self, device, ptg_dir_path):
+    def __init__(self, device, ptg_dir_path, app=None, checkpoint_dir=None, precheck=None, cache_file=None,
+                 ptg_ir=None, visited_pages_id=None, store=None):
         """
         Initialize the PTGVerifier
 
         Args:
             device: Device object, the device to execute the operation
             ptg_dir_path: str, the path to the PTG directory
+            app: App object, optional, the app under test, lets the navigator restart it
+            checkpoint_dir: str, optional, the directory to checkpoint the run to after every task
+            precheck: TransitionPrecheck, optional, the pixel-diff pre-check with its thresholds
+            cache_file: str, optional, the database of LLM verdicts reused across runs of the same app version
+            ptg_ir: PTG_IR object, optional, a PTG_IR shared with other verifiers instead of parsing ptg_dir_path
+            visited_pages_id: set, optional, the visited pages shared with other verifiers
+            store: PTGStore, optional, persist the pages and transitions found during verification
         """
         self.device = device
         # self.ptg = PTGParser.parse(device, ptg_dir_path)
-        self.ptg_ir = PTG_IR(PTGParser.parse(device, ptg_dir_path))
+        self.ptg_ir = ptg_ir if ptg_ir is not None else PTG_IR(PTGParser.parse(device, ptg_dir_path, lazy=True), store)
         # self.ptg_ir.print_ir()
-        self.visited_pages_id = set()
-        
-    def verify_ptg_dfs(self, page_before=None):
+        self.visited_pages_id = visited_pages_id if visited_pages_id is not None else set()
+        self.equivalence = PageEquivalence(llm_judge=self._verify_same_page_with_llm)
+        self.navigator = Navigator(device, self.ptg_ir, self.equivalence, app=app,
+                                   fallback=self._return_with_llm)
+        self.planner = EdgePlanner(self.ptg_ir, allow_restart=app is not None)
+        self.checkpoint = Checkpoint(checkpoint_dir) if checkpoint_dir else None
+        self.precheck = precheck or TransitionPrecheck()
+        self.verdict_cache = VerdictCache(cache_file, app_bundle(app), app_version(app)) if cache_file else None
+        self.worklist = Worklist()
+        self.current_id = None
+        self.max_depth = 3
+        self.verify_actions = 0
+        self.report = {}
+        
+    def verify_ptg_dfs(self, page_before=None, resume=False):
         """
-        Verify the PTG using DFS algorithm
+        Verify the PTG by executing the edge schedule of the planner as a worklist of tasks
 
         Args:
             page_before: Page object, the page to start from, if not provided, start from the first page
+            resume: bool, continue from the checkpoint instead of planning a new run
 
         page_before -> page_after
                     |
                     |->current_page
 
         """
+        if resume and self.checkpoint is not None and self.checkpoint.exists():
+            pages, transitions, self.worklist, self.visited_pages_id, self.report = self.checkpoint.load(self.device)
+            # the navigator and planner hold the PTG_IR, update it in place
+            self.ptg_ir.pages[:] = pages
+            self.ptg_ir.transitions.clear()
+            self.ptg_ir.transitions.update(transitions)
+            self.current_id = None
+        else:
+            if page_before is None:
+                page_before = self.ptg_ir.pages[0]
+            plan = self.planner.plan(page_before.id)
+            self.report = {'planned_actions': plan.actions,
+                           'naive_actions': self.planner.naive_actions(),
+                           'actual_actions': 0,
+                           'llm_calls_avoided': 0}
+            self.worklist = Worklist()
+            for page_before_id, page_after_id in plan.edges:
+                self.worklist.push((VERIFY, page_before_id, page_after_id, 0), priority=1)
+            self.current_id = page_before.id
+            self._visit_page(page_before)
+        self._run()
+        logger.info(f"Device actions: planned {self.report['planned_actions']}, actual {self.report['actual_actions']}, "
+                    f"return-after-every-edge {self.report['naive_actions']}")
+        logger.info(f"LLM transition verifications avoided by the pre-check: {self.report.get('llm_calls_avoided', 0)}")
+        self.report['settle'] = self.device.settle_detector.summary()
+        logger.info(f"Settle times: {self.report['settle']}")
+        if self.verdict_cache is not None:
+            logger.info(f"LLM verdicts reused from the cache: {self.verdict_cache.stats['hits']}, "
+                        f"asked: {self.verdict_cache.stats['misses']}")
+            self.report['cached_verdicts'] = self.verdict_cache.stats['hits']
+
+    def verify_ptg_incremental(self, page_before=None, radius=1, resume=False):
+        """
+        Re-verify the PTG against a new app build, verifying only what changed
+
+        A cheap pass captures every reachable page and compares its fingerprint with the
+        saved PTG; only the transitions into or out of changed pages, and those up to
+        radius transitions downstream of them, are then verified with the LLM.
+
+        Args:
+            page_before: Page object, the page to start from, if not provided, start from the first page
+            radius: int, how many transitions downstream of a changed page to re-verify
+            resume: bool, continue from the checkpoint instead of surveying again
+
+        Returns:
+            dict: the changed subgraph, its pages and transitions
+        """
+        if resume and self.checkpoint is not None and self.checkpoint.exists():
+            self.verify_ptg_dfs(resume=True)
+            return self.report.get('changed_subgraph', {})
         if page_before is None:
             page_before = self.ptg_ir.pages[0]
+        full_actions = self.planner.plan(page_before.id).actions
+        survey = ChangeSurvey(self.device, self.ptg_ir, self.navigator.app)
+        changed, self.current_id = survey.survey(page_before.id, self.current_id)
+        pages, edges = changed_subgraph(self.ptg_ir.transitions, changed, radius)
+        total = sum(len(tgts) for tgts in self.ptg_ir.transitions.values())
+        subgraph = {'changed_pages': sorted(page_id for page_id, reason in changed.items() if reason == CHANGED),
+                    'unreached_pages': sorted(page_id for page_id, reason in changed.items() if reason != CHANGED),
+                    'pages': sorted(pages),
+                    'transitions': sorted([src, tgt] for src, tgt in edges)}
+        logger.info(f"Changed subgraph: {len(subgraph['changed_pages'])} changed and "
+                    f"{len(subgraph['unreached_pages'])} unreached pages, "
+                    f"{len(edges)} of {total} transitions to re-verify")
+        for src, tgt in subgraph['transitions']:
+            logger.info(f"  Re-verify transition {src} -> {tgt}")
+        start_id = self.current_id if self.current_id is not None else page_before.id
+        plan = self.planner.plan(start_id, edges)
+        self.report = {'planned_actions': plan.actions,
+                       'naive_actions': self.planner.naive_actions(),
+                       'actual_actions': survey.navigator.stats['actions'],
+                       'full_actions': full_actions,
+                       'llm_calls_avoided': 0,
+                       'changed_subgraph': subgraph}
+        self.worklist = Worklist()
+        for page_before_id, page_after_id in plan.edges:
+            self.worklist.push((VERIFY, page_before_id, page_after_id, 0), priority=1)
+        # the survey captured every page it reached, unchanged pages need no refresh
+        for page_id, page in survey.captured.items():
+            if page_id not in changed:
+                self.visited_pages_id.add(page_id)
+        self._run()
+        logger.info(f"Device actions: survey and re-verification {self.report['actual_actions']}, "
+                    f"full verification plan {full_actions}")
+        return subgraph
+
+    def verify_edges(self, edges):
+        """
+        Verify the given transitions in order, from wherever the device is
+
+        Args:
+            edges: list of (page_before_id, page_after_id), the transitions to verify
+        """
+        self.report.setdefault('actual_actions', 0)
+        self.report.setdefault('llm_calls_avoided', 0)
+        for page_before_id, page_after_id in edges:
+            self.worklist.push((VERIFY, page_before_id, page_after_id, 0), priority=1)
+        self._run()
 
-        # Mark current page as visited
-        self.visited_pages_id.add(page_before.id)
-        logger.info(f"Visiting page id: {page_before.id}")
+    def _run(self):
+        """
+        Run the worklist to completion, checkpointing after every task
+        """
+        while len(self.worklist):
+            task = self.worklist.pop()
+            actions = self.verify_actions + self.navigator.stats['actions']
+            avoided = self.precheck.llm_calls_avoided
+            self._run_task(*task)
+            if 'actual_actions' in self.report:
+                self.report['actual_actions'] += self.verify_actions + self.navigator.stats['actions'] - actions
+                self.report['llm_calls_avoided'] = self.report.get('llm_calls_avoided', 0) + self.precheck.llm_calls_avoided - avoided
+            if self.checkpoint is not None:
+                self.checkpoint.save(self.ptg_ir, self.worklist, self.visited_pages_id, self.report)
+
+    def _run_task(self, kind, page_id, edge, depth):
+        if kind == VERIFY and edge not in self.ptg_ir.transitions.get(page_id, {}):
+            return
+        if kind == EXPLORE and depth >= self.max_depth:
+            return
+        if not self._reach(page_id):
+            logger.warning(f"Could not reach page {page_id}, skipping {kind} task")
+            return
+        page = self.ptg_ir.pages[page_id]
+        if kind == VERIFY:
+            if page_id not in self.visited_pages_id:
+                self._visit_page(page)
+            self.current_id = self._verify_transition(page, edge)
+        elif kind == EXPLORE:
+            self.visited_pages_id.add(page_id)
+            # push in reverse so the events run in the order the LLM listed them
+            for event in reversed(self._identify_page_events(page)):
+                self.worklist.push((EVENT, page_id, event, depth), priority=-depth)
+        elif kind == EVENT:
+            self._explore_event(page, edge, depth)
+
+    def _reach(self, page_id):
+        """
+        Bring the device to a page, tracking where it is
+        """
+        if self.current_id == page_id:
+            return True
+        if self.navigator.navigate(page_id, self.current_id):
+            self.current_id = page_id
+            return True
+        self.current_id = None
+        return False
 
-        # Update page_before with the current page
-        self._update_page(page_before)
-        
-        if page_before.id in self.ptg_ir.transitions:
-            # Check all adjacent pages and events of current page
-            for page_after_id, events in self.ptg_ir.transitions[page_before.id].items():
-                logger.info(f"Checking transition to: {page_after_id}")
-                
-                # If target page is not visited, execute events to reach target page and visit recursively
-                if page_after_id not in self.visited_pages_id:
-                    logger.info(f"Executing events to reach page_after...")
-
-                    new_events = []
-                    page_after = self.ptg_ir.pages[page_after_id]
-                    # page_before -> current_page
-                    result, error_type, current_page = self._verify_event_with_llm(page_before, page_after, events)
-
-                    retry_count = 0
-
-                    if result:
-                        # current_page == page_after
-                        logger.info(f"Event verification passed: Successfully reached page_after")
-                        self.verify_ptg_dfs(page_after)
-                    else:       
-                        # current_page != page_after
-                        logger.info(f"Event verification failed: {error_type}")
-                        # current_page -> page_before
-                        if error_type == "wrong_page":
-                            current_page.id = len(self.ptg_ir.pages)
-                            self.ptg_ir.pages.append(current_page)
-                            self.ptg_ir.transitions[page_before.id][current_page.id] = events
-                            return_event_command = self._generate_return_event_command(page_before, current_page, events)
-                            self._execute_event_command(return_event_command, current_page)
-                        # page_before -> page_after
-                        while retry_count < 3:
-                            next_event_command = self._generate_next_event_command(page_before, page_after)
-                            new_events = self._execute_event_command(next_event_command, page_before)
-                            result, error_type, current_page = self._verify_event_with_llm(page_before, page_after, new_events)
-                            if result:
-                                self.ptg_ir.transitions[page_before.id][page_after_id] = new_events
-                                self.verify_ptg_dfs(page_after)
-                                break
-                            else:
-                                # current_page -> page_before
-                                if error_type == "wrong_page":
-                                    return_event_command = self._generate_return_event_command(page_before, current_page, new_events)
-                                    self._execute_event_command(return_event_command, current_page)
-                            retry_count += 1
-
-                    if retry_count == 0:
-                        return_event_command = self._generate_return_event_command(page_before, page_after, events)
-                        self._execute_event_command(return_event_command, page_after)
-                    elif retry_count == 3:
-                        continue
-                    else:
-                        return_event_command = self._generate_return_event_command(page_before, page_after, new_events)
-                        self._execute_event_command(return_event_command, page_after)
-        else:
+    def _visit_page(self, page):
+        """
+        Mark a page as visited, refresh it from the device, and schedule exploring it if it has no outgoing transitions
+        """
+        self.visited_pages_id.add(page.id)
+        logger.info(f"Visiting page id: {page.id}")
+        # Update page with the current page
+        self._update_page(page)
+        if not self.ptg_ir.transitions.get(page.id):
             # if no outgoing transitions, explore new page
-            self._explore_new_page(page_before, max_depth=3, current_depth=0)
+            self.worklist.push((EXPLORE, page.id, None, 0), priority=0)
+
+    def _verify_transition(self, page_before, page_after_id):
+        """
+        Verify one transition, the device being on page_before
+
+        Returns:
+            int: the id of the page the device ends on, None if unknown
+        """
+        logger.info(f"Checking transition to: {page_after_id}")
+        events = self.ptg_ir.transitions[page_before.id][page_after_id]
+        page_after = self.ptg_ir.pages[page_after_id]
+        # page_before -> current_page
+        result, error_type, current_page = self._verify_event_with_llm(page_before, page_after, events)
+        self.verify_actions += len(events)
+        if result:
+            # current_page == page_after
+            logger.info(f"Event verification passed: Successfully reached page_after")
+            if page_after_id not in self.visited_pages_id:
+                self._visit_page(page_after)
+            return page_after_id
+
+        # current_page != page_after
+        logger.info(f"Event verification failed: {error_type}")
+        current_id = None
+        if error_type == "wrong_page":
+            current_id = self.ptg_ir.add_page(current_page, self.equivalence.find)
+            self.ptg_ir.set_transition(page_before.id, current_id, events)
+        # page_before -> page_after
+        for _ in range(3):
+            # current_page -> page_before
+            if current_id != page_before.id and not self.navigator.navigate(page_before.id, current_id):
+                return None
+            next_event_command = self._generate_next_event_command(page_before, page_after)
+            new_events = self._execute_event_command(next_event_command, page_before)
+            self.verify_actions += len(new_events)
+            result, error_type, current_page = self._verify_event_with_llm(page_before, page_after, new_events)
+            if result:
+                self.ptg_ir.set_transition(page_before.id, page_after_id, new_events)
+                if page_after_id not in self.visited_pages_id:
+                    self._visit_page(page_after)
+                return page_after_id
+            current_id = None
+        return None
 
     def _explore_new_page(self, page, max_depth=3, current_depth=0):
-        if current_depth >= max_depth:
-            return
-        
-        # Initialize transitions for this page if not exists
-        if page.id not in self.ptg_ir.transitions:
-            self.ptg_ir.transitions[page.id] = {}
-        
+        """
+        Explore a page and the new pages reached from it, up to max_depth
+        """
+        self.max_depth = max_depth
+        self.worklist.push((EXPLORE, page.id, None, current_depth), priority=-current_depth)
+        self._run()
+
+    def _identify_page_events(self, page):
+        """
+        Ask the LLM for the most important clickable events of a page
+        """
         messages = [
             SystemMessage(content=explore_page_events_prompt),
             HumanMessage(
@@ -179,59 +412,54 @@ class PTGVerifier:
         clickable_events = result_json.get("clickable_events", [])
         for event in clickable_events:
             logger.info(f"Events of page {page.id}: {event}")
-        for event in clickable_events:
-            new_events = self._execute_event_command(event, page)
-            new_page = self.device.dump_page(refresh=True)
-            index = self._is_page_exist(new_page)
-            if index == -1:
-                new_page.id = len(self.ptg_ir.pages)
-                self.ptg_ir.pages.append(new_page)
-                self.ptg_ir.transitions[page.id][new_page.id] = new_events
-                self._explore_new_page(new_page, max_depth, current_depth + 1)
-            else:
-                self.ptg_ir.transitions[page.id][index] = new_events
-            return_event_command = self._generate_return_event_command(page, new_page, new_events)
-            self._execute_event_command(return_event_command, new_page)
+        return clickable_events
+
+    def _explore_event(self, page, event, depth):
+        """
+        Execute one event found by exploring page and record the page it leads to
+        """
+        new_events = self._execute_event_command(event, page)
+        self.verify_actions += len(new_events)
+        new_page = self.device.dump_page(refresh=True)
+        index = self.ptg_ir.add_page(new_page, self.equivalence.find)
+        self.ptg_ir.set_transition(page.id, index, new_events)
+        self.current_id = index
+        if self.ptg_ir.pages[index] is new_page:
+            self.worklist.push((EXPLORE, index, None, depth + 1), priority=-(depth + 1))
             
     def _update_page(self, page):
         """
         Update the page with the current page from the device
         """
-        current_page = self.device.dump_page(refresh=True)
-        page.img = current_page.img
-        page.vht = current_page.vht
-        page.info = current_page.info
+        self.ptg_ir.update_page(page, self.device.dump_page(refresh=True))
 
     def _is_page_exist(self, current_page):
         """
         Check if the page exists in the PTG
         """
-        for page in reversed(self.ptg_ir.pages):
-            if self._is_pages_same(page, current_page):
-                return page.id
-        return -1
+        page = self.equivalence.find(current_page, self.ptg_ir.pages)
+        if page is None:
+            return -1
+        return page.id
 
     def _is_pages_same(self, page1, page2):
         """
         Check if the two pages are the same
         """
-        distance = zss.simple_distance(page1.vht._root, page2.vht._root, get_children=VHTNode.get_children, get_label=VHTNode.get_label)
-        logger.info(f"Distance between page1 and page2: {distance}")
-        distance_value = distance[0] if isinstance(distance, tuple) else distance
-        
-        if distance_value < 3:
-            return True
-        elif distance_value > 30:
-            return False
-        else:
-            # When tree structure is similar, use LLM to verify if they are the same interface
-            return self._verify_same_page_with_llm(page1, page2)
+        return self.equivalence.same(page1, page2)
 
     def _verify_same_page_with_llm(self, page1, page2):
         """
         Use LLM to verify if two pages are the same interface
         Focus on layout structure rather than content
         """
+        cache_key = None
+        if self.verdict_cache is not None:
+            cache_key = VerdictCache.key('same', *sorted((page1.fingerprint(), page2.fingerprint())))
+            is_same = self.verdict_cache.get(cache_key)
+            if is_same is not None:
+                logger.info(f"Cached page comparison result: {is_same}")
+                return is_same
         messages = [
             SystemMessage(content=verify_same_page_prompt),
             HumanMessage(content=[
@@ -255,6 +483,8 @@ class PTGVerifier:
             result_json = json.loads(response_content)
             is_same = result_json.get("is_same", False)
             logger.info(f"LLM page comparison result: {is_same}")
+            if cache_key is not None:
+                self.verdict_cache.put(cache_key, bool(is_same))
             return is_same
         except json.JSONDecodeError:
             logger.error(f"Failed to parse LLM response: {response_content}")
@@ -271,8 +501,7 @@ class PTGVerifier:
         # cv2.destroyAllWindows()
         # self._is_pages_same(page1, page2)
         page = self.device.dump_page(refresh=True)
-        page.id = len(self.ptg_ir.pages)
-        self.ptg_ir.pages.append(page)
+        self.current_id = self.ptg_ir.add_page(page)
         self._explore_new_page(page, max_depth=3, current_depth=0)
         self.ptg_ir.print_ir()
 
@@ -287,8 +516,22 @@ class PTGVerifier:
         """
         logger.info("=====================event verify===========================")
         self.device.execute(events)
-        time.sleep(3)
+        self.device.settle('event')
         current_page = self.device.dump_page(refresh=True)
+        verdict = self.precheck.check(page_before, page_after, current_page)
+        if verdict is not None:
+            result, error_type = verdict
+            logger.info(f"Verification result: {'Pass' if result else 'Failed'} (pre-check)")
+            return result, error_type, current_page
+        cache_key = None
+        if self.verdict_cache is not None:
+            cache_key = VerdictCache.key('event', page_before.fingerprint(), page_after.fingerprint(),
+                                         current_page.fingerprint(), VerdictCache.event_signature(events))
+            verdict = self.verdict_cache.get(cache_key)
+            if verdict is not None:
+                result, error_type = verdict
+                logger.info(f"Verification result: {'Pass' if result else 'Failed'} (cached)")
+                return result, error_type, current_page
         messages = [
             SystemMessage(content=verify_ptg_system_prompt),
             HumanMessage(
@@ -319,6 +562,8 @@ class PTGVerifier:
         logger.info(f"Analysis process: {think}")
         logger.info(f"Verification result: {'Pass' if result else 'Failed'}")
         logger.info(f"Error type: {error_type}")
+        if cache_key is not None:
+            self.verdict_cache.put(cache_key, [result, error_type])
         return result, error_type, current_page
 
     def _generate_next_event_command(self, page_before, page_after):
@@ -376,6 +621,14 @@ class PTGVerifier:
         logger.info(f"Generated return operation command: {response.text()}")
         return response.text()
 
+    def _return_with_llm(self, current_page, target_page, events=()):
+        """
+        Let the LLM bring the device from current_page back to target_page,
+        used by the navigator when no known path exists
+        """
+        return_event_command = self._generate_return_event_command(target_page, current_page, list(events))
+        self._execute_event_command(return_event_command, current_page)
+
     def _draw_event_boxes_on_image(self, image, events):
         """
         Draw red boxes on the image to mark event locations
@@ -403,9 +656,6 @@ class PTGVerifier:
                     
                     # Draw red rectangle
                     cv2.rectangle(marked_image, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.imshow('marked_image', marked_image)
-                    cv2.waitKey(0)
-                    cv2.destroyAllWindows()
                     break
         
         return encode_image(marked_image)
@@ -430,8 +680,9 @@ class PTGVerifier:
         parsed_output = {"action": ""}
         new_events = []
         while parsed_output["action"] != "finished":
-            screenshot = self.device.screenshot()
-            base64_image = encode_image(screenshot)
+            # the hierarchy is only dumped if the action clicks a node
+            page = self.device.dump_page(refresh=True, profile=SCREENSHOT)
+            base64_image = encode_image(page.img)
             
             current_message = HumanMessage(content=[
                 {
@@ -448,7 +699,10 @@ class PTGVerifier:
             
             if parsed_output["action"] != "finished":
                 logger.info(f"Executing event: {parsed_output}")
-                new_events.append(phone_operation(parsed_output, current_page.img.shape, self.device, current_page))
+                new_event = phone_operation(parsed_output, page.img.shape, self.device, page)
+                # inputs and swipes are not recorded as events
+                if new_event is not None:
+                    new_events.append(new_event)
             
             message_history.append(response)
             
@@ -550,73 +804,32 @@ def extract_node_by_coordinates(click_x, click_y, page):
         page: Page object, the page to extract the node from
 
     Returns:
-        VHTNode object, the node extracted from the page
+        VHTNode object, the smallest clickable node containing the point
     """
-    def point_in_bounds(x, y, bounds):
-        if not bounds or len(bounds) != 2:
-            return False
-        
-        x1, y1 = bounds[0]
-        x2, y2 = bounds[1]
-        
-        return x1 <= x <= x2 and y1 <= y <= y2
-    
-    def find_node_by_coordinates(vht_node, x, y):
-        candidates = []  
-        
-        def collect_clickable_candidates(node, x, y, candidates_list):
-            if hasattr(node, 'attribute') and 'bounds' in node.attribute:
-                bounds = node.attribute['bounds']
-                
-                # Exclude invalid bounds [0, 0][0, 0] of root node
-                if bounds == [[0, 0], [0, 0]]:
-                    if hasattr(node, '_children'):
-                        for child in node._children:
-                            collect_clickable_candidates(child, x, y, candidates_list)
-                    return
-                
-                if point_in_bounds(x, y, bounds):
-                    # If current node is clickable, add to candidate list
-                    if (hasattr(node, 'attribute') and 
-                        node.attribute.get('clickable') == 'true'):
-                        candidates_list.append(node)
-                    
-                    # Continue searching child nodes
-                    if hasattr(node, '_children'):
-                        for child in node._children:
-                            collect_clickable_candidates(child, x, y, candidates_list)
-        
-        def calculate_area(bounds):
-            if not bounds or len(bounds) != 2:
-                return float('inf')  # Return infinite area for invalid bounds
-            x1, y1 = bounds[0]
-            x2, y2 = bounds[1]
-            return (x2 - x1) * (y2 - y1)
-        
-        # Collect all candidate nodes
-        collect_clickable_candidates(vht_node, x, y, candidates)
-        
-        # If no candidate nodes, return None
-        if not candidates:
+    try:
+        if hasattr(page, 'vht') and hasattr(page.vht, 'grid'):
+            return page.vht.grid().node_at(click_x, click_y)
+        else:
+            logger.error("Page does not have valid VHT structure")
             return None
-        
-        # Find candidate node with smallest area
-        min_area = float('inf')
-        best_candidate = None
-        
-        for candidate in candidates:
-            if hasattr(candidate, 'attribute') and 'bounds' in candidate.attribute:
-                area = calculate_area(candidate.attribute['bounds'])
-                # print(f"Candidate bounds: {candidate.attribute['bounds']}, area: {area}")
-                if area < min_area:
-                    min_area = area
-                    best_candidate = candidate
-        
-        return best_candidate
-    
+    except Exception as e:
+        logger.error(f"Error in extract_node: {e}")
+        return None
+
+def extract_node_by_box(box, page):
+    """
+    Extract the node by a bounding box
+
+    Args:
+        box: list, the absolute box [x1, y1, x2, y2] proposed by the LLM
+        page: Page object, the page to extract the node from
+
+    Returns:
+        VHTNode object, the clickable node the box refers to
+    """
     try:
-        if hasattr(page, 'vht') and hasattr(page.vht, '_root'):
-            return find_node_by_coordinates(page.vht._root, click_x, click_y)
+        if hasattr(page, 'vht') and hasattr(page.vht, 'grid'):
+            return page.vht.grid().node_for_box(box)
         else:
             logger.error("Page does not have valid VHT structure")
             return None
@@ -624,6 +837,27 @@ def extract_node_by_coordinates(click_x, click_y, page):
         logger.error(f"Error in extract_node: {e}")
         return None
 
+def coordinate_node(box, center, device, page):
+    """
+    Build a node for a click at raw coordinates, so the click can be recorded and replayed
+
+    Args:
+        box: list, the absolute box [x1, y1, x2, y2] proposed by the LLM
+        center: tuple, the coordinates to click
+        device: Device object, the device to click on
+        page: Page object, the page the click is performed on
+
+    Returns:
+        VHTNode object, a non-hierarchy node with the box as its bounds
+    """
+    root = page.vht._root if getattr(page, 'vht', None) is not None else None
+    attrib = {'bundle': root.attribute.get('bundle', '') if root else '',
+              'page': root.attribute.get('page', '') if root else ''}
+    return VHTNode(device=device, attrib=attrib, bounds=[[box[0], box[1]], [box[2], box[3]]],
+                   clickable='true', longClickable='false', selected='false', checkable='false',
+                   checked='false', type='', id='', text='', enabled='true', focused='false',
+                   center=list(center))
+
 def phone_operation(parsed_output, shape, device, page):
     """
     Execute the phone operation
@@ -647,20 +881,21 @@ def phone_operation(parsed_output, shape, device, page):
             (start_abs[1] + start_abs[3]) // 2
         )
         logger.info(f"Click coordinates: {center_pos}")
-        node = extract_node_by_coordinates(center_pos[0], center_pos[1], page)
-        # print(f"Extracted node: {node.attribute['bounds']}")
+        node = extract_node_by_box(start_abs, page)
+        if node is None:
+            logger.warning(f"No clickable node at {center_pos}, clicking raw coordinates")
+            node = coordinate_node(start_abs, center_pos, device, page)
         new_event = ClickEvent(node)
         new_event.execute()
-        # device.click(*center_pos)
-        time.sleep(3)
+        device.settle(parsed_output["action"])
         return new_event
     elif parsed_output["action"] == "input" and parsed_output["content"]:
         device.input(parsed_output["content"])
-        time.sleep(3)
+        device.settle(parsed_output["action"])
         return None
     elif parsed_output["action"] == "swipe" and start_abs and end_abs:
         device.swipe(start_abs[0], start_abs[1], end_abs[0], end_abs[1])
-        time.sleep(3)
+        device.settle(parsed_output["action"])
         return None
     
 def parse_action_output(output_text):
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from hashlib import blake2b
+from loguru import logger
+from hmbot.utils.lru import LRUCache
+
+
+class VerdictCache(object):
+    """
+    The class describes a persistent cache of LLM verification verdicts.
+
+    Verdicts are keyed by the structural fingerprints of the pages involved
+    and the signature of the executed events, so re-verifying an unchanged
+    build reuses them instead of asking the LLM again. They are stored per
+    app bundle and dropped when the bundle is opened with another version.
+    If the version of the app is unknown nothing is persisted, the verdicts
+    are only kept for the run. The cache holds at most max_entries verdicts,
+    evicting the least recently used ones.
+    """
+    def __init__(self, db_file, bundle='', app_version='', max_entries=100000):
+        """
+        Args:
+            db_file (str): path of the SQLite database.
+            bundle (str, optional): the bundle of the app under test, the verdicts of every bundle are kept apart.
+            app_version (str, optional): the version of the app under test; verdicts of other versions are dropped.
+                If empty, verdicts are not persisted.
+            max_entries (int, optional): the maximum number of cached verdicts. Default is 100000.
+        """
+        self.bundle = bundle
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        self._memory = None
+        self._conn = None
+        if not app_version:
+            logger.warning(f"The version of {bundle or 'the app'} is unknown, LLM verdicts are not persisted")
+            self._memory = LRUCache(max_entries)
+            return
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(verdicts)')]
+        if columns and 'bundle' not in columns:
+            # a cache written before verdicts were kept per bundle
+            self._conn.execute('DROP TABLE verdicts')
+            self._conn.execute('DROP TABLE IF EXISTS meta')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS verdicts (bundle TEXT NOT NULL, key TEXT NOT NULL, '
+                           'verdict TEXT NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (bundle, key))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS versions (bundle TEXT PRIMARY KEY, version TEXT NOT NULL)')
+        row = self._conn.execute('SELECT version FROM versions WHERE bundle = ?', (bundle,)).fetchone()
+        if row is not None and row[0] != app_version:
+            dropped = self._conn.execute('DELETE FROM verdicts WHERE bundle = ?', (bundle,)).rowcount
+            logger.info(f"Version of {bundle or 'the app'} changed from {row[0]!r} to {app_version!r}, "
+                        f"dropped {dropped} cached verdicts")
+        self._conn.execute('INSERT OR REPLACE INTO versions (bundle, version) VALUES (?, ?)', (bundle, app_version))
+        self._conn.commit()
+        # an upper bound of the rows, counted again only when it passes max_entries
+        self._count = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+
+    @staticmethod
+    def key(kind, *parts):
+        """
+        Build a cache key from the kind of verdict and its fingerprints/signatures.
+        """
+        return blake2b('\x1f'.join((kind,) + parts).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def event_signature(events):
+        return json.dumps([event._json() for event in events if event is not None], sort_keys=True, ensure_ascii=False)
+
+    def get(self, key):
+        """
+        Returns:
+            the cached verdict, or None.
+        """
+        with self._lock:
+            if self._memory is not None:
+                verdict = self._memory.get(key)
+                self.stats['misses' if verdict is None else 'hits'] += 1
+                return verdict
+            row = self._conn.execute('SELECT verdict FROM verdicts WHERE bundle = ? AND key = ?',
+                                     (self.bundle, key)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._conn.execute('UPDATE verdicts SET last_used = ? WHERE bundle = ? AND key = ?',
+                               (time.time(), self.bundle, key))
+            self._conn.commit()
+            self.stats['hits'] += 1
+            return json.loads(row[0])
+
+    def put(self, key, verdict):
+        with self._lock:
+            if self._memory is not None:
+                self._memory.put(key, verdict)
+                return
+            self._conn.execute('INSERT OR REPLACE INTO verdicts (bundle, key, verdict, last_used) VALUES (?, ?, ?, ?)',
+                               (self.bundle, key, json.dumps(verdict), time.time()))
+            self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # evict a tenth more than needed, so the next puts do not count the rows again
+        count = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        keep = self.max_entries - self.max_entries // 10
+        if count > self.max_entries:
+            self._conn.execute('DELETE FROM verdicts WHERE rowid IN '
+                               '(SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)', (count - keep,))
+            count = keep
+        self._count = count
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+
+
+def app_bundle(app):
+    """
+    Return the bundle (package name) of an app, '' if unknown.
+    """
+    if app is None:
+        return ''
+    return getattr(app, 'package_name', '') or getattr(app, 'bundle', '') or ''
+
+
+def app_version(app):
+    """
+    Return the version string of an app: its declared version if known,
+    otherwise a hash of its package file, '' when there is neither.
+    """
+    if app is None:
+        return ''
+    version = getattr(app, 'version', '')
+    if version:
+        return version
+    app_path = getattr(app, 'app_path', '')
+    if app_path and os.path.exists(app_path):
+        h = blake2b(digest_size=16)
+        with open(app_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+    return ''
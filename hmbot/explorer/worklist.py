@@ -0,0 +1,130 @@
+import os
+import json
+import heapq
+from loguru import logger
+from hmbot.model.page import Page
+from hmbot.model.ptg import PTGParser
+from hmbot.model.ptg_loader import PageLoader
+from hmbot.model.artifact_store import ArtifactStore
+from hmbot.utils.proto import PageInfo
+
+VERIFY = 'verify'
+EXPLORE = 'explore'
+EVENT = 'event'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+
+class Worklist(object):
+    """
+    The class describes the priority worklist of verification tasks.
+
+    A task is a (kind, page_id, edge, depth) list: VERIFY checks the
+    transition page_id -> edge, EXPLORE asks the LLM for the events of
+    page_id, EVENT executes the event command edge on page_id. Tasks with
+    a lower priority run first, tasks of equal priority in push order.
+    """
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, task, priority=0):
+        heapq.heappush(self._heap, (priority, self._seq, list(task)))
+        self._seq += 1
+
+    def pop(self):
+        return heapq.heappop(self._heap)[2]
+
+    def _json(self):
+        return {'seq': self._seq, 'tasks': [list(entry) for entry in sorted(self._heap)]}
+
+    @classmethod
+    def _from_json(cls, data):
+        worklist = cls()
+        worklist._heap = [(priority, seq, task) for priority, seq, task in data['tasks']]
+        heapq.heapify(worklist._heap)
+        worklist._seq = data['seq']
+        return worklist
+
+
+class Checkpoint(object):
+    """
+    The class describes the on-disk checkpoint of a verification run: the
+    worklist, the visited pages and the PTG_IR, rewritten after every task.
+
+    Pages still backed by the saved PTG are referenced by their original
+    files; pages captured or refreshed during the run are written through a
+    content-addressed artifact store, so unchanged pages are not rewritten.
+    """
+    def __init__(self, dir_path):
+        """
+        Args:
+            dir_path (str): the checkpoint directory.
+        """
+        if not dir_path.endswith('/'):
+            dir_path = dir_path + '/'
+        os.makedirs(dir_path, exist_ok=True)
+        self.dir_path = dir_path
+        self.file = dir_path + CHECKPOINT_FILE
+        self.artifacts = ArtifactStore(dir_path)
+        self._dumped = {}
+
+    def exists(self):
+        return os.path.exists(self.file)
+
+    def _page_json(self, page):
+        if isinstance(page._loader, PageLoader) and page._vht is None and page._img is None:
+            vht_path, img_path = page._loader._paths[page._source]
+            vht_file, img_file = page._loader.dir_path + vht_path, page._loader.dir_path + img_path
+        else:
+            dumped = self._dumped.get(page.id)
+            if dumped is None or dumped[0] is not page._vht or dumped[1] is not page._img:
+                dumped = (page._vht, page._img, page._dump(page.id, self.dir_path, self.artifacts))
+                self._dumped[page.id] = dumped
+            vht_file, img_file = dumped[2]
+        page_dict = page._dict(vht_file, img_file)
+        page_dict['id'] = page.id
+        return page_dict
+
+    def save(self, ptg_ir, worklist, visited_pages_id, state=None):
+        """
+        Write the checkpoint atomically.
+        """
+        data = {'pages': [self._page_json(page) for page in ptg_ir.pages],
+                'transitions': [[src, tgt, [event._json() for event in events if event is not None]]
+                                for src, edges in ptg_ir.transitions.items()
+                                for tgt, events in edges.items()],
+                'worklist': worklist._json(),
+                'visited_pages_id': sorted(visited_pages_id),
+                'state': state or {}}
+        # the artifacts must be on disk before the checkpoint refers to them
+        self.artifacts.flush()
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.file)
+
+    def load(self, device, budget=256 << 20):
+        """
+        Read the checkpoint; page VHTs and screenshots are loaded lazily.
+
+        Returns:
+            (list, dict, Worklist, set, dict): the pages, transitions, worklist, visited page ids and state.
+        """
+        with open(self.file, 'r') as f:
+            data = json.load(f)
+        loader = PageLoader(device, '', budget=budget)
+        pages = []
+        for page_dict in data['pages']:
+            id = page_dict['id']
+            loader.register(id, page_dict['vht'], page_dict['img'])
+            page_info = PageInfo(bundle=page_dict['bundle'], ability=page_dict['ability'], name=page_dict['ability'])
+            pages.append(Page(None, None, page_dict['rsc'], page_info, id, loader=loader))
+        transitions = {page.id: {} for page in pages}
+        for src, tgt, events in data['transitions']:
+            transitions[src][tgt] = PTGParser._parse_events(device, events)
+        worklist = Worklist._from_json(data['worklist'])
+        logger.info(f"Resumed checkpoint {self.file}: {len(pages)} pages, {len(worklist)} pending tasks")
+        return pages, transitions, worklist, set(data['visited_pages_id']), data['state']
@@ -1,4 +1,3 @@
-import time
 from .app.android_app import AndroidApp
 from .app.harmony_app import HarmonyApp
 from .device.device import Device
@@ -7,20 +6,22 @@ from .explorer.llm import LLM
 from .utils.proto import OperatingSystem, ExploreGoal
 from .model.page import Page
 from .model.ptg import PTG
+from .model.ptg_store import PTGStore
+from .model.artifact_store import ArtifactStore
 from loguru import logger
 import os
 import shutil
 
 
 class HMBot(object):
-    def __init__(self, os, serials, llm_config):
+    def __init__(self, os, serials, llm_config, connector=None):
         self.os = os
         self.serials = serials
         self.devices = []
         self.llm_config = llm_config
         self.app = None
         for serial in serials:
-            self.devices.append(Device(serial, os))
+            self.devices.append(Device(serial, os, connector))
 
     def explore(self, args):
         if args.os == OperatingSystem.HARMONY:
@@ -40,9 +41,9 @@ class HMBot(object):
             llm = LLM(device=device, url=self.llm_config['base_url'], model=self.llm_config['model'],
                       api_key=self.llm_config['api_key'])
             device.install_app(self.app)
-            time.sleep(5)
+            device.settle('install', timeout=5)
             device.start_app(self.app)
-            time.sleep(10)
+            device.settle('start_app', timeout=10)
 
             output_dir = args.output
             if not output_dir.endswith('/'):
@@ -85,3 +86,39 @@ class HMBot(object):
                             os.makedirs(testcase_dir)
                         llm.explore(key=ExploreGoal.TESTCASE, value=script, max_steps=args.max_steps,
                                     output_dir=testcase_dir)
+            logger.info(f"Settle times of {device.serial}: {device.settle_detector.summary()}")
+
+    def verify(self, args):
+        from .explorer.ptg_verify import PTGVerifier
+        if args.app_path:
+            if args.os == OperatingSystem.HARMONY:
+                self.app = HarmonyApp(args.app_path)
+            elif args.os == OperatingSystem.ANDROID:
+                self.app = AndroidApp(app_path=args.app_path)
+
+        ptg_path = args.ptg_path
+        if not ptg_path.endswith('/'):
+            ptg_path = ptg_path + '/'
+        checkpoint_dir = args.checkpoint or ptg_path + 'checkpoint/'
+        cache_file = args.verdict_cache or ptg_path + 'verdicts.db'
+        # the pages and transitions found while verifying are upserted as they are found,
+        # on top of the saved PTG, so a crashed run keeps them
+        output_dir = ptg_path + 'output/'
+        store = PTGStore(output_dir + 'ptg.verified.db', output_dir, ArtifactStore(output_dir), relative_to=ptg_path)
+        store.import_json(output_dir + 'ptg.json', replace=not args.resume)
+        try:
+            if len(self.devices) > 1 and not (args.incremental or args.resume):
+                from .explorer.coordinator import VerificationCoordinator
+                coordinator = VerificationCoordinator(self.devices, ptg_path, app=self.app, cache_file=cache_file,
+                                                      store=store)
+                return coordinator.verify()
+            verifier = PTGVerifier(self.devices[0], ptg_path, app=self.app, checkpoint_dir=checkpoint_dir,
+                                   cache_file=cache_file, store=store)
+            if args.incremental:
+                verifier.verify_ptg_incremental(radius=args.radius, resume=args.resume)
+            else:
+                verifier.verify_ptg_dfs(resume=args.resume)
+            return verifier.report
+        finally:
+            store.export_json(output_dir + 'ptg.verified.json')
+            store.close()
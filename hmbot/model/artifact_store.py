@@ -0,0 +1,137 @@
+import os
+import json
+import threading
+from hashlib import blake2b
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from loguru import logger
+
+JPEG_TIERS = {'high': 95, 'medium': 85, 'low': 70}
+
+
+class ImageCodec(object):
+    """
+    The class describes how screenshots are encoded: lossless PNG with a
+    compression level, WebP (lossless above quality 100) or JPEG with a
+    quality or one of the JPEG_TIERS.
+    """
+    def __init__(self, format='png', level=3, quality=90):
+        """
+        Args:
+            format (str, optional): 'png', 'webp' or 'jpeg'. Default is 'png'.
+            level (int, optional): PNG compression level from 0 (fastest) to 9 (smallest). Default is 3.
+            quality (int or str, optional): WebP/JPEG quality, or a JPEG tier name. Default is 90.
+        """
+        if isinstance(quality, str):
+            quality = JPEG_TIERS[quality]
+        if format == 'png':
+            self.ext = '.png'
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, level]
+        elif format == 'webp':
+            self.ext = '.webp'
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        elif format in ('jpeg', 'jpg'):
+            self.ext = '.jpg'
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        else:
+            raise ValueError('unknown image format: %s' % format)
+
+    @property
+    def tag(self):
+        return '%s%s' % (self.ext, self.params)
+
+    def encode(self, img):
+        ok, buffer = cv2.imencode(self.ext, img, self.params)
+        if not ok:
+            raise ValueError('failed to encode image as %s' % self.ext)
+        return buffer.tobytes()
+
+
+class ArtifactStore(object):
+    """
+    The class describes a content-addressed store of page artifacts.
+
+    Every artifact is named after the hash of its content (and of the codec
+    for screenshots), so pages that are byte-identical, such as the same
+    screen reached by different edges or in repeated runs, are written
+    once. Encoding and writing run in a thread pool: put_* return the
+    final path right away, flush() waits for the pending writes.
+    """
+    def __init__(self, dir_path, codec=None, workers=None):
+        """
+        Args:
+            dir_path (str): the directory to write the artifacts to.
+            codec (ImageCodec, optional): the screenshot codec. Default is PNG at level 3.
+            workers (int, optional): number of encoding threads. Default is the number of cores.
+        """
+        self.dir_path = dir_path
+        self.codec = codec or ImageCodec()
+        self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count(),
+                                        thread_name_prefix='artifact')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._written = set()
+        self.stats = {'written': 0, 'skipped': 0}
+
+    def put_image(self, img):
+        """
+        Store a screenshot.
+
+        Returns:
+            str: the path of the encoded screenshot.
+        """
+        img = np.ascontiguousarray(img)
+        h = blake2b(digest_size=16)
+        h.update(('%s%s%s' % (img.shape, img.dtype, self.codec.tag)).encode())
+        h.update(memoryview(img).cast('B'))
+        return self._put(h.hexdigest() + self.codec.ext, self.codec.encode, img)
+
+    def put_json(self, obj, indent=2):
+        """
+        Store a json document, e.g. a VHT.
+
+        Returns:
+            str: the path of the json file.
+        """
+        data = json.dumps(obj, indent=indent, ensure_ascii=False).encode()
+        return self._put(blake2b(data, digest_size=16).hexdigest() + '.json', None, data)
+
+    def _put(self, name, encode, content):
+        path = self.dir_path + name
+        with self._lock:
+            if name in self._written or name in self._pending:
+                self.stats['skipped'] += 1
+                return path
+            if os.path.exists(path):
+                self._written.add(name)
+                self.stats['skipped'] += 1
+                return path
+            self._pending[name] = self._pool.submit(self._write, name, path, encode, content)
+        return path
+
+    def _write(self, name, path, encode, content):
+        data = content if encode is None else encode(content)
+        # write to a temporary file first so a crash never leaves a truncated artifact under its final name
+        tmp_path = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._pending.pop(name, None)
+            self._written.add(name)
+            self.stats['written'] += 1
+
+    def flush(self):
+        """
+        Wait until every pending artifact is written, raising the first write error.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+        logger.info(f"Artifact store {self.dir_path}: {self.stats['written']} written, {self.stats['skipped']} deduplicated")
@@ -0,0 +1,111 @@
+from hashlib import blake2b
+
+EXACT_BUCKET = 8
+NEAR_BUCKET = 64
+
+
+class VHTFingerprint(object):
+    """
+    The class describes the structural (Merkle) hashes of a VHT snapshot.
+
+    Every node is hashed bottom-up from its type, id and the bucketed
+    bounds of its layout, followed by the ordered hashes of its children.
+    Text is left out on purpose so that times, counters and other volatile
+    content do not change the fingerprint of a page. Two bucket sizes are
+    kept: the exact one tolerates jitter of a few pixels and the near one
+    only keeps the coarse layout.
+    """
+    def __init__(self, nodes, parents, exact_bucket=EXACT_BUCKET, near_bucket=NEAR_BUCKET):
+        """
+        Args:
+            nodes (list): the nodes of the snapshot in pre-order.
+            parents (list): the pre-order position of each node's parent, -1 for the root.
+        """
+        self.nodes = nodes
+        self.exact = [b''] * len(nodes)
+        self.near = [b''] * len(nodes)
+        exact_children = [[] for _ in nodes]
+        near_children = [[] for _ in nodes]
+        for position in range(len(nodes) - 1, -1, -1):
+            attribute = nodes[position].attribute
+            (x1, y1), (x2, y2) = attribute['bounds']
+            label = '%s|%s|' % (attribute.get('type', ''), attribute.get('id', ''))
+            exact = _digest(label, (x1 // exact_bucket, y1 // exact_bucket, x2 // exact_bucket, y2 // exact_bucket),
+                            exact_children[position])
+            near = _digest(label, (x1 // near_bucket, y1 // near_bucket, x2 // near_bucket, y2 // near_bucket),
+                           near_children[position])
+            self.exact[position] = exact
+            self.near[position] = near
+            parent = parents[position]
+            if parent >= 0:
+                exact_children[parent].append(exact)
+                near_children[parent].append(near)
+        self._positions = {id(node): position for position, node in enumerate(nodes)}
+        self._parents = parents
+
+    @property
+    def root(self):
+        return self.exact[0].hex()
+
+    @property
+    def root_near(self):
+        return self.near[0].hex()
+
+    def subtree(self, node, near=False):
+        """
+        Return the hash of the subtree rooted at node.
+        """
+        position = self._positions[id(node)]
+        return (self.near if near else self.exact)[position].hex()
+
+    def changed(self, other):
+        """
+        Return the regions of this snapshot whose structure does not appear in other.
+
+        Args:
+            other (VHTFingerprint): the fingerprint of the snapshot to compare with.
+
+        Returns:
+            list: the deepest nodes whose subtree hash is missing from other,
+            i.e. nodes that differ although all of their children are unchanged.
+        """
+        known = set(other.exact)
+        has_changed_child = [False] * len(self.nodes)
+        missing = [digest not in known for digest in self.exact]
+        for position in range(len(self.nodes) - 1, 0, -1):
+            if missing[position]:
+                has_changed_child[self._parents[position]] = True
+        return [self.nodes[position] for position in range(len(self.nodes))
+                if missing[position] and not has_changed_child[position]]
+
+
+def _digest(label, bucket, children):
+    h = blake2b(digest_size=8)
+    h.update(('%s%d,%d,%d,%d' % (label, *bucket)).encode())
+    for child in reversed(children):
+        h.update(child)
+    return h.digest()
+
+
+def preorder(root):
+    """
+    Return the nodes under root in pre-order together with their parent positions.
+    """
+    nodes = []
+    parents = []
+    stack = [(root, -1)]
+    while stack:
+        node, parent = stack.pop()
+        position = len(nodes)
+        nodes.append(node)
+        parents.append(parent)
+        for child in reversed(node._children):
+            stack.append((child, position))
+    return nodes, parents
+
+
+def page_fingerprint(bundle, ability, root):
+    """
+    Combine the foreground bundle/ability with a structural root hash into a page key.
+    """
+    return '%s/%s#%s' % (bundle, ability, root)
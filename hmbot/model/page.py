@@ -1,26 +1,137 @@
+from dataclasses import asdict, is_dataclass
 from .vht import VHT, VHTParser
-from ..utils.cv import write
+from .fingerprint import page_fingerprint
+from .profile import profile_distances
+from ..utils.cv import write, image_hash, image_hashes, hamming
 
 class Page(object):
-    def __init__(self, vht, img, rsc, info, id=0):
+    def __init__(self, vht, img, rsc, info, id=0, loader=None):
+        """
+        Args:
+            loader (PageLoader or CaptureLoader, optional): load the parts of the page that are
+                None on demand, from a saved PTG or from the device.
+        """
+        self._loader = loader
+        self._source = id
         self.vht = vht
         self.img = img
         self.rsc = rsc
         self.info = info
         self.id = id # extract from vht
-        self._standardize()
-    
+        # (start, end) wall-clock times of the probes that captured each part, see Device.dump_page
+        self.timestamps = {}
+        self.skew = 0.0
+        if loader is None:
+            self._standardize()
+
+    @property
+    def vht(self):
+        if self._vht is None and self._loader is not None:
+            return self._loader.vht(self._source)
+        return self._vht
+
+    @vht.setter
+    def vht(self, vht):
+        self._vht = vht
+        self._fingerprints = {}
+        self._profile = None
+
+    @property
+    def img(self):
+        if self._img is None and self._loader is not None:
+            return self._loader.img(self._source)
+        return self._img
+
+    @img.setter
+    def img(self, img):
+        self._img = img
+        self._img_hash = None
+
+    @property
+    def rsc(self):
+        if self._rsc is None and self._loader is not None:
+            return self._loader.rsc(self._source)
+        return self._rsc
+
+    @rsc.setter
+    def rsc(self, rsc):
+        self._rsc = rsc
+
+    @property
+    def info(self):
+        if self._info is None and self._loader is not None:
+            return self._loader.info(self._source)
+        return self._info
+
+    @info.setter
+    def info(self, info):
+        self._info = info
+
     def _standardize(self):
-        if self.info.name == '':
-            roots = self.vht(bundle=self.info.bundle)
+        self.vht = Page._standardized(self.vht, self.info)
+
+    @staticmethod
+    def _standardized(vht, info):
+        """
+        Return the VHT of the app's own window, naming the page after it if its info has no name.
+        """
+        if info.name == '':
+            roots = vht(bundle=info.bundle)
             if len(roots) :
-                self.vht = VHT(roots[0])
-                self.info.name = self.vht._root.attribute['page']
+                vht = VHT(roots[0], compressed=False)
+                info.name = vht._root.attribute['page']
+        return vht
 
     def __call__(self, **kwds):
         return self.vht(**kwds)
+
+    def img_hash(self):
+        """
+        Return the perceptual hashes of the page screenshot, recomputed when the screenshot is replaced.
+        """
+        if self._img_hash is None:
+            self._img_hash = image_hash(self.img)
+        return self._img_hash
+
+    @classmethod
+    def hash_images(cls, pages):
+        """
+        Compute the perceptual hashes of many pages' screenshots in one batch.
+        """
+        pages = [page for page in pages if page._img_hash is None and page.img is not None]
+        for page, hashes in zip(pages, image_hashes([page.img for page in pages])):
+            page._img_hash = hashes
+
+    def fingerprint(self, near=False):
+        """
+        Return the structural fingerprint of the page, made of its bundle,
+        ability and the root hash of its VHT (the coarse layout hash if near).
+        The result is kept on the page, so a lazily loaded VHT is not reloaded for it.
+        """
+        if near not in self._fingerprints:
+            vht_fingerprint = self.vht.fingerprint()
+            root = vht_fingerprint.root_near if near else vht_fingerprint.root
+            if self.info is None:
+                self._fingerprints[near] = page_fingerprint('', '', root)
+            else:
+                self._fingerprints[near] = page_fingerprint(self.info.bundle, self.info.ability, root)
+        return self._fingerprints[near]
+
+    def profile(self):
+        """
+        Return the bag-of-paths profile of the page VHT, kept on the page like the fingerprint.
+        """
+        if self._profile is None:
+            self._profile = self.vht.profile()
+        return self._profile
     
-    def _dump(self, id, dir_path):
+    def _dump(self, id, dir_path, artifacts=None):
+        """
+        Write the VHT and screenshot of the page, to <id>.json/<id>.png or,
+        given an ArtifactStore, under their content hashes.
+        """
+        if artifacts is not None:
+            return (artifacts.put_json(self.vht._root._json_dict()), artifacts.put_image(self.img))
         vht_file = dir_path + str(id) + '.json'
         img_file = dir_path + str(id) + '.png'
         VHTParser.dump(self.vht, vht_file)
@@ -30,10 +141,9 @@ class Page(object):
     def _dict(self, vht_file='', img_file=''):
         return {'vht': vht_file,
                 'img': img_file,
-                'rsc': self.rsc,
-                'ability': self.ability,
-                'audio_type': self.audio_type,
-                'bundle': self.bundle,
+                'rsc': asdict(self.rsc) if is_dataclass(self.rsc) else self.rsc,
+                'ability': self.info.ability if self.info else '',
+                'bundle': self.info.bundle if self.info else '',
                 }
 
     def _is_same(self, page):
@@ -48,11 +158,9 @@ class Page(object):
         return False
 
     def vht_similarity(self, page):
-        # todo
-        vht_sim = 0
+        vht_sim = 1 - float(profile_distances(self.profile(), page.profile())[0])
         return vht_sim
 
     def img_similarity(self, page):
-        # todo
-        img_sim = 0
+        img_sim = 1 - hamming(self.img_hash().combined, page.img_hash().combined) / 192
         return img_sim
\ No newline at end of file
@@ -0,0 +1,48 @@
+import zlib
+import numpy as np
+
+PROFILE_DIMS = 512
+PROFILE_DEPTH = 3
+
+
+def path_profile(nodes, parents, dims=PROFILE_DIMS, depth=PROFILE_DEPTH):
+    """
+    Build the bag-of-paths profile of a VHT snapshot.
+
+    Every node contributes the path of the last `depth` types leading to it
+    (e.g. List/ListItem/Text); paths are hashed into a fixed number of
+    buckets so profiles of different pages can be compared as vectors.
+
+    Args:
+        nodes (list): the nodes of the snapshot in pre-order.
+        parents (list): the pre-order position of each node's parent, -1 for the root.
+
+    Returns:
+        np.ndarray: a float32 vector of path counts.
+    """
+    paths = [()] * len(nodes)
+    buckets = np.empty(len(nodes), dtype=np.int64)
+    for position, node in enumerate(nodes):
+        parent = parents[position]
+        prefix = paths[parent][1 - depth:] if parent >= 0 and depth > 1 else ()
+        path = prefix + (node.attribute.get('type', ''),)
+        paths[position] = path
+        buckets[position] = zlib.crc32('/'.join(path).encode()) % dims
+    return np.bincount(buckets, minlength=dims).astype(np.float32)
+
+
+def profile_distances(profile, profiles):
+    """
+    Normalized L1 distance between one profile and a stack of profiles.
+
+    Args:
+        profile (np.ndarray): a profile vector.
+        profiles (np.ndarray): a matrix with one profile per row.
+
+    Returns:
+        np.ndarray: distances in [0, 1], 0 meaning identical bags of paths.
+    """
+    profiles = np.atleast_2d(profiles)
+    total = profiles.sum(axis=1) + profile.sum()
+    total[total == 0] = 1
+    return np.abs(profiles - profile).sum(axis=1) / total
@@ -1,16 +1,37 @@
 from hmbot.utils.proto import PageInfo
 from .vht import VHT, VHTNode, VHTParser
+from .vht_array import ArrayVHT
 from .page import Page
+from .ptg_store import PTGStore
+from .ptg_loader import PageLoader, pack_images
+from .artifact_store import ArtifactStore
 from .event import *
+from ..utils.bktree import BKTree
 import json
 import cv2
 
 class PTG(object):
-    def __init__(self):
+    def __init__(self, dedup=True, near=False, store=None):
+        """
+        Args:
+            dedup (bool, optional): merge pages whose exact fingerprint matches a stored page. Default is True.
+            near (bool, optional): also merge pages whose coarse fingerprint matches, which ignores
+                text and small layout changes, so pages with the same layout but other content are merged.
+                Default is False.
+            store (PTGStore, optional): persist every added page and edge to this store as it is added.
+        """
         self.main_pages = []
         self.pages = []
+        self._ids = {}
+        self._store = store
         self._adj_list = {}
         self._visited = {}
+        self._dedup = dedup
+        self._near = near
+        self._fingerprints = {}
+        self._near_fingerprints = {}
+        self._img_index = BKTree()
+        self._unindexed = []
     
     def add_main_page(self, page):
         if self.add_page(page):
@@ -20,21 +41,85 @@ class PTG(object):
 
     def add_page(self, page):
         if self._is_new_page(page):
+            self._ids[page] = len(self.pages)
             self.pages.append(page)
             self._adj_list[page] = {}
+            if self._dedup:
+                self._fingerprints.setdefault(page.fingerprint(), page)
+                if self._near:
+                    self._near_fingerprints.setdefault(page.fingerprint(near=True), page)
+            self._unindexed.append(page)
+            if self._store is not None:
+                self._store.put_page(self._ids[page], page)
             return True
         return False
     
     def add_edge(self, src_page, tgt_page, events):
         self.add_page(src_page)
         self.add_page(tgt_page)
+        src_page = self.find_page(src_page)
+        tgt_page = self.find_page(tgt_page)
         self._adj_list[src_page][tgt_page] = events
+        if self._store is not None:
+            self._store.put_edge(self._ids[src_page], self._ids[tgt_page], events)
+
+    def page_id(self, page):
+        """
+        Return the position of a stored page in self.pages, or -1.
+        """
+        page = self.find_page(page)
+        return -1 if page is None else self._ids[page]
+
+    def attach_store(self, store):
+        """
+        Persist the graph to store: write everything added so far, then every later change.
+        """
+        self._store = store
+        for id, page in enumerate(self.pages):
+            store.put_page(id, page, commit=False)
+        for src_page, edges in self._adj_list.items():
+            for tgt_page, events in edges.items():
+                store.put_edge(self._ids[src_page], self._ids[tgt_page], events, commit=False)
+        store.commit()
+
+    def find_page(self, page):
+        """
+        Find the stored page equal to page: the page itself, a page with the
+        same exact fingerprint, or if the graph merges near pages, one with
+        the same coarse fingerprint.
+
+        Returns:
+            Page: the stored page, or None.
+        """
+        if page in self._adj_list:
+            return page
+        if not self._dedup:
+            return None
+        found = self._fingerprints.get(page.fingerprint())
+        if found is None and self._near:
+            found = self._near_fingerprints.get(page.fingerprint(near=True))
+        return found
     
+    def similar_pages(self, page, k=12):
+        """
+        Find the stored pages whose screenshot hashes are within hamming distance k of page's.
+
+        Returns:
+            list: (distance, page) pairs sorted by distance.
+        """
+        if self._unindexed:
+            # screenshots are hashed in one batch on the first query after pages were added
+            Page.hash_images(self._unindexed)
+            for stored in self._unindexed:
+                if stored._img_hash is not None:
+                    self._img_index.add(stored._img_hash.combined, stored)
+            self._unindexed = []
+        if page.img is None:
+            return []
+        return self._img_index.search(page.img_hash().combined, k)
+
     def _is_new_page(self, new_page):
-        for page in self.pages:
-            if page._is_same(new_page):
-                return False
-        return True
+        return self.find_page(new_page) is None
     
     def _json_list(self, dir_path):
         res = []
@@ -43,7 +128,7 @@ class PTG(object):
             vht_file, img_file = src_page._dump(id, dir_path)
             edge_list = []
             for (tgt_page, events) in self._adj_list[src_page].items():
-                tgt_id = self.pages.index(tgt_page)
+                tgt_id = self._ids[tgt_page]
                 event_list = [event._json() for event in events]
                 edge_dict = {'target_id': tgt_id,
                              'events': event_list}
@@ -91,10 +176,60 @@ class PTGParser(object):
         }
 
     @classmethod
-    def parse(cls, device, dir_path):
+    def _parse_events(cls, device, event_list):
+        """
+        Rebuild the events of an edge from their json form (Event._json).
+        """
+        events = []
+        for event in event_list:
+            type = event['type']
+            if type == 'Click':
+                node_data = event['node']
+                attrib = cls._extract_node_attributes(node_data)
+                node = VHTNode(device, attrib)
+                event = ClickEvent(node)
+            elif type == 'LongClick':
+                node_data = event['node']
+                attrib = cls._extract_node_attributes(node_data)
+                node = VHTNode(device, attrib)
+                event = LongClickEvent(node)
+            elif type == 'Input':
+                node_data = event['node']
+                attrib = cls._extract_node_attributes(node_data)
+                node = VHTNode(device, attrib)
+                text = event['node']['text']
+                event = InputEvent(node, text)
+            elif type == 'SwipeExt':
+                event = SwipeExtEvent(device, None, event['direction'])
+            elif type == 'Key':
+                event = KeyEvent(device, None, event['key'])
+            elif type == 'StartApp':
+                event = StartAppEvent(device, event['app'])
+            if event:
+                events.append(event)
+        return events
+
+    @classmethod
+    def parse(cls, device, dir_path, columnar=False, lazy=False, budget=256 << 20):
+        """
+        Load a saved PTG.
+
+        Args:
+            device (Device): the device the loaded VHT nodes are bound to.
+            dir_path (str): the exploration output directory.
+            columnar (bool, optional): load VHTs as ArrayVHT. Default is False.
+            lazy (bool, optional): only load the graph skeleton and load page VHTs and
+                screenshots on first access, under an LRU memory budget. Default is False.
+            budget (int, optional): memory budget in bytes of a lazy PTG. Default is 256 MiB.
+        """
         with open(dir_path + 'output/ptg.json', 'r') as f:
             json_data = json.load(f)
-        ptg = PTG()
+        # saved pages are already distinct and are addressed by their ids
+        ptg = PTG(dedup=False)
+        loader = None
+        if lazy:
+            loader = PageLoader(device, dir_path, budget=budget, columnar=columnar)
+            loader.open_pack(dir_path + 'output/')
 
         pages = []
         for item in json_data:
@@ -105,14 +240,22 @@ class PTGParser(object):
             ability = info['ability']
             bundle = info['bundle']
             id = info['id']
-            with open(dir_path + vht_path, 'r') as f:
-                vht_str = f.read()
-            vht_json = json.loads(vht_str)
-            vht = VHTParser._parse_hdc_json(vht_json, device)
-            img = cv2.imread(dir_path + img_path)
             page_info = PageInfo(bundle=bundle, ability=ability, name=ability)
-            page = Page(vht, img, rsc, page_info, id)
+            if loader is not None:
+                loader.register(id, vht_path, img_path)
+                page = Page(None, None, rsc, page_info, id, loader=loader)
+            else:
+                with open(dir_path + vht_path, 'r') as f:
+                    vht_str = f.read()
+                vht_json = json.loads(vht_str)
+                vht = VHTParser._parse_hdc_json(vht_json, device)
+                if columnar:
+                    vht = ArrayVHT(vht)
+                img = cv2.imread(dir_path + img_path)
+                page = Page(vht, img, rsc, page_info, id)
             pages.append(page)
+        for page in pages:
+            ptg.add_page(page)
 
         for item in json_data:
             src_id = item['info']['id']
@@ -120,39 +263,31 @@ class PTGParser(object):
             for edge in item['edge']:
                 tgt_id = edge['target_id']
                 tgt_page = pages[tgt_id]
-                events = []
-                for event in edge['events']:
-                    type = event['type']
-                    if type == 'Click':
-                        node_data = event['node']
-                        attrib = cls._extract_node_attributes(node_data)
-                        node = VHTNode(device, attrib)
-                        event = ClickEvent(node)
-                    elif type == 'LongClick':
-                        node_data = event['node']
-                        attrib = cls._extract_node_attributes(node_data)
-                        node = VHTNode(device, attrib)
-                        event = LongClickEvent(node)
-                    elif type == 'Input':
-                        node_data = event['node']
-                        attrib = cls._extract_node_attributes(node_data)
-                        node = VHTNode(device, attrib)
-                        text = event['node']['text']
-                        event = InputEvent(node, text)
-                    elif type == 'SwipeExt':
-                        event = SwipeExtEvent(device, None, event['direction'])
-                    elif type == 'Key':
-                        event = KeyEvent(device, None, event['key'])
-                    elif type == 'StartApp':
-                        event = StartAppEvent(device, event['app'])
-                    if event:
-                        events.append(event)
+                events = cls._parse_events(device, edge['events'])
                 ptg.add_edge(src_page, tgt_page, events)
         return ptg
 
 
     @classmethod
-    def dump(cls, ptg, dir_path, indent=2):
-        with open(dir_path + 'ptg.json', 'w') as write_file:
-            json.dump(ptg._json_list(dir_path), write_file, indent=indent, ensure_ascii=False)
+    def pack(cls, dir_path):
+        """
+        Pack the screenshots of a saved PTG into dir_path/output/images.pack,
+        from which lazy PTGs map their screenshots instead of decoding PNGs.
+        """
+        with open(dir_path + 'output/ptg.json', 'r') as f:
+            json_data = json.load(f)
+        pack_images(dir_path + 'output/',
+                    ((item['info']['id'], cv2.imread(dir_path + item['info']['img'])) for item in json_data))
+
+    @classmethod
+    def dump(cls, ptg, dir_path, indent=2, codec=None):
+        """
+        Export the PTG to dir_path/ptg.json. A PTG without a store is first
+        attached to dir_path/ptg.db, with its page artifacts written to a
+        content-addressed store using codec (PNG by default), so later
+        dumps only stream the store.
+        """
+        if ptg._store is None:
+            ptg.attach_store(PTGStore(dir_path + 'ptg.db', dir_path, ArtifactStore(dir_path, codec)))
+        ptg._store.export_json(dir_path + 'ptg.json', indent=indent)
 
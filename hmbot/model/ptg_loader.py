@@ -0,0 +1,140 @@
+import os
+import json
+import threading
+import cv2
+import numpy as np
+from loguru import logger
+from .vht import VHTParser
+from .vht_array import ArrayVHT
+from ..utils.lru import LRUCache
+
+PACK_FILE = 'images.pack'
+PACK_INDEX = 'images.idx.json'
+# a parsed VHT takes a few times the size of its json source in memory
+VHT_WEIGHT_FACTOR = 4
+
+
+class PageLoader(object):
+    """
+    The class describes the on-demand loader of the VHTs and screenshots of a saved PTG.
+
+    Loaded values are kept in an LRU cache bounded by a memory budget.
+    Screenshots are read from a memory-mapped pack file when one exists
+    (see pack_images); slicing it costs no I/O up front and the OS pages
+    the pixels in and out, so those screenshots bypass the cache. The
+    loader is shared by the verifiers of all devices; a value missing from
+    the cache is loaded by one thread while the others wait for it.
+    """
+    def __init__(self, device, dir_path, budget=256 << 20, columnar=False):
+        """
+        Args:
+            device (Device): the device the loaded VHT nodes are bound to.
+            dir_path (str): the directory the page artifact paths are relative to.
+            budget (int, optional): memory budget of the cache in bytes. Default is 256 MiB.
+            columnar (bool, optional): load VHTs as ArrayVHT. Default is False.
+        """
+        self.device = device
+        self.dir_path = dir_path
+        self.columnar = columnar
+        self._paths = {}
+        self._cache = LRUCache(budget, weigh=lambda item: item[1])
+        self._pack = None
+        self._pack_index = {}
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def register(self, id, vht_path, img_path):
+        self._paths[id] = (vht_path, img_path)
+
+    def open_pack(self, pack_dir):
+        """
+        Serve screenshots from the image pack in pack_dir if it exists.
+
+        Returns:
+            bool: whether a pack was opened.
+        """
+        pack_file = os.path.join(pack_dir, PACK_FILE)
+        index_file = os.path.join(pack_dir, PACK_INDEX)
+        if not (os.path.exists(pack_file) and os.path.exists(index_file)):
+            return False
+        with open(index_file, 'r') as f:
+            self._pack_index = {int(id): (offset, tuple(shape)) for id, (offset, shape) in json.load(f).items()}
+        self._pack = np.memmap(pack_file, dtype=np.uint8, mode='r')
+        logger.info(f"Opened image pack {pack_file} with {len(self._pack_index)} screenshots")
+        return True
+
+    def _cached(self, key, load):
+        item = self._cache.get(key)
+        if item is not None:
+            return item[0]
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        with lock:
+            # another thread may have loaded it while this one waited
+            item = self._cache.get(key) if key in self._cache else None
+            if item is None:
+                item = load()
+                self._cache.put(key, item)
+        with self._lock:
+            self._loading.pop(key, None)
+        return item[0]
+
+    def vht(self, id):
+        return self._cached(('vht', id), lambda: self._load_vht(id))
+
+    def _load_vht(self, id):
+        vht_path = self.dir_path + self._paths[id][0]
+        with open(vht_path, 'r') as f:
+            vht_str = f.read()
+        vht = VHTParser._parse_hdc_json(json.loads(vht_str), self.device)
+        if self.columnar:
+            vht = ArrayVHT(vht)
+            return (vht, vht.nbytes)
+        return (vht, len(vht_str) * VHT_WEIGHT_FACTOR)
+
+    def img(self, id):
+        if id in self._pack_index:
+            offset, shape = self._pack_index[id]
+            return self._pack[offset:offset + int(np.prod(shape))].reshape(shape)
+        return self._cached(('img', id), lambda: self._load_img(id))
+
+    def _load_img(self, id):
+        img = cv2.imread(self.dir_path + self._paths[id][1])
+        return (img, 0 if img is None else img.nbytes)
+
+    def rsc(self, id):
+        # the resources and info of a saved page are held by the page itself
+        return None
+
+    def info(self, id):
+        return None
+
+    @property
+    def stats(self):
+        return {'hits': self._cache.hits,
+                'misses': self._cache.misses,
+                'evictions': self._cache.evictions,
+                'bytes': self._cache.weight}
+
+
+def pack_images(pack_dir, images):
+    """
+    Write screenshots into an image pack that PageLoader can memory-map.
+
+    Args:
+        pack_dir (str): the directory to write the pack and its index to.
+        images (iterable): (id, img) pairs; None images are skipped.
+    """
+    index = {}
+    offset = 0
+    with open(os.path.join(pack_dir, PACK_FILE), 'wb') as f:
+        for id, img in images:
+            if img is None:
+                continue
+            img = np.ascontiguousarray(img, dtype=np.uint8)
+            f.write(img.tobytes())
+            index[id] = (offset, list(img.shape))
+            offset += img.nbytes
+    with open(os.path.join(pack_dir, PACK_INDEX), 'w') as f:
+        json.dump(index, f)
+    logger.info(f"Packed {len(index)} screenshots ({offset} bytes) into {pack_dir}")
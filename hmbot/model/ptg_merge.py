@@ -0,0 +1,185 @@
+import os
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from loguru import logger
+from .vht import VHTParser
+from .profile import profile_distances
+from .ptg_loader import PACK_FILE, PACK_INDEX, pack_images
+from ..utils.cv import image_hash
+
+# rows of the pairwise distance matrix of a block handled by one task
+BLOCK_ROWS = 64
+BACKUP_FILE = 'ptg.unmerged.json'
+
+
+def _page_features(task):
+    """
+    Compute the VHT profile and screenshot difference hash of a saved page, in a worker process.
+    """
+    dir_path, vht_path, img_path = task
+    with open(dir_path + vht_path, 'r') as f:
+        vht = VHTParser._parse_hdc_json(json.load(f), None)
+    img = cv2.imread(dir_path + img_path)
+    dhash = image_hash(img).dhash if img is not None else None
+    return vht.profile(), dhash
+
+
+def _near_pairs(task):
+    """
+    Find the near-duplicate pairs among some rows of a block, in a worker process.
+
+    Returns:
+        list: (i, j) block positions with i < j.
+    """
+    rows, profiles, dhashes, has_img, profile_threshold, image_threshold = task
+    pairs = []
+    for i in rows:
+        # only compare with the later pages, every pair is seen once
+        profile_distance = profile_distances(profiles[i], profiles[i + 1:])
+        bits = np.unpackbits((dhashes[i + 1:] ^ dhashes[i]).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        image_close = (bits <= image_threshold) | ~(has_img[i + 1:] & has_img[i])
+        for j in np.nonzero((profile_distance <= profile_threshold) & image_close)[0]:
+            pairs.append((i, i + 1 + int(j)))
+    return pairs
+
+
+class PTGMerger(object):
+    """
+    The class describes the offline merge of near-duplicate pages of a saved PTG.
+
+    Exploration adds a page whenever it is not found among the known pages,
+    so the saved graph collects near-duplicates. The merger compares every
+    pair of pages sharing a bundle and ability, in a process pool, by the
+    distance of their VHT profiles and of their screenshot hashes; pages
+    close in both are clustered with union-find. Each cluster is replaced
+    by its first page, edges are redirected to it, and the saved PTG is
+    rewritten, the original being kept as ptg.unmerged.json.
+    """
+    def __init__(self, dir_path, profile_threshold=0.1, image_threshold=10, workers=None):
+        """
+        Args:
+            dir_path (str): the exploration output directory, containing output/ptg.json.
+            profile_threshold (float, optional): the largest profile distance of near-duplicates. Default is 0.1.
+            image_threshold (int, optional): the largest hamming distance of their difference hashes. Default is 10.
+            workers (int, optional): number of worker processes. Default is the number of cores.
+        """
+        if not dir_path.endswith('/'):
+            dir_path = dir_path + '/'
+        self.dir_path = dir_path
+        self.file = dir_path + 'output/ptg.json'
+        self.profile_threshold = profile_threshold
+        self.image_threshold = image_threshold
+        self.workers = workers or os.cpu_count()
+        self.stats = {}
+
+    def clusters(self, json_data, pool):
+        """
+        Cluster the near-duplicate pages of a saved PTG.
+
+        Returns:
+            dict: the id of every page mapped to the id of its cluster's first page.
+        """
+        infos = [item['info'] for item in json_data]
+        features = list(pool.map(_page_features, [(self.dir_path, info['vht'], info['img']) for info in infos],
+                                 chunksize=8))
+        blocks = {}
+        for position, info in enumerate(infos):
+            blocks.setdefault((info['bundle'], info['ability']), []).append(position)
+        tasks = []
+        for positions in blocks.values():
+            if len(positions) < 2:
+                continue
+            profiles = np.stack([features[position][0] for position in positions])
+            has_img = np.array([features[position][1] is not None for position in positions])
+            dhashes = np.array([features[position][1] or 0 for position in positions], dtype=np.uint64)
+            for start in range(0, len(positions) - 1, BLOCK_ROWS):
+                rows = range(start, min(start + BLOCK_ROWS, len(positions) - 1))
+                tasks.append((positions, (rows, profiles, dhashes, has_img,
+                                          self.profile_threshold, self.image_threshold)))
+        parent = list(range(len(infos)))
+
+        def find(position):
+            while parent[position] != position:
+                parent[position] = parent[parent[position]]
+                position = parent[position]
+            return position
+
+        pairs = 0
+        for (positions, _), block_pairs in zip(tasks, pool.map(_near_pairs, [task for _, task in tasks])):
+            for i, j in block_pairs:
+                root_i, root_j = find(positions[i]), find(positions[j])
+                if root_i != root_j:
+                    # the smaller position stays the root, so the main page keeps its place
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+                pairs += 1
+        self.stats.update({'pages': len(infos), 'blocks': len(blocks), 'pairs': pairs})
+        return {infos[position]['id']: infos[find(position)]['id'] for position in range(len(infos))}
+
+    def merge(self):
+        """
+        Merge the near-duplicate pages and rewrite the saved PTG.
+
+        Returns:
+            dict: the old id of every page mapped to its new id.
+        """
+        with open(self.file, 'r') as f:
+            json_data = json.load(f)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            representative = self.clusters(json_data, pool)
+        items = {item['info']['id']: item for item in json_data}
+        kept = sorted(set(representative.values()))
+        new_ids = {id: new_id for new_id, id in enumerate(kept)}
+        edges = {}
+        for item in json_data:
+            src_id = item['info']['id']
+            src = new_ids[representative[src_id]]
+            for edge in item['edge']:
+                tgt_id = edge['target_id']
+                tgt = new_ids[representative[tgt_id]]
+                if src == tgt and src_id != tgt_id:
+                    # an edge between two merged pages does not change the page any more
+                    continue
+                # of the parallel edges of merged pages, keep the one with the fewest events
+                if (src, tgt) not in edges or len(edge['events']) < len(edges[(src, tgt)]):
+                    edges[(src, tgt)] = edge['events']
+        edge_lists = {}
+        for (src, tgt), events in edges.items():
+            edge_lists.setdefault(src, []).append({'target_id': tgt, 'events': events})
+        merged = []
+        for id in kept:
+            info = dict(items[id]['info'])
+            info['id'] = new_ids[id]
+            merged.append({'info': info, 'edge': edge_lists.get(new_ids[id], [])})
+        shutil.copyfile(self.file, self.dir_path + 'output/' + BACKUP_FILE)
+        tmp_file = self.file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(merged, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.file)
+        self._repack(kept, new_ids)
+        edge_count = sum(len(item['edge']) for item in json_data)
+        self.stats.update({'merged_pages': len(kept), 'edges': edge_count, 'merged_edges': len(edges)})
+        logger.info(f"Merged PTG {self.file}: {len(json_data)} -> {len(kept)} pages, "
+                    f"{edge_count} -> {len(edges)} edges")
+        return {id: new_ids[representative[id]] for id in representative}
+
+    def _repack(self, kept, new_ids):
+        """
+        Rewrite the screenshot pack of the PTG, if it has one, under the new page ids.
+        """
+        output_dir = self.dir_path + 'output/'
+        if not os.path.exists(output_dir + PACK_INDEX):
+            return
+        with open(output_dir + PACK_INDEX, 'r') as f:
+            index = json.load(f)
+        pack = np.memmap(output_dir + PACK_FILE, dtype=np.uint8, mode='r')
+        images = []
+        for id in kept:
+            if str(id) not in index:
+                continue
+            offset, shape = index[str(id)]
+            images.append((new_ids[id], np.array(pack[offset:offset + int(np.prod(shape))]).reshape(shape)))
+        del pack
+        pack_images(output_dir, images)
@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import threading
+from loguru import logger
+
+
+class PTGStore(object):
+    """
+    The class describes an incremental SQLite store of a PTG.
+
+    Every page and edge is written as an upsert when it is added to the
+    graph, so the exploration output survives a crash and the JSON export
+    no longer has to revisit every page artifact.
+    """
+    def __init__(self, db_file, dir_path='', artifacts=None, relative_to=''):
+        """
+        Args:
+            db_file (str): path of the SQLite database, ':memory:' for an in-memory store.
+            dir_path (str, optional): directory the page artifacts (VHT json, screenshot) are written to.
+            artifacts (ArtifactStore, optional): write the page artifacts through this content-addressed store.
+            relative_to (str, optional): record the artifact paths relative to this directory, as
+                ptg.json records them relative to the exploration directory. Default is ''.
+        """
+        self.dir_path = dir_path
+        self.artifacts = artifacts
+        self.relative_to = relative_to
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                           'id INTEGER PRIMARY KEY, info TEXT NOT NULL, fingerprint TEXT)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS edges ('
+                           'src INTEGER NOT NULL, tgt INTEGER NOT NULL, events TEXT NOT NULL, '
+                           'PRIMARY KEY (src, tgt))')
+        # the implicit rowid in the index keeps the insertion order of each page's edges
+        self._conn.execute('CREATE INDEX IF NOT EXISTS edges_src ON edges (src)')
+        self._conn.commit()
+
+    def put_page(self, id, page, commit=True):
+        """
+        Write the artifacts of a page and upsert its row.
+        """
+        vht_file, img_file = page._dump(id, self.dir_path, self.artifacts)
+        if self.relative_to:
+            vht_file = vht_file[len(self.relative_to):] if vht_file.startswith(self.relative_to) else vht_file
+            img_file = img_file[len(self.relative_to):] if img_file.startswith(self.relative_to) else img_file
+        info = page._dict(vht_file, img_file)
+        info['id'] = id
+        with self._lock:
+            self._conn.execute('INSERT INTO pages (id, info, fingerprint) VALUES (?, ?, ?) '
+                               'ON CONFLICT (id) DO UPDATE SET info = excluded.info, fingerprint = excluded.fingerprint',
+                               (id, json.dumps(info, ensure_ascii=False), page.fingerprint()))
+            if commit:
+                self._conn.commit()
+
+    def put_edge(self, src_id, tgt_id, events, commit=True):
+        """
+        Upsert the events of the edge src_id -> tgt_id.
+        """
+        events = json.dumps([event._json() for event in events], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute('INSERT INTO edges (src, tgt, events) VALUES (?, ?, ?) '
+                               'ON CONFLICT (src, tgt) DO UPDATE SET events = excluded.events',
+                               (src_id, tgt_id, events))
+            if commit:
+                self._conn.commit()
+
+    def import_json(self, file, replace=False):
+        """
+        Seed the store with a saved ptg.json, unless it already holds pages.
+
+        Args:
+            file (str): the ptg.json file.
+            replace (bool, optional): drop what the store holds first. Default is False.
+
+        Returns:
+            bool: whether the file was imported.
+        """
+        with open(file, 'r') as f:
+            json_data = json.load(f)
+        with self._lock:
+            if replace:
+                self._conn.execute('DELETE FROM pages')
+                self._conn.execute('DELETE FROM edges')
+            elif self._conn.execute('SELECT 1 FROM pages LIMIT 1').fetchone() is not None:
+                return False
+            self._conn.executemany('INSERT INTO pages (id, info, fingerprint) VALUES (?, ?, NULL)',
+                                   [(item['info']['id'], json.dumps(item['info'], ensure_ascii=False))
+                                    for item in json_data])
+            self._conn.executemany('INSERT INTO edges (src, tgt, events) VALUES (?, ?, ?)',
+                                   [(item['info']['id'], edge['target_id'],
+                                     json.dumps(edge['events'], ensure_ascii=False))
+                                    for item in json_data for edge in item['edge']])
+            self._conn.commit()
+        return True
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def items(self):
+        """
+        Stream the stored graph as ptg.json items, one page with its outgoing edges at a time.
+        Pages and edges are walked once each in id order (a merge of the two ordered row lists).
+        """
+        with self._lock:
+            pages = self._conn.execute('SELECT id, info FROM pages ORDER BY id').fetchall()
+            edges = self._conn.execute('SELECT src, tgt, events FROM edges ORDER BY src, rowid').fetchall()
+        position = 0
+        for id, info in pages:
+            while position < len(edges) and edges[position][0] < id:
+                position += 1
+            edge_list = []
+            while position < len(edges) and edges[position][0] == id:
+                _, tgt, events = edges[position]
+                edge_list.append({'target_id': tgt,
+                                  'events': json.loads(events)})
+                position += 1
+            yield {'info': json.loads(info),
+                   'edge': edge_list}
+
+    def export_json(self, file, indent=2):
+        """
+        Write the stored graph to a ptg.json file item by item.
+        """
+        if self.artifacts is not None:
+            self.artifacts.flush()
+        count = 0
+        with open(file, 'w') as write_file:
+            write_file.write('[')
+            for item in self.items():
+                write_file.write(',\n' if count else '\n')
+                write_file.write(json.dumps(item, indent=indent, ensure_ascii=False))
+                count += 1
+            write_file.write('\n]')
+        logger.info(f"Exported {count} pages to {file}")
+
+    def close(self):
+        if self.artifacts is not None:
+            self.artifacts.close()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,197 @@
+import math
+
+
+class GridIndex(object):
+    """
+    The class describes a uniform-grid spatial index over the nodes of a VHT snapshot.
+
+    Every node is registered in the cells its bounds overlap. Nodes that
+    cover a large share of the grid (root layouts, full-screen containers)
+    are kept in a separate list and checked directly, so they do not blow
+    up the cell lists.
+
+    Like a descent from the root, node_at only considers nodes whose
+    ancestors all contain the point, so a child overflowing its parent is
+    not found outside the parent.
+    """
+    def __init__(self, nodes, parents=None, cells=None, large_ratio=0.25):
+        """
+        Args:
+            nodes (list): the nodes of the snapshot in pre-order.
+            parents (list, optional): the parent position of every node, -1 for the root. Without it ancestors are not checked.
+            cells (int, optional): number of cells per axis, derived from the node count by default.
+            large_ratio (float, optional): share of the grid above which a node is kept in the large list.
+        """
+        self.nodes = nodes
+        self._parents = parents
+        self._bounds = []
+        width, height = 1, 1
+        for node in nodes:
+            (x1, y1), (x2, y2) = node.attribute['bounds']
+            self._bounds.append((x1, y1, x2, y2))
+            width = max(width, x2 + 1)
+            height = max(height, y2 + 1)
+        if cells is None:
+            cells = max(1, min(32, int(math.sqrt(len(nodes)) / 2)))
+        self._cells = cells
+        self._cell_w = width / cells
+        self._cell_h = height / cells
+        self._grid = [[] for _ in range(cells * cells)]
+        self._large = []
+        limit = large_ratio * cells * cells
+        last = cells - 1
+        for position, (x1, y1, x2, y2) in enumerate(self._bounds):
+            if x2 < x1 or y2 < y1:
+                continue
+            cx1 = min(last, max(0, int(x1 / self._cell_w)))
+            cy1 = min(last, max(0, int(y1 / self._cell_h)))
+            cx2 = min(last, max(0, int(x2 / self._cell_w)))
+            cy2 = min(last, max(0, int(y2 / self._cell_h)))
+            if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > limit:
+                self._large.append(position)
+                continue
+            for cx in range(cx1, cx2 + 1):
+                row = cx * cells
+                for cy in range(cy1, cy2 + 1):
+                    self._grid[row + cy].append(position)
+
+    def _cell(self, x, y):
+        cx = min(self._cells - 1, max(0, int(x / self._cell_w)))
+        cy = min(self._cells - 1, max(0, int(y / self._cell_h)))
+        return (cx, cy)
+
+    def _entries(self, cx, cy):
+        if 0 <= cx < self._cells and 0 <= cy < self._cells:
+            return self._grid[cx * self._cells + cy]
+        return ()
+
+    def _accept(self, position, clickable):
+        if clickable and self.nodes[position].attribute.get('clickable') != 'true':
+            return False
+        # the [0,0][0,0] bounds of the hierarchy root are not a real area
+        return self._bounds[position] != (0, 0, 0, 0)
+
+    def _reachable(self, position, x, y):
+        # every ancestor contains (x, y), the [0,0][0,0] hierarchy root is passed through
+        if self._parents is None:
+            return True
+        position = self._parents[position]
+        while position >= 0:
+            x1, y1, x2, y2 = self._bounds[position]
+            if not (x1 <= x <= x2 and y1 <= y <= y2) and (x1, y1, x2, y2) != (0, 0, 0, 0):
+                return False
+            position = self._parents[position]
+        return True
+
+    def node_at(self, x, y, clickable=True):
+        """
+        Find the smallest node containing (x, y) whose ancestors contain it as well.
+
+        Args:
+            x (int): The X coordinate.
+            y (int): The Y coordinate.
+            clickable (bool, optional): only consider clickable nodes. Default is True.
+
+        Returns:
+            VHTNode: the smallest containing node, the first in pre-order on ties, or None.
+        """
+        best, best_area = None, None
+        for position in [*self._entries(*self._cell(x, y)), *self._large]:
+            x1, y1, x2, y2 = self._bounds[position]
+            if not (x1 <= x <= x2 and y1 <= y <= y2) or not self._accept(position, clickable):
+                continue
+            area = (x2 - x1) * (y2 - y1)
+            if best is None or area < best_area or (area == best_area and position < best):
+                if self._reachable(position, x, y):
+                    best, best_area = position, area
+        return None if best is None else self.nodes[best]
+
+    def nodes_in(self, box, clickable=False):
+        """
+        Find all nodes intersecting a box.
+
+        Args:
+            box ((int, int, int, int)): the box as (x1, y1, x2, y2).
+            clickable (bool, optional): only consider clickable nodes. Default is False.
+
+        Returns:
+            list: the intersecting nodes in pre-order.
+        """
+        bx1, by1, bx2, by2 = box
+        cx1, cy1 = self._cell(bx1, by1)
+        cx2, cy2 = self._cell(bx2, by2)
+        positions = set(self._large)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                positions.update(self._entries(cx, cy))
+        result = []
+        for position in sorted(positions):
+            x1, y1, x2, y2 = self._bounds[position]
+            if x1 <= bx2 and bx1 <= x2 and y1 <= by2 and by1 <= y2 and self._accept(position, clickable):
+                result.append(self.nodes[position])
+        return result
+
+    def nearest(self, x, y, clickable=True, max_distance=None):
+        """
+        Find the node closest to (x, y), measured to the node's bounds.
+
+        Args:
+            x (int): The X coordinate.
+            y (int): The Y coordinate.
+            clickable (bool, optional): only consider clickable nodes. Default is True.
+            max_distance (float, optional): ignore nodes farther than this distance.
+
+        Returns:
+            VHTNode: the nearest node, the smallest one on ties, or None.
+        """
+        best, best_key = None, None
+
+        def visit(position):
+            nonlocal best, best_key
+            if not self._accept(position, clickable):
+                return
+            x1, y1, x2, y2 = self._bounds[position]
+            dx = max(x1 - x, 0, x - x2)
+            dy = max(y1 - y, 0, y - y2)
+            distance = math.hypot(dx, dy)
+            if max_distance is not None and distance > max_distance:
+                return
+            key = (distance, (x2 - x1) * (y2 - y1), position)
+            if best_key is None or key < best_key:
+                best, best_key = position, key
+
+        for position in self._large:
+            visit(position)
+        cx, cy = self._cell(x, y)
+        cell_size = min(self._cell_w, self._cell_h)
+        for ring in range(self._cells):
+            # nodes first reached in this ring are at least (ring - 1) cells away
+            if best_key is not None and (ring - 1) * cell_size > best_key[0]:
+                break
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if max(abs(gx - cx), abs(gy - cy)) != ring:
+                        continue
+                    for position in self._entries(gx, gy):
+                        visit(position)
+        return None if best is None else self.nodes[best]
+
+    def node_for_box(self, box):
+        """
+        Resolve a bounding box (e.g. proposed by the LLM) to a clickable node:
+        the smallest clickable node containing the box center, otherwise the
+        clickable node nearest to the center within half the box diagonal.
+
+        Args:
+            box ((int, int, int, int)): the box as (x1, y1, x2, y2).
+
+        Returns:
+            VHTNode: the resolved node, or None.
+        """
+        x1, y1, x2, y2 = box
+        x, y = (x1 + x2) // 2, (y1 + y2) // 2
+        node = self.node_at(x, y)
+        if node is not None:
+            return node
+        radius = math.hypot(x2 - x1, y2 - y1) / 2
+        return self.nearest(x, y, max_distance=radius)
@@ -1,6 +1,12 @@
 import xml.etree.ElementTree as ET
 from ..utils.exception import*
-import json, re
+from .spatial import GridIndex
+from .fingerprint import VHTFingerprint, preorder
+from .profile import path_profile
+import json
+
+INDEXED_KEYS = ('id', 'text', 'type', 'bundle', 'page',
+                'clickable', 'longClickable', 'selected', 'checkable', 'checked', 'enabled', 'focused')
 
 class VHT(object):
     """
@@ -8,6 +14,10 @@ class VHT(object):
     """
     def __init__(self, root=None, compressed=True):
         self._root = root
+        self._index = None
+        self._grid = None
+        self._fingerprint = None
+        self._profile = None
         if compressed:
             self._compress(self._root)
 
@@ -15,18 +25,57 @@ class VHT(object):
         return str(self._root._json_dict())
     
     def __call__(self, **kwds):
-        return self._root(**kwds)
+        return self.index()(**kwds)
+
+    def index(self):
+        """
+        Return the attribute indexes of this snapshot, building them on first use.
+        """
+        if self._index is None:
+            self._index = VHTIndex(self._root)
+        return self._index
+
+    def grid(self):
+        """
+        Return the spatial index of this snapshot, building it on first use.
+        """
+        if self._grid is None:
+            self._grid = GridIndex(*preorder(self._root))
+        return self._grid
+
+    def fingerprint(self):
+        """
+        Return the structural hashes of this snapshot, computing them on first use.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = VHTFingerprint(*preorder(self._root))
+        return self._fingerprint
+
+    def profile(self):
+        """
+        Return the bag-of-paths profile of this snapshot, computing it on first use.
+        """
+        if self._profile is None:
+            self._profile = path_profile(*preorder(self._root))
+        return self._profile
     
     def _compress(self, node):
-        if self._assert_compress(node):
-            node._compress(node._children[0])
-            node._children = node._children[0]._children
-            self._compress(node)
-        else:
-            for child in node._children:
-                self._compress(child)
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            VHT._compress_chain(node)
+            stack.extend(reversed(node._children))
+
+    @staticmethod
+    def _compress_chain(node):
+        # merge a chain of single children sharing the same bounds into node
+        while VHT._assert_compress(node):
+            child = node._children[0]
+            node._compress(child)
+            node._children = child._children
 
-    def _assert_compress(self, node):
+    @staticmethod
+    def _assert_compress(node):
         if len(node._children) == 1:
             s_attri = node.attribute
             c_attri = node._children[0].attribute
@@ -35,6 +84,73 @@ class VHT(object):
         return False
     
 
+class VHTIndex(object):
+    """
+    The class describes hash indexes over the attributes of a VHT snapshot.
+    Each indexed attribute maps a value to the pre-order positions of the
+    nodes holding it, so queries return nodes in the same order as a scan.
+    The posting lists of an attribute are built the first time it is queried.
+    """
+    def __init__(self, root):
+        self.nodes = []
+        self._postings = {}
+        self._sets = {}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.nodes.append(node)
+            stack.extend(reversed(node._children))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __call__(self, **kwds):
+        postings = []
+        rest = {}
+        for key, value in kwds.items():
+            if key not in INDEXED_KEYS:
+                rest[key] = value
+                continue
+            try:
+                posting = self._posting(key).get(value)
+            except TypeError:
+                posting = None
+            if not posting:
+                return []
+            postings.append((key, value, posting))
+        if postings:
+            postings.sort(key=lambda item: len(item[2]))
+            positions = postings[0][2]
+            if len(postings) > 1:
+                others = [self._set(key, value, posting) for key, value, posting in postings[1:]]
+                positions = [p for p in positions if all(p in other for other in others)]
+            nodes = [self.nodes[p] for p in positions]
+        else:
+            nodes = self.nodes
+        if rest:
+            return [node for node in nodes if node._satisfy(rest)]
+        return list(nodes)
+
+    def _posting(self, key):
+        posting = self._postings.get(key)
+        if posting is None:
+            posting = self._postings[key] = {}
+            for position, node in enumerate(self.nodes):
+                if key in node.attribute:
+                    value = node.attribute[key]
+                    if value in posting:
+                        posting[value].append(position)
+                    else:
+                        posting[value] = [position]
+        return posting
+
+    def _set(self, key, value, posting):
+        posting_set = self._sets.get((key, value))
+        if posting_set is None:
+            posting_set = self._sets[(key, value)] = set(posting)
+        return posting_set
+
+
 class VHTNode(object):
     """
     The class describes a node of view hierarchy tree
@@ -96,7 +212,7 @@ class VHTNode(object):
         }
 
     def _json(self):
-        attribute = self.attribute
+        attribute = dict(self.attribute)
         attribute['bounds'] = ''.join([str(sublist) for sublist in self.attribute['bounds']])
         attribute['center'] = str(attribute['center'])
         return attribute
@@ -166,57 +282,101 @@ class VHTParser(object):
     
     @classmethod
     def _parse_hdc_json(cls, source, device):
-        root = VHTParser.__parse_hdc_json(source, device)
-        return VHT(root)
+        """
+        Parse the json hierarchy dumped by hdc into a compressed VHT.
+        The tree is walked with an explicit stack and single-child chains
+        are compressed in the same pass.
+        """
+        root = []
+        stack = [(source, None, root)]
+        while stack:
+            source, node, siblings = stack.pop()
+            if node is None:
+                node = VHTParser._hdc_node(source, device)
+            siblings.append(node)
+            children = source.get('children', ())
+            first = None
+            while len(children) == 1:
+                first = VHTParser._hdc_node(children[0], device)
+                if first.attribute['bounds'] != node.attribute['bounds']:
+                    break
+                node._children.append(first)
+                node._compress(first)
+                node._children = first._children
+                source, first = children[0], None
+                children = source.get('children', ())
+            for index in range(len(children) - 1, -1, -1):
+                stack.append((children[index], first if index == 0 else None, node._children))
+        return VHT(root[0], compressed=False)
 
     @classmethod
-    def __parse_hdc_json(cls, source, device):
-        if 'attributes' in source:
-            extra = source['attributes']
-            bound_re = r'\[(\d+),\s*(\d+)\]\[(\d+),\s*(\d+)\]'
-            match = re.match(bound_re, extra['bounds'])
-            if match:
-                (x1, y1, x2, y2) = map(int, match.groups())
-            else: 
-                raise BoundsError('%s is not in form [x1,y1][x2,y2]' % extra['bounds'])
-            attrib = {'bundle': '', 'page': ''}
-            if 'bundleName' in extra:
-                attrib['bundle'] = extra['bundleName']
-                attrib['page'] = extra['pagePath']
-
-            root = VHTNode(device=device,
-                           attrib=attrib,
-                           bounds = [[x1,y1],[x2,y2]],
-                           clickable = extra['clickable'],
-                           longClickable = extra['longClickable'],
-                           selected = extra['selected'],
-                           checkable = extra['checkable'],
-                           checked = extra['checked'],
-                           type = extra['type'],
-                           id = extra['id'],
-                           text = extra['text'],
-                           enabled = extra['enabled'],
-                           focused = extra['focused'],
-                           center = [int((x1 + x2)/2), int((y1 + y2)/2)])
-            if 'children' in source:
-                children = source['children']
-                for child in children:
-                    root.append(VHTParser.__parse_hdc_json(child, device))
-            return root
-        else:
+    def _hdc_node(cls, source, device):
+        if 'attributes' not in source:
             raise JsonKeyError('expected key: attributes')
+        extra = source['attributes']
+        bounds = _scan_bounds(extra['bounds'])
+        if bounds is None:
+            raise BoundsError('%s is not in form [x1,y1][x2,y2]' % extra['bounds'])
+        (x1, y1, x2, y2) = bounds
+        attrib = {'bundle': '', 'page': ''}
+        if 'bundleName' in extra:
+            attrib['bundle'] = extra['bundleName']
+            attrib['page'] = extra['pagePath']
+        return VHTNode(device=device,
+                       attrib=attrib,
+                       bounds = [[x1,y1],[x2,y2]],
+                       clickable = extra['clickable'],
+                       longClickable = extra['longClickable'],
+                       selected = extra['selected'],
+                       checkable = extra['checkable'],
+                       checked = extra['checked'],
+                       type = extra['type'],
+                       id = extra['id'],
+                       text = extra['text'],
+                       enabled = extra['enabled'],
+                       focused = extra['focused'],
+                       center = [int((x1 + x2)/2), int((y1 + y2)/2)])
 
     @classmethod
-    def _parse_adb_xml(cls, source, device):
-        source = ET.fromstring(source)
-        root = VHTParser.__parse_adb_xml(source, device)
-        return VHT(root)
+    def _parse_adb_xml(cls, source, device, chunk_size=1 << 16):
+        """
+        Parse the xml hierarchy dumped by uiautomator into a compressed VHT.
+        The xml is streamed through an incremental parser, every element is
+        released once its node is built and a node's children are compressed
+        as soon as the node is closed.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        stack = []
+        root = None
+        for offset in range(0, len(source), chunk_size):
+            parser.feed(source[offset:offset + chunk_size])
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    node = VHTParser._adb_node(elem, device)
+                    if node is not None and stack and stack[-1] is not None:
+                        stack[-1]._children.append(node)
+                    stack.append(node)
+                    continue
+                node = stack.pop()
+                elem.clear()
+                if node is None:
+                    continue
+                if not VHT._assert_compress(node):
+                    for child in node._children:
+                        VHT._compress_chain(child)
+                if not stack:
+                    root = node
+        parser.close()
+        if root is None:
+            raise TypeError('expected a hierarchy element')
+        VHT._compress_chain(root)
+        return VHT(root, compressed=False)
 
     @classmethod
-    def __parse_adb_xml(cls, source, device):
+    def _adb_node(cls, source, device):
         attrib = {'bundle': '', 'page': ''}
         if source.tag == 'hierarchy':
-            root = VHTNode(device=device,
+            return VHTNode(device=device,
                            attrib=attrib,
                            bounds = [[0,0],[0,0]],
                            clickable = '',
@@ -232,16 +392,12 @@ class VHTParser(object):
                            center = [0,0])
         elif source.tag == 'node':
             extra = source.attrib
-            bound_re = '\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]'
-            match = re.match(bound_re, extra['bounds'])
-            if match:
-                (x1, y1, x2, y2) = map(int, match.groups())
-                if x1 == 2147483647 and y1 == 2147483647 and x2 == -2147483648 and y2 == -2147483648:
-                    x1, y1, x2, y2 = 0, 0, 100, 100
-            else: 
-                x1, y1, x2, y2 = 0, 0, 100, 100
+            bounds = _scan_bounds(extra['bounds'])
+            if bounds is None or bounds == (2147483647, 2147483647, -2147483648, -2147483648):
+                bounds = (0, 0, 100, 100)
+            (x1, y1, x2, y2) = bounds
             attrib['bundle'] = extra['package']
-            root = VHTNode(device=device,
+            return VHTNode(device=device,
                            attrib=attrib,
                            bounds = [[x1,y1],[x2,y2]],
                            clickable = extra['clickable'],
@@ -255,6 +411,22 @@ class VHTParser(object):
                            enabled = extra['enabled'],
                            focused =  extra['focused'],
                            center = [int((x1 + x2)/2), int((y1 + y2)/2)])
-        for child in source:
-            root.append(VHTParser.__parse_adb_xml(child, device))
-        return root
\ No newline at end of file
+        return None
+
+
+def _scan_bounds(bounds):
+    """
+    Decode a bounds string in form [x1,y1][x2,y2] without regex.
+
+    Returns:
+        (int, int, int, int): the decoded bounds, or None if malformed.
+    """
+    if not bounds or bounds[0] != '[':
+        return None
+    values = bounds[1:].replace('][', ',').rstrip(']').split(',')
+    if len(values) != 4:
+        return None
+    try:
+        return (int(values[0]), int(values[1]), int(values[2]), int(values[3]))
+    except ValueError:
+        return None
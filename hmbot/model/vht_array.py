@@ -0,0 +1,276 @@
+import numpy as np
+from .vht import VHT, VHTNode
+from .spatial import GridIndex
+from .fingerprint import VHTFingerprint
+from .profile import path_profile
+
+FLAG_KEYS = ('clickable', 'longClickable', 'selected', 'checkable', 'checked', 'enabled', 'focused')
+STRING_KEYS = ('bundle', 'page', 'type', 'id', 'text')
+ATTRIBUTE_KEYS = ('bundle', 'page', 'bounds', 'clickable', 'longClickable', 'selected', 'checkable', 'checked',
+                  'type', 'id', 'text', 'enabled', 'focused')
+
+
+class ArrayVHT(object):
+    """
+    The class describes a view hierarchy tree stored as struct-of-arrays.
+
+    Nodes are numbered in pre-order, so the subtree of node i is the
+    contiguous range [i, end[i]). Bounds are int32 arrays, the tree shape
+    is kept in parent/first-child/next-sibling index arrays, strings are
+    interned into a shared table and boolean attributes are bitfields.
+    """
+    def __init__(self, vht, device=None):
+        if isinstance(vht, VHT):
+            root = vht._root
+        elif isinstance(vht, VHTNode):
+            root = vht
+        else:
+            raise TypeError('expected a VHT or VHTNode, not %s' % type(vht).__name__)
+        self._device = device if device is not None else root._device
+        self._strings = []
+        self._string_ids = {}
+        self._grid = None
+        self._fingerprint = None
+        self._profile = None
+        self._build(root)
+
+    def __str__(self):
+        return str(self._root._json_dict())
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __call__(self, **kwds):
+        return self._query(0, len(self.parent), kwds)
+
+    @property
+    def _root(self):
+        return ArrayVHTNode(self, 0)
+
+    @property
+    def nbytes(self):
+        arrays = (self.bounds, self.parent, self.first_child, self.next_sibling, self.end,
+                  self.flags, self.unset, *self.columns.values())
+        return sum(array.nbytes for array in arrays)
+
+    def grid(self):
+        """
+        Return the spatial index of this snapshot, building it on first use.
+        """
+        if self._grid is None:
+            self._grid = GridIndex([ArrayVHTNode(self, index) for index in range(len(self))], self.parent.tolist())
+        return self._grid
+
+    def fingerprint(self):
+        """
+        Return the structural hashes of this snapshot, computing them on first use.
+        """
+        if self._fingerprint is None:
+            nodes = [ArrayVHTNode(self, index) for index in range(len(self))]
+            self._fingerprint = VHTFingerprint(nodes, self.parent.tolist())
+        return self._fingerprint
+
+    def profile(self):
+        """
+        Return the bag-of-paths profile of this snapshot, computing it on first use.
+        """
+        if self._profile is None:
+            nodes = [ArrayVHTNode(self, index) for index in range(len(self))]
+            self._profile = path_profile(nodes, self.parent.tolist())
+        return self._profile
+
+    def node(self, index):
+        return ArrayVHTNode(self, int(index))
+
+    def to_vht(self):
+        """
+        Rebuild a VHT of VHTNode objects from the arrays.
+        """
+        return VHT(self._subtree(0), compressed=False)
+
+    def _subtree(self, start):
+        stop = int(self.end[start])
+        nodes = [VHTNode(device=self._device, attrib=self._attribute(index)) for index in range(start, stop)]
+        for index in range(start + 1, stop):
+            nodes[self.parent[index] - start]._children.append(nodes[index - start])
+        return nodes[0]
+
+    def _intern(self, value):
+        code = self._string_ids.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = code
+        return code
+
+    def _build(self, root):
+        parents = []
+        bounds = []
+        flags = []
+        unset = []
+        columns = {key: [] for key in STRING_KEYS}
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(parents)
+            parents.append(parent)
+            attribute = node.attribute
+            (x1, y1), (x2, y2) = attribute['bounds']
+            bounds.append((x1, y1, x2, y2))
+            true_bits, unset_bits = 0, 0
+            for bit, key in enumerate(FLAG_KEYS):
+                value = attribute.get(key, '')
+                if value == 'true':
+                    true_bits |= 1 << bit
+                elif value == '':
+                    unset_bits |= 1 << bit
+            flags.append(true_bits)
+            unset.append(unset_bits)
+            for key in STRING_KEYS:
+                columns[key].append(self._intern(attribute.get(key, '')))
+            for child in reversed(node._children):
+                stack.append((child, index))
+
+        size = len(parents)
+        first_child = [-1] * size
+        next_sibling = [-1] * size
+        end = list(range(1, size + 1))
+        for index in range(size - 1, 0, -1):
+            parent = parents[index]
+            if end[index] > end[parent]:
+                end[parent] = end[index]
+            next_sibling[index] = first_child[parent]
+            first_child[parent] = index
+        self.parent = np.array(parents, dtype=np.int32)
+        self.first_child = np.array(first_child, dtype=np.int32)
+        self.next_sibling = np.array(next_sibling, dtype=np.int32)
+        self.end = np.array(end, dtype=np.int32)
+        self.bounds = np.array(bounds, dtype=np.int32).reshape(size, 4)
+        self.flags = np.array(flags, dtype=np.uint8)
+        self.unset = np.array(unset, dtype=np.uint8)
+        self.columns = {key: np.array(codes, dtype=np.int32) for key, codes in columns.items()}
+
+    def _attribute(self, index):
+        x1, y1, x2, y2 = (int(v) for v in self.bounds[index])
+        flags, unset = int(self.flags[index]), int(self.unset[index])
+        attribute = {}
+        for key in ATTRIBUTE_KEYS:
+            if key in STRING_KEYS:
+                attribute[key] = self._strings[self.columns[key][index]]
+            elif key == 'bounds':
+                attribute[key] = [[x1, y1], [x2, y2]]
+            else:
+                bit = 1 << FLAG_KEYS.index(key)
+                attribute[key] = 'true' if flags & bit else '' if unset & bit else 'false'
+        attribute['center'] = [int((x1 + x2)/2), int((y1 + y2)/2)]
+        return attribute
+
+    def _mask(self, start, stop, key, value):
+        if key in FLAG_KEYS:
+            bit = 1 << FLAG_KEYS.index(key)
+            if value == 'true':
+                return (self.flags[start:stop] & bit) != 0
+            if value == 'false':
+                return ((self.flags[start:stop] | self.unset[start:stop]) & bit) == 0
+            if value == '':
+                return (self.unset[start:stop] & bit) != 0
+            return None
+        if key in STRING_KEYS:
+            code = self._string_ids.get(value)
+            if code is None:
+                return None
+            return self.columns[key][start:stop] == code
+        if key == 'bounds':
+            (x1, y1), (x2, y2) = value
+            return np.all(self.bounds[start:stop] == (x1, y1, x2, y2), axis=1)
+        if key == 'center':
+            bounds = self.bounds[start:stop].astype(np.int64)
+            cx = np.trunc((bounds[:, 0] + bounds[:, 2]) / 2)
+            cy = np.trunc((bounds[:, 1] + bounds[:, 3]) / 2)
+            return (cx == value[0]) & (cy == value[1])
+        return None
+
+    def _query(self, start, stop, kwds):
+        mask = np.ones(stop - start, dtype=bool)
+        for key, value in kwds.items():
+            key_mask = self._mask(start, stop, key, value)
+            if key_mask is None:
+                return []
+            mask &= key_mask
+        return [ArrayVHTNode(self, start + int(index)) for index in np.flatnonzero(mask)]
+
+
+class ArrayVHTNode(object):
+    """
+    The class describes a lightweight view of a node in an ArrayVHT
+    """
+    __slots__ = ('_vht', '_index')
+
+    def __init__(self, vht, index):
+        self._vht = vht
+        self._index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayVHTNode) and self._vht is other._vht and self._index == other._index
+
+    def __hash__(self):
+        return hash((id(self._vht), self._index))
+
+    def __str__(self):
+        return str(self.attribute)
+
+    def __len__(self):
+        return len(self._children)
+
+    def __getitem__(self, index):
+        return self._children[index]
+
+    def __call__(self, **kwds):
+        return self._vht._query(self._index, int(self._vht.end[self._index]), kwds)
+
+    @property
+    def attribute(self):
+        return self._vht._attribute(self._index)
+
+    @property
+    def _children(self):
+        children = []
+        child = self._vht.first_child[self._index]
+        while child != -1:
+            children.append(ArrayVHTNode(self._vht, int(child)))
+            child = self._vht.next_sibling[child]
+        return children
+
+    @property
+    def _compressed(self):
+        return set()
+
+    @property
+    def _device(self):
+        return self._vht._device
+
+    def _json_dict(self):
+        return self._vht._subtree(self._index)._json_dict()
+
+    def _json(self):
+        return VHTNode(attrib=self.attribute)._json()
+
+    def _satisfy(self, attrib):
+        return len(self._vht._query(self._index, self._index + 1, attrib)) > 0
+
+    def click(self):
+        x, y = self.attribute['center']
+        self._device.click(x, y)
+
+    def long_click(self):
+        x, y = self.attribute['center']
+        self._device.long_click(x, y)
+
+    def input(self, text):
+        self._device.input(self, text)
+
+    def get_children(self):
+        return self._children
+
+    def get_label(self):
+        return self._vht._strings[self._vht.columns['text'][self._index]]
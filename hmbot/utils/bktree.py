@@ -0,0 +1,70 @@
+from .cv import hamming
+
+
+class BKTree(object):
+    """
+    The class describes a Burkhard-Keller tree over integer hashes with the
+    hamming distance, for near-duplicate lookups without a full scan.
+    """
+    def __init__(self, distance=hamming):
+        self._distance = distance
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, value):
+        """
+        Add a value under a hash key.
+        """
+        self._size += 1
+        if self._root is None:
+            self._root = (key, [value], {})
+            return
+        node = self._root
+        while True:
+            node_key, values, children = node
+            d = self._distance(key, node_key)
+            if d == 0:
+                values.append(value)
+                return
+            if d not in children:
+                children[d] = (key, [value], {})
+                return
+            node = children[d]
+
+    def remove(self, key, value):
+        """
+        Remove a value stored under a hash key; its tree node is kept as a routing node.
+        """
+        node = self._root
+        while node is not None:
+            node_key, values, children = node
+            d = self._distance(key, node_key)
+            if d == 0:
+                if value in values:
+                    values.remove(value)
+                    self._size -= 1
+                return
+            node = children.get(d)
+
+    def search(self, key, k):
+        """
+        Find all values whose key is within distance k.
+
+        Returns:
+            list: (distance, value) pairs sorted by distance.
+        """
+        result = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_key, values, children = stack.pop()
+            d = self._distance(key, node_key)
+            if d <= k:
+                result.extend((d, value) for value in values)
+            for child_d, child in children.items():
+                if d - k <= child_d <= d + k:
+                    stack.append(child)
+        result.sort(key=lambda item: item[0])
+        return result
@@ -3,6 +3,7 @@ import numpy as np
 import time
 import math
 import base64
+from collections import namedtuple
 
 def read(img_path):
     img = cv2.imread(img_path, cv2.IMREAD_COLOR)
@@ -20,3 +21,92 @@ def encode_image(image):
     encoded_image = base64.b64encode(buffer).decode('utf-8')
     return encoded_image
 
+
+# frames are compared at this (width, height), enough for layout changes and cheap to diff
+DIFF_SIZE = (90, 160)
+HASH_SIZE = 8
+DCT_SIZE = 32
+_DCT = np.array([[np.cos(np.pi * (2 * x + 1) * u / (2 * DCT_SIZE)) for x in range(DCT_SIZE)]
+                 for u in range(DCT_SIZE)], dtype=np.float32)
+
+class ImageHash(namedtuple('ImageHash', ['dhash', 'phash', 'ahash'])):
+    """
+    The 64-bit difference, perceptual (DCT) and block-mean hashes of an image.
+    """
+    @property
+    def combined(self):
+        # the three hashes as one 192-bit key, hamming over it is the sum of the three distances
+        return (self.dhash << 128) | (self.phash << 64) | self.ahash
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+def _pack(bits):
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+def image_hashes(imgs):
+    """
+    Hash a batch of images. Each image is downscaled to grayscale once,
+    then the hashes of the whole batch are computed with array operations.
+
+    Args:
+        imgs (list): images as numpy arrays (BGR or grayscale).
+
+    Returns:
+        list: one ImageHash per image.
+    """
+    if not len(imgs):
+        return []
+    grays = [_gray(img) for img in imgs]
+    small = np.stack([cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+                      for gray in grays]).astype(np.int16)
+    large = np.stack([cv2.resize(gray, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_AREA)
+                      for gray in grays]).astype(np.float32)
+    d_bits = small[:, :, 1:] > small[:, :, :-1]
+    coeffs = (_DCT @ large @ _DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(imgs), -1)
+    p_bits = coeffs > np.median(coeffs[:, 1:], axis=1, keepdims=True)
+    step = DCT_SIZE // HASH_SIZE
+    blocks = large.reshape(len(imgs), HASH_SIZE, step, HASH_SIZE, step).mean(axis=(2, 4))
+    a_bits = blocks > blocks.mean(axis=(1, 2), keepdims=True)
+    return [ImageHash(*hashes) for hashes in zip(_pack(d_bits), _pack(p_bits), _pack(a_bits))]
+
+def image_hash(img):
+    return image_hashes([img])[0]
+
+def hamming(hash1, hash2):
+    return bin(hash1 ^ hash2).count('1')
+
+
+def thumbnail(img, size=DIFF_SIZE):
+    """
+    Downscale an image to a small grayscale float32 frame for diffing.
+    """
+    return cv2.resize(_gray(img), size, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def ssim(img1, img2, size=DIFF_SIZE):
+    """
+    Mean structural similarity of two images, computed on downscaled grayscale frames.
+
+    Returns:
+        float: 1.0 for identical frames, lower for more different ones.
+    """
+    x, y = thumbnail(img1, size), thumbnail(img2, size)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    blur = lambda frame: cv2.GaussianBlur(frame, (7, 7), 1.5)
+    mu_x, mu_y = blur(x), blur(y)
+    var_x = blur(x * x) - mu_x * mu_x
+    var_y = blur(y * y) - mu_y * mu_y
+    cov = blur(x * y) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x * mu_x + mu_y * mu_y + c1) * (var_x + var_y + c2))
+    return float(ssim_map.mean())
+
+def block_diff(img1, img2, size=DIFF_SIZE, block=10, tolerance=12):
+    """
+    Share of blocks of the downscaled frames whose mean absolute difference exceeds tolerance.
+    Small local changes such as a status bar clock only touch a few blocks.
+    """
+    diff = np.abs(thumbnail(img1, size) - thumbnail(img2, size))
+    h, w = diff.shape[0] // block * block, diff.shape[1] // block * block
+    blocks = diff[:h, :w].reshape(h // block, block, w // block, block).mean(axis=(1, 3))
+    return float((blocks > tolerance).mean())
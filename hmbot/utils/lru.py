@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    The class describes a thread-safe LRU cache bounded by a total weight,
+    e.g. the number of bytes held by the cached values.
+    """
+    def __init__(self, budget, weigh=None):
+        """
+        Args:
+            budget (int): the maximum total weight of the cached values.
+            weigh (callable, optional): weigh(value) -> int, every value weighs 1 by default.
+        """
+        self.budget = budget
+        self._weigh = weigh or (lambda value: 1)
+        self._items = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    @property
+    def weight(self):
+        return self._weight
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        """
+        Cache a value, evicting the least recently used ones until the budget holds.
+        A value heavier than the whole budget is not cached.
+        """
+        weight = self._weigh(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._weight -= old[1]
+            if weight > self.budget:
+                return
+            self._items[key] = (value, weight)
+            self._weight += weight
+            while self._weight > self.budget:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._weight -= evicted
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return default
+            self._weight -= item[1]
+            return item[0]
+
+    def items(self):
+        """
+        Return the cached (key, value) pairs from least to most recently used.
+        """
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._items.items()]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._weight = 0
@@ -1,5 +1,6 @@
 from hmbot.device.connector.adb import ADB
 from hmbot.device.connector.hdc import HDC
+from hmbot.device.connector.adb_native import NativeADB
 from hmbot.device.automator.u2 import U2
 from hmbot.device.automator.h2 import H2
 from ..proto import OperatingSystem
@@ -7,4 +8,10 @@ from ..proto import OperatingSystem
 system_rfl = {
     OperatingSystem.ANDROID: (ADB, U2),
     OperatingSystem.HARMONY: (HDC, H2)
-}
\ No newline at end of file
+}
+# connectors selectable instead of the default one of an operating system
+connector_rfl = {
+    'adb': ADB,
+    'adbutils': NativeADB,
+    'hdc': HDC
+}
@@ -2,7 +2,6 @@ import argparse
 from hmbot.utils.proto import OperatingSystem
 from config import init_config
 from hmbot.hmbot import HMBot
-from hmbot.model.ptg import WTGParser
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -10,6 +9,8 @@ if __name__ == '__main__':
     parser_devices = subparsers.add_parser('devices', help='list connected devices')
     parser_explore = subparsers.add_parser('explore', help='explore the app')
     parser_detect = subparsers.add_parser('detect', help='detect bugs')
+    parser_verify = subparsers.add_parser('verify', help='verify a saved PTG on a device')
+    parser_merge = subparsers.add_parser('merge', help='merge the near-duplicate pages of a saved PTG')
 
     parser_devices.add_argument('--os', type=str, help='specify the operating system of device')
 
@@ -22,6 +23,7 @@ if __name__ == '__main__':
     parser_explore.add_argument('-s', '--serial', type=str, nargs='+', required=True, help='specify the device serial for exploration')
     parser_explore.add_argument('-m', '--max_steps', type=int, default=20, help='specify the depth of exploration, default is 20')
     parser_explore.add_argument('-o', '--output', type=str, default='output/', help='specify the output directory for exploration results')
+    parser_explore.add_argument('--connector', type=str, choices=['adb', 'adbutils', 'hdc'], help='specify the device connector, adbutils talks to the adb server without the adb binary')
 
     parser_detect.add_argument('--os', type=str, required=True, help='specify the operating system of deivce')
     parser_detect.add_argument('--hardware', required=True, choices=['audio', 'microphone', 'camera', 'keyboard'],
@@ -31,6 +33,22 @@ if __name__ == '__main__':
     parser_detect.add_argument('-sd', '--source_device', type=str, required=True, help='specify the source device serial for detection')
     parser_detect.add_argument('-td','--target_device', type=str, required=True, help='specify the target device serial for detection')
 
+    parser_verify.add_argument('--os', type=str, required=True, help='specify the operating system of device')
+    parser_verify.add_argument('-s', '--serial', type=str, nargs='+', required=True, help='specify the device serial(s) for verification, several devices verify in parallel')
+    parser_verify.add_argument('-g', '--ptg_path', type=str, required=True, help='specify the directory of the saved PTG')
+    parser_verify.add_argument('-p', '--app_path', type=str, help='specify the app\'s apk/hap path, lets the verifier restart the app')
+    parser_verify.add_argument('-c', '--checkpoint', type=str, help='specify the checkpoint directory, default is <ptg_path>/checkpoint/')
+    parser_verify.add_argument('--resume', action='store_true', help='continue from the last checkpoint')
+    parser_verify.add_argument('--incremental', action='store_true', help='only re-verify the transitions around pages that changed')
+    parser_verify.add_argument('--radius', type=int, default=1, help='specify how many transitions downstream of a changed page to re-verify')
+    parser_verify.add_argument('--connector', type=str, choices=['adb', 'adbutils', 'hdc'], help='specify the device connector, adbutils talks to the adb server without the adb binary')
+    parser_verify.add_argument('--verdict_cache', type=str, help='specify the verdict cache database, default is <ptg_path>/verdicts.db')
+
+    parser_merge.add_argument('-g', '--ptg_path', type=str, required=True, help='specify the directory of the saved PTG')
+    parser_merge.add_argument('--profile_threshold', type=float, default=0.1, help='specify the largest VHT profile distance of near-duplicate pages, default is 0.1')
+    parser_merge.add_argument('--image_threshold', type=int, default=10, help='specify the largest screenshot hash distance of near-duplicate pages, default is 10')
+    parser_merge.add_argument('-j', '--workers', type=int, help='specify the number of worker processes, default is the number of cores')
+
     args = parser.parse_args()
     if args.command == 'devices':
         if args.os:
@@ -43,9 +61,16 @@ if __name__ == '__main__':
                 print(get_android_available_devices())
     if args.command == 'explore':
         llm_config = init_config()
-        hmbot = HMBot(args.os, args.serial, llm_config)
+        hmbot = HMBot(args.os, args.serial, llm_config, args.connector)
         hmbot.explore(args)
+    if args.command == 'verify':
+        hmbot = HMBot(args.os, args.serial, None, args.connector)
+        hmbot.verify(args)
+    if args.command == 'merge':
+        from hmbot.model.ptg_merge import PTGMerger
+        PTGMerger(args.ptg_path, args.profile_threshold, args.image_threshold, args.workers).merge()
     if args.command == 'detect':
+        from hmbot.model.ptg import WTGParser
         serial = [args.source_device, args.target_device]
         hmbot = HMBot(args.os, serial, None)
         wtg = WTGParser().parse(args.wtg_path)